@@ -18,6 +18,36 @@ class Settings:
 
     # OpenAI API key
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+    # Optional OpenAI-compatible endpoint (e.g. a local stub server for benchmarks)
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL")
+
+    # Rate limiting and retries for LLM requests (see llm_dispatcher)
+    LLM_RPM: int = int(os.getenv("LLM_RPM", 500))
+    LLM_TPM: int = int(os.getenv("LLM_TPM", 200000))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 6))
+    LLM_BACKOFF_BASE: float = float(os.getenv("LLM_BACKOFF_BASE", 1.0))
+    LLM_BACKOFF_MAX: float = float(os.getenv("LLM_BACKOFF_MAX", 60.0))
+    LLM_REQUEST_TIMEOUT: float = float(os.getenv("LLM_REQUEST_TIMEOUT", 120.0))
+
+    # Batch mode: pack up to LLM_BATCH_SIZE payslips into one request (1 = off)
+    LLM_BATCH_SIZE: int = int(os.getenv("LLM_BATCH_SIZE", 1))
+    LLM_BATCH_TOKEN_BUDGET: int = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", 6000))
+    LLM_BATCH_OUTPUT_TOKENS_PER_DOC: int = int(os.getenv("LLM_BATCH_OUTPUT_TOKENS_PER_DOC", 400))
+
+    # Prompt compression (app/extractors/prompt_compressor.py): whitespace, repeated
+    # lines and boilerplate removed; texts over PROMPT_TRIM_MIN_TOKENS trimmed to the
+    # salary regions (+/- PROMPT_CONTEXT_LINES); max_tokens sized to the expected JSON
+    PROMPT_COMPRESSION: bool = os.getenv("PROMPT_COMPRESSION", "1").lower() in ("1", "true", "yes")
+    PROMPT_TRIM_MIN_TOKENS: int = int(os.getenv("PROMPT_TRIM_MIN_TOKENS", 600))
+    PROMPT_CONTEXT_LINES: int = int(os.getenv("PROMPT_CONTEXT_LINES", 1))
+    LLM_MAX_OUTPUT_TOKENS: int = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", 1500))
+
+    # LLM extraction cache (content-addressed, SQLite file)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "./data/llm_cache.sqlite3")
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 200000))
+    LLM_CACHE_MAX_AGE_DAYS: float = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", 365))
 
     # Folder for PDF files
     PDF_FOLDER: str = os.getenv("PDF_FOLDER", "./payslips_pdf")
@@ -25,5 +55,67 @@ class Settings:
     # Logging level
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 
+    # Metrics (app/metrics.py): Prometheus text file and/or HTTP endpoint, per-run JSON reports
+    METRICS_FILE: str = os.getenv("METRICS_FILE", "")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", 0))
+    METRICS_REPORT_DIR: str = os.getenv("METRICS_REPORT_DIR", "./data/reports")
+
+    # PDF text extraction backend: pymupdf, pypdf, pdfplumber or langchain
+    # (see benchmarks/bench_pdf_backends.py)
+    PDF_TEXT_BACKEND: str = os.getenv("PDF_TEXT_BACKEND", "pymupdf")
+
+    # OCR fallback: rasterization DPI, grayscale, parallel pages and early exit
+    # once the net pay summary page has been read
+    OCR_DPI: int = int(os.getenv("OCR_DPI", 200))
+    OCR_GRAYSCALE: bool = os.getenv("OCR_GRAYSCALE", "1").lower() in ("1", "true", "yes")
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", 2))
+    OCR_EARLY_EXIT: bool = os.getenv("OCR_EARLY_EXIT", "1").lower() in ("1", "true", "yes")
+    # Per-page hybrid extraction: OCR a page when its text layer has fewer than
+    # OCR_MIN_PAGE_CHARS characters, or when images cover at least
+    # OCR_IMAGE_COVERAGE of it with no text layer over them
+    HYBRID_EXTRACTION: bool = os.getenv("HYBRID_EXTRACTION", "1").lower() in ("1", "true", "yes")
+    OCR_MIN_PAGE_CHARS: int = int(os.getenv("OCR_MIN_PAGE_CHARS", 50))
+    OCR_IMAGE_COVERAGE: float = float(os.getenv("OCR_IMAGE_COVERAGE", 0.5))
+
+    # Rule-based fast path for known payslip layouts (JSON templates). Only files
+    # not starting with "_" are loaded and none ship with the repo, so it does
+    # nothing until a template for your layout is added (see template_parser.py)
+    TEMPLATES_ENABLED: bool = os.getenv("TEMPLATES_ENABLED", "1").lower() in ("1", "true", "yes")
+    TEMPLATES_DIR: str = os.getenv("TEMPLATES_DIR", str(Path(__file__).resolve().parent / "extractors" / "templates"))
+
+    # Ingestion pipeline: workers per stage, queue bound and DB write batching
+    EXTRACT_WORKERS: int = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 2))
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", 8))
+    PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", 64))
+    DB_BATCH_SIZE: int = int(os.getenv("DB_BATCH_SIZE", 50))
+    DB_FLUSH_INTERVAL: float = float(os.getenv("DB_FLUSH_INTERVAL", 2.0))
+
+    # Ingestion job queue: lease length, attempts per file and delay before a retry
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", 600))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    JOB_RETRY_DELAY: float = float(os.getenv("JOB_RETRY_DELAY", 60))
+    JOB_CLAIM_BATCH: int = int(os.getenv("JOB_CLAIM_BATCH", 16))
+
+    # Daemon mode (process_pdfs --watch): a file is ingested once its size and mtime
+    # held still for WATCH_DEBOUNCE_SECONDS; at most WATCH_MAX_BACKLOG files are
+    # tracked at once. Without inotify the folder is listed every WATCH_POLL_SECONDS;
+    # with it, every WATCH_RESCAN_SECONDS as a safety net (0 = never).
+    WATCH_DEBOUNCE_SECONDS: float = float(os.getenv("WATCH_DEBOUNCE_SECONDS", 1.0))
+    WATCH_POLL_SECONDS: float = float(os.getenv("WATCH_POLL_SECONDS", 2.0))
+    WATCH_MAX_BACKLOG: int = int(os.getenv("WATCH_MAX_BACKLOG", 1000))
+    WATCH_RESCAN_SECONDS: float = float(os.getenv("WATCH_RESCAN_SECONDS", 300))
+
+    # Per-employee analytics (app/services/employee_stats.py): months of totals kept
+    # per employee for YoY and the TDS projection (at least 13), months of history
+    # needed before net pay anomalies are flagged, the z-score that counts as one,
+    # and the recent months averaged to project TDS to the end of the fiscal year
+    ANALYTICS_WINDOW_MONTHS: int = int(os.getenv("ANALYTICS_WINDOW_MONTHS", 24))
+    ANALYTICS_MIN_MONTHS: int = int(os.getenv("ANALYTICS_MIN_MONTHS", 6))
+    ANALYTICS_ANOMALY_Z: float = float(os.getenv("ANALYTICS_ANOMALY_Z", 3.0))
+    ANALYTICS_TDS_RUN_RATE_MONTHS: int = int(os.getenv("ANALYTICS_TDS_RUN_RATE_MONTHS", 3))
+
+    # Dashboard: most detail rows loaded into the records table (the export has no limit)
+    DASHBOARD_DETAIL_ROWS: int = int(os.getenv("DASHBOARD_DETAIL_ROWS", 500))
+
 
 settings = Settings()
\ No newline at end of file
@@ -8,13 +8,16 @@ if PROJECT_ROOT_STR not in sys.path:
     sys.path.insert(0, PROJECT_ROOT_STR)
 
 
+import io
+import tempfile
 import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from app.db import SessionLocal
-from app.models import PayslipRecord
-from typing import Optional
+from app.services import employee_stats
+from app.services.components import top_components
+from app.services.export import FORMATS, export
+from app.services.dashboard_data import monthly_totals, record_rows
 
 # top of app/dashboards/streamlit_app.py (insert before any other imports)
 
@@ -24,67 +27,28 @@ st.set_page_config(page_title="Payslip Dashboard", layout="wide", initial_sideba
 
 CURRENCY = "₹"
 
-def to_float_safe(x: Optional[float]):
-    try:
-        if x is None:
-            return np.nan
-        return float(x)
-    except Exception:
-        return np.nan
-
-@st.cache_data(ttl=300)
-def load_data_from_db():
-    """Load payslip records from DB and return normalized DataFrame."""
-    session = SessionLocal()
-    try:
-        rows = session.query(PayslipRecord).all()
-        if not rows:
-            return pd.DataFrame()
-        records = []
-        for r in rows:
-            records.append({
-                "filename": r.raw.filename if r.raw else None,
-                "month_raw": r.month,
-                "pay_date": r.pay_date,
-                "gross_salary": to_float_safe(r.gross_salary),
-                "net_pay": to_float_safe(r.net_pay),
-                "tds": to_float_safe(r.tds),
-                "pf_employee": to_float_safe(r.pf_employee),
-                "pf_employer": to_float_safe(r.pf_employer),
-                "components_json": r.components_json or "{}",
-            })
-        df = pd.DataFrame(records)
-
-        # Normalize month -> datetime (prefer pay_date if present)
-        def parse_month(row):
-            # try pay_date first
-            if row.get("pay_date"):
-                try:
-                    return pd.to_datetime(row["pay_date"])
-                except Exception:
-                    pass
-            # try YYYY-MM
-            m = row.get("month_raw")
-            if not m:
-                return pd.NaT
-            try:
-                # allow YYYY-MM or MMM YYYY or other human forms
-                return pd.to_datetime(m, format="%Y-%m", errors="coerce") \
-                    .fillna(pd.to_datetime(m, errors="coerce"))
-            except Exception:
-                return pd.NaT
-
-        df["date"] = df.apply(parse_month, axis=1)
-        # Use YYYY-MM label for display/sorting
-        df["month"] = df["date"].dt.to_period("M").astype(str)
-        # computed fields
-        df["savings"] = df["gross_salary"] - df["net_pay"]
-        df["savings_rate"] = (df["savings"] / df["gross_salary"]).replace([np.inf, -np.inf], np.nan)
-        # sort by date ascending
-        df = df.sort_values("date").reset_index(drop=True)
-        return df
-    finally:
-        session.close()
+@st.cache_data(ttl=60)
+def load_monthly_totals():
+    """Monthly gross/net/TDS/savings from the monthly_summary table."""
+    return monthly_totals()
+
+@st.cache_data(ttl=60)
+def load_top_components(months=None, limit=5):
+    return pd.Series(dict(top_components(limit, months=months)), dtype=float)
+
+@st.cache_data(ttl=60)
+def load_employee_overview():
+    """Anomalies and YoY changes from the employee_stats table (one indexed query each)."""
+    return employee_stats.overview(), employee_stats.anomalies(limit=50), employee_stats.yoy_changes(limit=50)
+
+@st.cache_data(ttl=60)
+def load_employee(employee_code):
+    return employee_stats.get(employee_code)
+
+@st.cache_data(ttl=60)
+def load_records(months=None, employee_code=None):
+    """Detail rows for the table, filtered and limited in SQL (the export reads the rest)."""
+    return record_rows(months, employee_code)
 
 def money(x):
     if pd.isna(x):
@@ -92,7 +56,7 @@ def money(x):
     return f"{CURRENCY}{x:,.2f}"
 
 # Load data
-df = load_data_from_db()
+df = load_monthly_totals()
 
 st.title("Payslip Dashboard")
 st.markdown("Interactive view of your parsed payslips — totals, trends, and downloadable data.")
@@ -117,11 +81,13 @@ with st.sidebar:
     date_from, date_to = st.date_input("Date range (inclusive)", [min_date.date(), max_date.date()] if pd.notna(min_date) else [None, None])
     # quick month picker (multi-select)
     selected_months = st.multiselect("Select months (optional)", months, default=None)
+    # narrows the detail table and its export
+    detail_employee = st.text_input("Employee code for detail rows (optional)").strip() or None
 
     st.write("---")
     st.caption("Download or sort the table below. Use filters to focus on a specific period.")
 
-# Apply filters
+# Apply filters (to the monthly totals; detail rows follow the selected months)
 filtered = df.copy()
 try:
     if date_from and date_to:
@@ -143,7 +109,8 @@ if filtered.empty:
 total_gross = filtered["gross_salary"].sum(min_count=1)
 total_net = filtered["net_pay"].sum(min_count=1)
 total_tds = filtered["tds"].sum(min_count=1)
-avg_savings_rate = filtered["savings_rate"].mean()
+rate_n = filtered["savings_rate_n"].sum()
+avg_savings_rate = filtered["savings_rate_sum"].sum() / rate_n if rate_n else np.nan
 
 col1, col2, col3, col4 = st.columns(4)
 col1.metric("Total Gross", money(total_gross))
@@ -158,43 +125,25 @@ chart_col1, chart_col2 = st.columns([2, 1])
 
 with chart_col1:
     st.subheader("Gross vs Net (by month)")
-    ts = filtered.groupby("month").agg({"gross_salary": "sum", "net_pay": "sum"}).reset_index()
-    ts = ts.sort_values("month")
+    ts = filtered.sort_values("month")
     st.line_chart(ts.set_index("month")[["gross_salary", "net_pay"]])
 
     st.subheader("Savings over time")
-    sav = filtered.groupby("month").agg({"savings": "sum"}).reset_index().sort_values("month")
+    sav = filtered.sort_values("month")
     st.area_chart(sav.set_index("month")["savings"])
 
 with chart_col2:
     st.subheader("TDS by Month")
-    tds = filtered.groupby("month").agg({"tds": "sum"}).reset_index().sort_values("month")
+    tds = filtered.sort_values("month")
     st.bar_chart(tds.set_index("month")["tds"])
 
     st.subheader("Top Deductions / Components (sample)")
-    # Extract top components across filtered rows (components_json stored as string)
-    comp_series = {}
-    for s in filtered["components_json"].dropna():
-        try:
-            d = pd.json.loads(s) if isinstance(s, str) else s
-        except Exception:
-            # try using json
-            import json
-            try:
-                d = json.loads(s)
-            except Exception:
-                d = {}
-        if isinstance(d, dict):
-            for k,v in d.items():
-                try:
-                    val = float(str(v).replace(",", "").replace("₹", "").strip())
-                except Exception:
-                    continue
-                comp_series[k] = comp_series.get(k, 0.0) + val
+    # One indexed GROUP BY over payslip_components (pay_month filter only when narrowed)
+    months = None if len(filtered) == len(df) else tuple(filtered["date"].dt.date)
+    comp_series = load_top_components(months)
     # show top 5
-    if comp_series:
-        top5 = sorted(comp_series.items(), key=lambda x: -x[1])[:5]
-        comp_df = pd.DataFrame(top5, columns=["component", "total"])
+    if not comp_series.empty:
+        comp_df = comp_series.head(5).rename_axis("component").reset_index(name="total")
         comp_df["total_formatted"] = comp_df["total"].apply(money)
         st.table(comp_df[["component", "total_formatted"]].rename(columns={"total_formatted": "total"}))
     else:
@@ -202,9 +151,64 @@ with chart_col2:
 
 st.divider()
 
+# Per-employee analytics, maintained at ingest time (app/services/employee_stats.py)
+st.subheader("Employee analytics")
+overview, anomalies, yoy = load_employee_overview()
+if not overview["employees"]:
+    st.write("No employee codes found in the parsed payslips.")
+else:
+    ecol1, ecol2, ecol3 = st.columns(3)
+    ecol1.metric("Employees", f"{overview['employees']:,}")
+    ecol2.metric("Net pay anomalies (latest month)", f"{overview['anomalies']:,}")
+    ecol3.metric(f"Projected TDS (FY {overview['fiscal_year'] or '-'})", money(overview["tds_projected"]))
+
+    def employee_table(rows):
+        table = pd.DataFrame(rows, columns=["employee_code", "last_month", "last_net_pay", "net_pay_mean",
+                                            "net_pay_z", "net_pay_yoy", "fiscal_year", "tds_fy_to_date", "tds_projected"])
+        for col in ("last_net_pay", "net_pay_mean", "tds_fy_to_date", "tds_projected"):
+            table[col] = table[col].apply(money)
+        table["net_pay_z"] = table["net_pay_z"].apply(lambda x: f"{x:+.1f}σ" if not pd.isna(x) else "-")
+        table["net_pay_yoy"] = table["net_pay_yoy"].apply(lambda x: f"{(x*100):+.1f}%" if not pd.isna(x) else "-")
+        return table
+
+    tab_anomalies, tab_yoy, tab_employee = st.tabs(["Anomalies", "Year over year", "Employee"])
+    with tab_anomalies:
+        if anomalies:
+            st.dataframe(employee_table(anomalies), use_container_width=True)
+        else:
+            st.write("No employee's latest net pay deviates from their history.")
+    with tab_yoy:
+        if yoy:
+            st.dataframe(employee_table(yoy), use_container_width=True)
+        else:
+            st.write("No employee has the same month a year earlier yet.")
+    with tab_employee:
+        employee_code = st.text_input("Employee code")
+        employee = load_employee(employee_code.strip()) if employee_code.strip() else None
+        if employee_code.strip() and employee is None:
+            st.warning(f"No payslips for employee {employee_code.strip()}.")
+        elif employee is not None:
+            k1, k2, k3, k4 = st.columns(4)
+            k1.metric("Avg monthly net", money(employee["net_pay_mean"]))
+            k2.metric("Net pay σ", money(employee["net_pay_std"]) if employee["net_pay_std"] is not None else "-")
+            k3.metric("YoY (latest month)", f"{(employee['net_pay_yoy']*100):+.1f}%" if employee["net_pay_yoy"] is not None else "-")
+            k4.metric(f"TDS {employee['fiscal_year']} projected", money(employee["tds_projected"]),
+                      delta=f"{money(employee['tds_fy_to_date'])} so far", delta_color="off")
+            history = pd.DataFrame(employee["history"]).set_index("month")
+            st.line_chart(history[["gross_salary", "net_pay"]])
+            flagged = history[history["anomaly"]]
+            if not flagged.empty:
+                st.caption("Months whose net pay deviates from the employee's other months: " + ", ".join(flagged.index))
+
+st.divider()
+
 # Data table with download option
 st.subheader("Detailed payslip records")
-display_df = filtered[["filename", "month", "gross_salary", "net_pay", "tds", "pf_employee", "pf_employer", "savings", "savings_rate"]].copy()
+detail_months = None if len(filtered) == len(df) else tuple(filtered["date"].dt.date)
+records, matching = load_records(detail_months, detail_employee)
+if matching > len(records):
+    st.caption(f"Showing the latest {len(records):,} of {matching:,} matching records; export them all below.")
+display_df = records[["filename", "month", "gross_salary", "net_pay", "tds", "pf_employee", "pf_employer", "savings", "savings_rate"]].copy()
 # formatting
 display_df["gross_salary"] = display_df["gross_salary"].apply(lambda x: money(x))
 display_df["net_pay"] = display_df["net_pay"].apply(lambda x: money(x))
@@ -216,8 +220,20 @@ display_df["savings_rate"] = display_df["savings_rate"].apply(lambda x: f"{(x*10
 
 st.dataframe(display_df.sort_values("month", ascending=False), use_container_width=True)
 
-# CSV download
-csv_bytes = filtered.to_csv(index=False).encode("utf-8")
-st.download_button("Download filtered CSV", data=csv_bytes, file_name="payslip_filtered.csv", mime="text/csv")
+# Download: the export is only built when asked for, streamed from the DB into a temp file
+export_col1, export_col2 = st.columns([1, 3])
+export_fmt = export_col1.selectbox("Export format", sorted(FORMATS), label_visibility="collapsed")
+if export_col2.button("Prepare export of the filtered records"):
+    export_months = None if detail_months is None else list(detail_months)
+    export_file = tempfile.TemporaryFile(mode="w+b")
+    if export_fmt == "csv":
+        text_out = io.TextIOWrapper(export_file, encoding="utf-8", newline="", write_through=True)
+        exported = export(text_out, "csv", months=export_months, employee_code=detail_employee)
+        text_out.detach()
+    else:
+        exported = export(export_file, export_fmt, months=export_months, employee_code=detail_employee)
+    export_file.seek(0)
+    st.download_button(f"Download {exported} record(s) as {export_fmt.upper()}", data=export_file,
+                       file_name=f"payslip_filtered.{export_fmt}", mime=FORMATS[export_fmt])
 
 st.caption("Pro tip: use filters on the left to focus on specific months or date ranges.")
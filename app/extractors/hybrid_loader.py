@@ -0,0 +1,87 @@
+# app/extractors/hybrid_loader.py
+"""
+Per-page hybrid text extraction.
+
+Each page's text layer and image coverage are inspected with PyMuPDF. A page
+is OCR'd only if it has almost no text, or if it is mostly covered by images
+whose area carries no text layer (a scanned body with a typed footer, for
+example). All other pages keep their embedded text, and the result is merged
+in page order.
+"""
+import logging
+from dataclasses import dataclass
+from typing import List
+
+from app import metrics
+from app.config import settings
+from app.extractors.ocr_fallback import ocr_document
+from app.extractors.pdf_loader import get_backend
+
+logger = logging.getLogger("hybrid_loader")
+
+
+@dataclass
+class PageInfo:
+    number: int              # 1-based
+    text: str
+    image_coverage: float    # fraction of the page area covered by images
+    text_in_images: int      # characters of text layer lying over those images
+    needs_ocr: bool
+
+
+def inspect_pages(path: str) -> List[PageInfo]:
+    import pymupdf
+
+    min_chars = settings.OCR_MIN_PAGE_CHARS
+    pages = []
+    with pymupdf.open(path) as doc:
+        for i, page in enumerate(doc, start=1):
+            text = page.get_text()
+            area = abs(page.rect) or 1.0
+            image_rects = [pymupdf.Rect(info["bbox"]) & page.rect for info in page.get_image_info()]
+            coverage = min(1.0, sum(abs(r) for r in image_rects) / area)
+
+            text_in_images = 0
+            if image_rects:
+                for x0, y0, x1, y1, block_text, *_ in page.get_text("blocks"):
+                    block = pymupdf.Rect(x0, y0, x1, y1)
+                    if any(block.intersects(r) for r in image_rects):
+                        text_in_images += len(block_text.strip())
+
+            chars = len(text.strip())
+            needs_ocr = chars < min_chars or (
+                coverage >= settings.OCR_IMAGE_COVERAGE and text_in_images < min_chars
+            )
+            pages.append(PageInfo(i, text, round(coverage, 3), text_in_images, needs_ocr))
+    return pages
+
+
+def load_pdf_text_hybrid(path: str) -> str:
+    """Text layer where usable, OCR for the remaining pages, in page order."""
+    with metrics.timed("inspect"):
+        pages = inspect_pages(path)
+    # The text layer comes from the configured backend so output matches load_pdf_text
+    backend = get_backend()
+    if backend.name == "pymupdf":
+        texts = [p.text.strip() for p in pages]
+    else:
+        with metrics.timed("text_layer"):
+            texts = backend.extract_pages(path)
+    if len(texts) == len(pages):
+        for p, text in zip(pages, texts):
+            p.text = text
+    to_ocr = [p.number for p in pages if p.needs_ocr]
+    if to_ocr:
+        logger.info(f"OCR needed for {len(to_ocr)}/{len(pages)} page(s) of {path}")
+        try:
+            # The pages are chosen up front, so no early exit here
+            result = ocr_document(path, pages=to_ocr, early_exit=False)
+            ocr_texts = dict(zip(to_ocr, result.page_texts))
+        except Exception as e:
+            logger.exception(f"OCR failed for {path}: {e}; keeping the text layer")
+            ocr_texts = {}
+        for p in pages:
+            ocr_text = ocr_texts.get(p.number)
+            if ocr_text is not None and len(ocr_text.strip()) > len(p.text.strip()):
+                p.text = ocr_text
+    return "\n\n".join(p.text for p in pages)
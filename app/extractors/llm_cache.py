@@ -0,0 +1,146 @@
+# app/extractors/llm_cache.py
+"""
+Persistent, content-addressed cache for LLM extraction results.
+
+Entries are keyed by sha256(prompt version, model, normalized text), so renamed
+files, duplicate uploads and re-runs after a DB schema change are served
+locally instead of calling the model again. Storage is a single SQLite file;
+entries older than LLM_CACHE_MAX_AGE_DAYS are dropped and the least recently
+used ones are evicted once LLM_CACHE_MAX_ENTRIES is exceeded.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger("llm_cache")
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Run eviction every N writes rather than on every put
+_EVICT_EVERY = 500
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-extractions that only differ in layout share a key."""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def cache_key(text: str, prompt_version: str, model: str) -> str:
+    h = hashlib.sha256()
+    h.update(prompt_version.encode("utf-8"))
+    h.update(b"\0")
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str, max_entries: int, max_age_days: float):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_s = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used_at)")
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age_s and now - row[1] > self.max_age_s):
+                self.misses += 1
+                metrics.LLM_CACHE.inc(result="miss")
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        metrics.LLM_CACHE.inc(result="hit")
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict, model: str, prompt_version: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, prompt_version, result, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, json.dumps(result, ensure_ascii=False), now, now),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict()
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        if self.max_age_s:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age_s,))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMCache]:
+    """Shared cache instance, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                settings.LLM_CACHE_PATH,
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                max_age_days=settings.LLM_CACHE_MAX_AGE_DAYS,
+            )
+    return _cache
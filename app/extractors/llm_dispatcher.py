@@ -0,0 +1,230 @@
+# app/extractors/llm_dispatcher.py
+"""
+Async LLM dispatcher with rate limiting.
+
+All chat completions go through one AsyncOpenAI client running on a
+background event loop. Before each request it takes 1 unit from a
+requests-per-minute bucket and the estimated prompt + completion tokens from
+a tokens-per-minute bucket (reconciled against the reported usage
+afterwards). Only retryable errors (429, 5xx, timeouts, connection errors)
+are retried: a Retry-After header is honoured and pauses every request,
+otherwise full-jitter exponential backoff is used. Concurrency is adjusted
+from observed 429s: halved on each throttle and raised by one after a run of
+successes, up to LLM_CONCURRENCY.
+
+Synchronous callers (pipeline worker threads) use complete_sync().
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import List, Optional
+
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger("llm_dispatcher")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute` units per minute, up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float):
+        amount = min(amount, self.capacity)
+        # Holding the lock while waiting keeps callers in FIFO order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def credit(self, amount: float):
+        """Return unused units (or charge extra ones when amount is negative)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: halve on throttling, +1 after `limit` consecutive successes."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False, succeeded: bool = False):
+        async with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                new_limit = max(1, self.limit // 2)
+                if new_limit != self.limit:
+                    logger.info(f"Throttled: LLM concurrency {self.limit} -> {new_limit}")
+                self.limit, self._successes = new_limit, 0
+            elif succeeded and self.limit < self.max_limit:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+def _is_retryable(exc: Exception) -> bool:
+    import openai
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code in (408, 409)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass  # HTTP-date form: fall back to backoff
+    return None
+
+
+class LLMDispatcher:
+    def __init__(
+        self,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "failed": 0}
+        self._pause_until = 0.0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-dispatcher", daemon=True)
+        self._thread.start()
+        self._run(self._setup(rpm, tpm, concurrency))
+
+    async def _setup(self, rpm, tpm, concurrency):
+        # asyncio primitives and the client are created on the dispatcher's own loop
+        from openai import AsyncOpenAI
+
+        self.requests = TokenBucket(rpm or settings.LLM_RPM)
+        self.tokens = TokenBucket(tpm or settings.LLM_TPM)
+        self.limiter = AdaptiveLimiter(concurrency or settings.LLM_CONCURRENCY)
+        # Retries are ours, so the client must not retry on its own
+        self._client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=0,
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+        )
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _backoff(self, attempt: int) -> float:
+        cap = min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    async def complete(self, messages: List[dict], max_tokens: int, model: Optional[str] = None,
+                       temperature: float = 0.0):
+        estimate = sum(estimate_tokens(m.get("content", "")) for m in messages) + max_tokens
+        attempt = 0
+        while True:
+            pause = self._pause_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimate)
+            await self.limiter.acquire()
+            throttled = succeeded = False
+            try:
+                self.stats["requests"] += 1
+                with metrics.LLM_REQUEST_SECONDS.time():
+                    resp = await self._client.chat.completions.create(
+                        model=model or settings.LLM_MODEL,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                    )
+                succeeded = True
+                metrics.LLM_REQUESTS.inc(outcome="ok")
+            except Exception as e:
+                import openai
+                throttled = isinstance(e, openai.RateLimitError)
+                if throttled:
+                    self.stats["throttled"] += 1
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    metrics.LLM_REQUESTS.inc(outcome="failed")
+                    raise
+                retry_after = _retry_after(e)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if throttled and retry_after is not None:
+                    # the server told us when capacity is back: hold everyone until then
+                    self._pause_until = max(self._pause_until, time.monotonic() + retry_after)
+                attempt += 1
+                self.stats["retries"] += 1
+                metrics.LLM_RETRIES.inc(reason="throttled" if throttled else "transient")
+                logger.warning(f"LLM request failed ({e.__class__.__name__}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            finally:
+                await self.limiter.release(throttled=throttled, succeeded=succeeded)
+
+            if succeeded:
+                usage = getattr(resp, "usage", None)
+                if usage is not None and usage.total_tokens:
+                    self.tokens.credit(estimate - usage.total_tokens)
+                return resp
+            await asyncio.sleep(delay)
+
+    def complete_sync(self, messages: List[dict], max_tokens: int, model: Optional[str] = None,
+                      temperature: float = 0.0):
+        """Blocking wrapper for worker threads."""
+        return self._run(self.complete(messages, max_tokens, model=model, temperature=temperature))
+
+    def status(self) -> dict:
+        return dict(self.stats, concurrency=self.limiter.limit)
+
+
+_dispatcher: Optional[LLMDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> LLMDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = LLMDispatcher()
+    return _dispatcher
+
+
+def dispatcher_status() -> Optional[dict]:
+    """Counters of the shared dispatcher, or None if no request was made."""
+    return _dispatcher.status() if _dispatcher is not None else None
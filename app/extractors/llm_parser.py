@@ -1,13 +1,16 @@
 # app/extractors/llm_parser.py
-import os
 import json
+import hashlib
+import logging
+import threading
+from app import metrics
 from app.config import settings
+from app.extractors.llm_cache import cache_key, get_cache
+# Requests go through the rate-limited async dispatcher (OpenAI client >=1.0.0)
+from app.extractors.llm_dispatcher import estimate_tokens, get_dispatcher
+from app.extractors.prompt_compressor import COMPRESSION_VERSION, compress, output_tokens
 
-# New OpenAI python client (>=1.0.0)
-from openai import OpenAI
-
-# Create a client (it reads API key from environment or from settings)
-_client = OpenAI(api_key=settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger("llm_parser")
 
 EXTRACTION_PROMPT = """
 You are a precise parser. Given the payslip text delimited by triple backticks, extract these fields as JSON:
@@ -18,22 +21,87 @@ Here is the payslip text:
 ```{text}```
 """
 
-def _call_openai_chat(text: str, model: str = "gpt-3.5-turbo", max_tokens: int = 1500):
+BATCH_EXTRACTION_PROMPT = """
+You are a precise parser. Below are {n} payslips. Each one starts with a line "### Payslip <index>" followed by its text delimited by triple backticks.
+For EACH payslip extract these fields:
+index (the payslip's index), employee_name, employee_code, pan, pay_date (YYYY-MM-DD if possible), month (YYYY-MM), gross_salary, basic, hra, special_allowance, tds, pf_employee, pf_employer, net_pay, components (object of other components).
+If a field isn't present use null. ONLY return a valid JSON array with exactly {n} objects, one per payslip, in index order (no commentary).
+
+{docs}
+"""
+
+# Part of the cache key: editing either prompt, or how payslip text is compressed
+# into them, invalidates cached extractions
+PROMPT_VERSION = hashlib.sha256(
+    (EXTRACTION_PROMPT + BATCH_EXTRACTION_PROMPT
+     + (f"compression:{COMPRESSION_VERSION}" if settings.PROMPT_COMPRESSION else "")).encode("utf-8")
+).hexdigest()[:12]
+
+# Token usage reported by the API, for comparing single vs batched requests
+_usage = {"requests": 0, "documents": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_usage_lock = threading.Lock()
+
+def _record_usage(resp, documents: int):
+    usage = getattr(resp, "usage", None)
+    with _usage_lock:
+        _usage["requests"] += 1
+        _usage["documents"] += documents
+        if usage is not None:
+            _usage["prompt_tokens"] += usage.prompt_tokens or 0
+            _usage["completion_tokens"] += usage.completion_tokens or 0
+    if usage is not None:
+        metrics.LLM_TOKENS.observe(usage.prompt_tokens or 0, kind="prompt")
+        metrics.LLM_TOKENS.observe(usage.completion_tokens or 0, kind="completion")
+
+def usage_stats() -> dict:
+    with _usage_lock:
+        stats = dict(_usage)
+    docs = stats["documents"]
+    stats["prompt_tokens_per_doc"] = round(stats["prompt_tokens"] / docs, 1) if docs else 0.0
+    return stats
+
+def _prompt_text(text: str) -> str:
+    """The payslip text as pasted into a prompt (see prompt_compressor); logs its size before and after."""
+    compressed = compress(text)
+    before, after = estimate_tokens(text), estimate_tokens(compressed)
+    metrics.LLM_TEXT_TOKENS.observe(before, stage="raw")
+    metrics.LLM_TEXT_TOKENS.observe(after, stage="compressed")
+    if compressed is not text:
+        logger.info(f"Prompt text: {before} -> {after} tokens ({1 - after / before:.0%} saved)")
+    return compressed
+
+def _call_openai_chat(text: str, model: str = None, max_tokens: int = None):
     """
-    Uses the new OpenAI client API to create a chat completion.
+    Creates a chat completion through the dispatcher, which enforces the
+    RPM/TPM budgets and retries rate-limit and transient errors. `text` is
+    pasted as is (compress it first); max_tokens defaults to what its JSON
+    answer needs.
     """
+    max_tokens = max_tokens or output_tokens(text)
     prompt = EXTRACTION_PROMPT.replace("{text}", text)
-    resp = _client.chat.completions.create(
-        model=model,
+    resp = get_dispatcher().complete_sync(
         messages=[{"role": "user", "content": prompt}],
-        temperature=0.0,
         max_tokens=max_tokens,
+        model=model,
     )
+    _record_usage(resp, documents=1)
     # response content lives in resp.choices[0].message.content
     return resp.choices[0].message.content
 
-def parse_with_llm(text: str) -> dict:
-    raw = _call_openai_chat(text)
+def _call_openai_batch(texts, model: str = None) -> str:
+    """One chat completion for several payslips; the model answers with a JSON array."""
+    docs = "\n\n".join(f"### Payslip {i}\n```{t}```" for i, t in enumerate(texts))
+    prompt = BATCH_EXTRACTION_PROMPT.replace("{n}", str(len(texts))).replace("{docs}", docs)
+    resp = get_dispatcher().complete_sync(
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=(sum(output_tokens(t) for t in texts) if settings.PROMPT_COMPRESSION
+                    else settings.LLM_BATCH_OUTPUT_TOKENS_PER_DOC * len(texts)),
+        model=model,
+    )
+    _record_usage(resp, documents=len(texts))
+    return resp.choices[0].message.content
+
+def _parse_json_output(raw: str) -> dict:
     # Try strict JSON
     try:
         return json.loads(raw)
@@ -45,3 +113,122 @@ def parse_with_llm(text: str) -> dict:
             return json.loads(raw[start:end+1])
         # If still fails, raise so caller can log + continue
         raise ValueError("Failed to parse JSON from LLM output; raw output (truncated):\n" + raw[:1000])
+
+def _parse_json_array(raw: str) -> list:
+    try:
+        parsed = json.loads(raw)
+    except Exception:
+        start = raw.find("[")
+        end = raw.rfind("]")
+        if start == -1 or end <= start:
+            raise ValueError("Failed to parse JSON array from LLM output; raw output (truncated):\n" + raw[:1000])
+        parsed = json.loads(raw[start:end+1])
+    if isinstance(parsed, dict):
+        # some models wrap the array, e.g. {"payslips": [...]}
+        parsed = next((v for v in parsed.values() if isinstance(v, list)), None)
+    if not isinstance(parsed, list):
+        raise ValueError("LLM batch output is not a JSON array")
+    return parsed
+
+def pack_batches(texts, token_budget: int, max_docs: int):
+    """
+    Greedily group text indices into batches whose estimated prompt size stays
+    within token_budget. A text larger than the budget gets a batch of its own.
+    """
+    batches, current, used = [], [], 0
+    for i, t in enumerate(texts):
+        cost = estimate_tokens(t)
+        if current and (used + cost > token_budget or len(current) >= max_docs):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_batch_with_llm(texts, use_cache: bool = True, single_fn=None) -> list:
+    """
+    Extract several payslips with as few requests as possible.
+
+    Returns one entry per input text, in order: the parsed dict, or the
+    exception raised while parsing it. Cached texts are not sent; documents
+    whose batch call failed, or whose element of the returned array is
+    missing or malformed, are retried on their own through `single_fn`
+    (parse_prompt_text by default). It gets the already compressed prompt
+    text and must not use the cache; its dict results are cached here.
+    """
+    single_fn = single_fn or parse_prompt_text
+    cache = get_cache() if use_cache else None
+    results = [None] * len(texts)
+    keys = [cache_key(t, PROMPT_VERSION, settings.LLM_MODEL) for t in texts] if cache is not None else None
+
+    todo = []
+    for i, t in enumerate(texts):
+        hit = cache.get(keys[i]) if cache is not None else None
+        if hit is not None:
+            results[i] = hit
+        else:
+            todo.append(i)
+
+    prompt_texts = {i: _prompt_text(texts[i]) for i in todo}
+    batches = pack_batches(
+        [prompt_texts[i] for i in todo],
+        token_budget=settings.LLM_BATCH_TOKEN_BUDGET,
+        max_docs=max(1, settings.LLM_BATCH_SIZE),
+    )
+    for batch in batches:
+        idx = [todo[j] for j in batch]
+        items = []
+        if len(idx) > 1:
+            try:
+                items = _parse_json_array(_call_openai_batch([prompt_texts[i] for i in idx]))
+            except Exception as e:
+                logger.warning(f"Batch of {len(idx)} payslip(s) failed ({e}); parsing them one by one")
+
+        # Map answers back by their "index" field, falling back to position
+        by_pos = {}
+        for pos, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            ref = item.pop("index", pos)
+            ref = ref if isinstance(ref, int) and 0 <= ref < len(idx) else pos
+            by_pos.setdefault(ref, item)
+
+        for pos, i in enumerate(idx):
+            item = by_pos.get(pos)
+            if item is None:
+                if len(idx) > 1:
+                    metrics.LLM_RETRIES.inc(reason="batch")
+                try:
+                    item = single_fn(prompt_texts[i])
+                except Exception as e:
+                    results[i] = e
+                    continue
+            results[i] = item
+            if cache is not None and isinstance(item, dict):
+                cache.put(keys[i], item, model=settings.LLM_MODEL, prompt_version=PROMPT_VERSION)
+    return results
+
+def parse_prompt_text(prompt_text: str) -> dict:
+    """One uncached extraction of text already prepared by _prompt_text (compressed, counted)."""
+    return _parse_json_output(_call_openai_chat(prompt_text))
+
+def parse_with_llm(text: str, use_cache: bool = True) -> dict:
+    """
+    Extract payslip fields from text. Results are served from the extraction
+    cache when the same normalized text was parsed before with the same
+    prompt and model; only successful parses are cached.
+    """
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        key = cache_key(text, PROMPT_VERSION, settings.LLM_MODEL)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    parsed = parse_prompt_text(_prompt_text(text))
+
+    if cache is not None and isinstance(parsed, dict):
+        cache.put(key, parsed, model=settings.LLM_MODEL, prompt_version=PROMPT_VERSION)
+    return parsed
@@ -1,8 +1,88 @@
 # app/extractors/pdf_loader.py
-from langchain_community.document_loaders import PyPDFLoader
+"""
+Pluggable PDF text-extraction backends.
+
+settings.PDF_TEXT_BACKEND selects one of BACKENDS. Each backend imports its
+library on first use, so only the selected one has to be installed.
+benchmarks/bench_pdf_backends.py compares their speed, memory and output.
+"""
+import threading
+from typing import Dict, List, Optional
+
+from app import metrics
 from app.config import settings
 
-def load_pdf_text(path: str) -> str:
-    loader = PyPDFLoader(path)
-    docs = loader.load()
-    return "\n\n".join([d.page_content for d in docs])
\ No newline at end of file
+
+class TextBackend:
+    name = ""
+
+    def extract_pages(self, path: str) -> List[str]:
+        raise NotImplementedError
+
+    def extract_text(self, path: str) -> str:
+        return "\n\n".join(self.extract_pages(path))
+
+
+class PyPdfBackend(TextBackend):
+    """pypdf directly: same text as the LangChain PyPDFLoader, without the Document overhead."""
+    name = "pypdf"
+
+    def extract_pages(self, path: str) -> List[str]:
+        import pypdf
+        reader = pypdf.PdfReader(path)
+        return [page.extract_text(extraction_mode="plain").strip() for page in reader.pages]
+
+
+class PyMuPdfBackend(TextBackend):
+    name = "pymupdf"
+
+    def extract_pages(self, path: str) -> List[str]:
+        import pymupdf
+        with pymupdf.open(path) as doc:
+            return [page.get_text().strip() for page in doc]
+
+
+class PdfPlumberBackend(TextBackend):
+    name = "pdfplumber"
+
+    def extract_pages(self, path: str) -> List[str]:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return [(page.extract_text() or "").strip() for page in pdf.pages]
+
+
+class LangChainBackend(TextBackend):
+    """The original PyPDFLoader path, kept as a reference for output comparisons."""
+    name = "langchain"
+
+    def extract_pages(self, path: str) -> List[str]:
+        from langchain_community.document_loaders import PyPDFLoader
+        return [d.page_content for d in PyPDFLoader(path).load()]
+
+
+BACKENDS: Dict[str, type] = {
+    cls.name: cls for cls in (PyPdfBackend, PyMuPdfBackend, PdfPlumberBackend, LangChainBackend)
+}
+
+_instances: Dict[str, TextBackend] = {}
+_lock = threading.Lock()
+
+
+def get_backend(name: Optional[str] = None) -> TextBackend:
+    name = (name or settings.PDF_TEXT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF_TEXT_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    with _lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def load_pdf_pages(path: str, backend: Optional[str] = None) -> List[str]:
+    with metrics.timed("text_layer"):
+        return get_backend(backend).extract_pages(path)
+
+
+def load_pdf_text(path: str, backend: Optional[str] = None) -> str:
+    with metrics.timed("text_layer"):
+        return get_backend(backend).extract_text(path)
@@ -0,0 +1,163 @@
+# app/extractors/prompt_compressor.py
+"""
+Trims payslip text before it is pasted into an extraction prompt.
+
+Extracted text carries a lot the model doesn't need: runs of spaces from
+table layouts, table rules and OCR speckle, the company header and footer
+repeated on every page, and legal boilerplate ("This is a computer generated
+payslip..."). compress() removes those and, for longer documents, keeps only
+the regions around salary lines (earnings/deductions tables, employee
+details, lines with amounts) plus a little context, so annexures and
+letters attached to the payslip are dropped.
+
+output_tokens() sizes max_tokens from the number of amount lines left,
+since the answer is one JSON object with a fixed set of fields plus one
+entry per extra component.
+
+Bump COMPRESSION_VERSION whenever the rules change: it is part of the LLM
+prompt version, so cached extractions of the old prompts are not reused.
+"""
+import re
+from typing import List
+
+from app.config import settings
+from app.extractors.llm_dispatcher import estimate_tokens
+
+COMPRESSION_VERSION = "3"
+
+# Lines at the top and bottom of a page that can hold a running header / footer;
+# pages of up to twice that have no edges (a short page is all body)
+_PAGE_EDGE_LINES = 6
+
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200b]+")
+_ALNUM = re.compile(r"[^\W_]")
+
+# Legal / footer lines that never hold a field value
+_BOILERPLATE = re.compile(
+    r"computer[- ]?generated|system[- ]?generated|electronically generated"
+    r"|does not require (?:any |a )?signature|no signature (?:is )?required"
+    r"|^\s*page \d+(?: of \d+)?\s*$"
+    r"|for any (?:queries|query|discrepanc|clarification)|please contact|contact (?:your )?(?:hr|payroll)"
+    r"|strictly (?:private and )?confidential|^\s*(?:private and )?confidential\s*$|disclaimer"
+    r"|registered office|regd\.? office|corporate identity number|^\s*cin\b"
+    r"|https?://|www\.|printed on",
+    re.IGNORECASE,
+)
+_PAGE_NUMBER = re.compile(r"^page \d+(?: of \d+)?$", re.IGNORECASE)
+
+# Lines around which the salary regions are kept
+_SALARY_LINE = re.compile(
+    r"earning|deduction|basic|\bhra\b|house rent|allowance|gross|\bnet\b|take home|salary|\bpay\b|payable"
+    r"|\btds\b|income tax|professional tax|prof\.? tax|provident|\bpf\b|\besi|\bvpf\b|\blwf\b|bonus|arrear"
+    r"|reimburs|conveyance|medical|incentive|overtime|\blop\b|loss of pay|\bctc\b|total"
+    r"|employee|\bemp\b|name|code|\bpan\b|\buan\b|designation|department|month|period|date",
+    re.IGNORECASE,
+)
+_AMOUNT = re.compile(r"\d[\d,]*\.\d{2}\b|\b\d{1,3}(?:,\d{2,3})+\b")
+
+# Share of the expected JSON answer: the fixed fields, then each component
+_OUTPUT_BASE_TOKENS = 250
+_OUTPUT_TOKENS_PER_AMOUNT = 20
+
+
+def _lines(text: str) -> List[str]:
+    """Lines with whitespace collapsed; blank lines and lines without letters or digits dropped."""
+    out = []
+    for line in (text or "").splitlines():
+        line = _SPACES.sub(" ", line).strip()
+        if line and _ALNUM.search(line):
+            out.append(line)
+    return out
+
+
+def _pages(text: str) -> List[List[str]]:
+    """
+    _lines() of each page. Pages end at form feeds and at page number lines
+    ("Page 2 of 3"); text with neither is one page.
+    """
+    pages = []
+    for chunk in (text or "").split("\f"):
+        page = []
+        for line in _lines(chunk):
+            page.append(line)
+            if _PAGE_NUMBER.match(line):
+                pages.append(page)
+                page = []
+        if page:
+            pages.append(page)
+    return pages
+
+
+def _edge_keys(page: List[str], i: int) -> List[tuple]:
+    """(line lowercased, offset from the top or -1 - offset from the bottom) of page[i], near an edge."""
+    if len(page) <= 2 * _PAGE_EDGE_LINES:
+        return []
+    key = page[i].lower()
+    keys = []
+    if i < _PAGE_EDGE_LINES:
+        keys.append((key, i))
+    if len(page) - i <= _PAGE_EDGE_LINES:
+        keys.append((key, i - len(page)))
+    return keys
+
+
+def _running_lines(pages: List[List[str]]) -> set:
+    """
+    _edge_keys() found on two or more pages: running headers and footers.
+    Short pages have no edges and the offset from the edge must match, so
+    a salary line repeated on a summary page does not count.
+    """
+    counts = {}
+    for page in pages:
+        for key in {k for i in range(len(page)) for k in _edge_keys(page, i)}:
+            counts[key] = counts.get(key, 0) + 1
+    return {key for key, n in counts.items() if n >= 2}
+
+
+def _salary_regions(lines: List[str], context: int) -> List[str]:
+    keep = [False] * len(lines)
+    for i, line in enumerate(lines):
+        if _SALARY_LINE.search(line) or _AMOUNT.search(line):
+            for j in range(max(0, i - context), min(len(lines), i + context + 1)):
+                keep[j] = True
+    if not any(keep):
+        # nothing recognisable (a poor OCR result, an unusual language): send it all
+        return lines
+    return [line for line, k in zip(lines, keep) if k]
+
+
+def compress(text: str) -> str:
+    """
+    Text to send to the LLM: whitespace collapsed, running headers / footers
+    and boilerplate removed, and (for texts over PROMPT_TRIM_MIN_TOKENS)
+    only the salary regions kept. A header or footer is a line at the same
+    place near the top or bottom of two or more pages; it is kept where it
+    first appears. Other repeated lines (identical deductions, a label in
+    both the current month and year-to-date columns) are left alone.
+    """
+    if not settings.PROMPT_COMPRESSION:
+        return text
+    pages = _pages(text)
+    running = _running_lines(pages) if len(pages) > 1 else set()
+    seen = set()
+    lines = []
+    for page in pages:
+        for i, line in enumerate(page):
+            if any(k in running for k in _edge_keys(page, i)):
+                key = line.lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+            if not _BOILERPLATE.search(line):
+                lines.append(line)
+    if estimate_tokens("\n".join(lines)) > settings.PROMPT_TRIM_MIN_TOKENS:
+        lines = _salary_regions(lines, settings.PROMPT_CONTEXT_LINES)
+    return "\n".join(lines)
+
+
+def output_tokens(text: str) -> int:
+    """max_tokens for extracting `text` (already compressed), up to LLM_MAX_OUTPUT_TOKENS."""
+    if not settings.PROMPT_COMPRESSION:
+        return settings.LLM_MAX_OUTPUT_TOKENS
+    amounts = sum(1 for line in text.splitlines() if _AMOUNT.search(line))
+    return min(settings.LLM_MAX_OUTPUT_TOKENS, _OUTPUT_BASE_TOKENS + _OUTPUT_TOKENS_PER_AMOUNT * amounts)
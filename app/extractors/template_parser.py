@@ -0,0 +1,253 @@
+# app/extractors/template_parser.py
+"""
+Rule-based fast path for payslip layouts we already know.
+
+A template is a JSON file in settings.TEMPLATES_DIR with:
+  name         unique template name (reported in hit-rate stats)
+  fingerprint  regexes that must all match the load_pdf_text output
+  fields       {field: regex with a named group "value"}
+  components   optional regex with named groups "name" and "amount"
+               (applied with finditer)
+  required     fields that must be extracted for the result to be trusted
+
+Documents that match a fingerprint are extracted locally. Fields that are
+missing or fail validation are filled in by the LLM fallback; documents that
+match no fingerprint go to the LLM unchanged. Files starting with "_" are
+examples and are not loaded.
+
+No active template ships with the repo, so until one is added to
+TEMPLATES_DIR the fast path matches nothing and every document goes to the
+LLM (get_engine() logs this). templates/_example.json describes the layout
+of the synthetic payslips in benchmarks/synthetic.py; copy it without the
+underscore, or write one per employer layout, to start using it.
+"""
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Pattern
+
+from app import metrics
+from app.config import settings
+from app.services.normalize import parse_amount, parse_date, parse_month
+
+logger = logging.getLogger("template_parser")
+
+AMOUNT_FIELDS = (
+    "gross_salary", "basic", "hra", "special_allowance",
+    "tds", "pf_employee", "pf_employer", "net_pay",
+)
+TEXT_FIELDS = ("employee_name", "employee_code", "pan", "pay_date", "month")
+DEFAULT_REQUIRED = ("month", "gross_salary", "net_pay")
+
+_PAN = re.compile(r"^[A-Z]{5}[0-9]{4}[A-Z]$")
+
+
+@dataclass
+class Template:
+    name: str
+    fingerprint: List[Pattern]
+    fields: Dict[str, Pattern]
+    components: Optional[Pattern] = None
+    required: tuple = DEFAULT_REQUIRED
+
+    def matches(self, text: str) -> bool:
+        return all(p.search(text) for p in self.fingerprint)
+
+
+@dataclass
+class TemplateResult:
+    template: str
+    data: dict
+    missing: List[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+
+def _to_month(v: str) -> Optional[str]:
+    m = parse_month(v)
+    return m.strftime("%Y-%m") if m else None
+
+
+def _to_date(v: str) -> Optional[str]:
+    d = parse_date(v)
+    return d.isoformat() if d else None
+
+
+def _compile(spec: dict) -> Template:
+    flags = re.IGNORECASE | re.MULTILINE
+    return Template(
+        name=spec["name"],
+        fingerprint=[re.compile(p, flags) for p in spec["fingerprint"]],
+        fields={k: re.compile(p, flags) for k, p in spec.get("fields", {}).items()},
+        components=re.compile(spec["components"], flags) if spec.get("components") else None,
+        required=tuple(spec.get("required", DEFAULT_REQUIRED)),
+    )
+
+
+def load_templates(directory: Optional[str] = None) -> List[Template]:
+    directory = Path(directory or settings.TEMPLATES_DIR)
+    templates = []
+    if not directory.is_dir():
+        return templates
+    for p in sorted(directory.glob("*.json")):
+        if p.name.startswith("_"):
+            continue
+        try:
+            templates.append(_compile(json.loads(p.read_text(encoding="utf-8"))))
+        except Exception as e:
+            logger.warning(f"Skipping invalid payslip template {p}: {e}")
+    return templates
+
+
+class TemplateEngine:
+    def __init__(self, templates: List[Template]):
+        self.templates = templates
+        self._lock = threading.Lock()
+        self._stats = {t.name: {"matched": 0, "complete": 0, "llm_fallback": 0} for t in templates}
+        self._unmatched = 0
+
+    def identify(self, text: str) -> Optional[Template]:
+        for t in self.templates:
+            if t.matches(text):
+                return t
+        return None
+
+    def extract(self, text: str) -> Optional[TemplateResult]:
+        """Extract with the first matching template, or return None for unknown layouts."""
+        tmpl = self.identify(text)
+        if tmpl is None:
+            with self._lock:
+                self._unmatched += 1
+            metrics.TEMPLATES.inc(result="unmatched")
+            return None
+
+        data = {k: None for k in TEXT_FIELDS + AMOUNT_FIELDS}
+        for name, pattern in tmpl.fields.items():
+            m = pattern.search(text)
+            if not m:
+                continue
+            value = m.group("value").strip()
+            if name in AMOUNT_FIELDS:
+                data[name] = parse_amount(value)
+            elif name == "month":
+                data[name] = _to_month(value)
+            elif name == "pay_date":
+                data[name] = _to_date(value)
+            else:
+                data[name] = value or None
+
+        if data["pan"] and not _PAN.match(data["pan"].upper()):
+            data["pan"] = None
+        if data["month"] is None and data["pay_date"]:
+            data["month"] = data["pay_date"][:7]
+
+        components = {}
+        if tmpl.components is not None:
+            for m in tmpl.components.finditer(text):
+                amount = parse_amount(m.group("amount"))
+                if amount is not None:
+                    components[" ".join(m.group("name").split())] = amount
+        data["components"] = components
+
+        # Low-confidence values are treated as missing so the LLM re-reads them
+        gross, net = data["gross_salary"], data["net_pay"]
+        if gross is not None and net is not None and net > gross:
+            data["gross_salary"] = data["net_pay"] = None
+
+        missing = [f for f in tmpl.required if data.get(f) is None]
+        with self._lock:
+            s = self._stats[tmpl.name]
+            s["matched"] += 1
+            if missing:
+                s["llm_fallback"] += 1
+            else:
+                s["complete"] += 1
+        metrics.TEMPLATES.inc(result="partial" if missing else "complete")
+        return TemplateResult(template=tmpl.name, data=data, missing=missing)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._unmatched + sum(s["matched"] for s in self._stats.values())
+            out = {
+                name: dict(s, hit_rate=round(s["complete"] / total, 3) if total else 0.0)
+                for name, s in self._stats.items()
+            }
+            out["_unmatched"] = self._unmatched
+        return out
+
+
+_engine: Optional[TemplateEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> TemplateEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TemplateEngine(load_templates())
+            if _engine.templates:
+                logger.info(f"Loaded {len(_engine.templates)} payslip template(s)")
+            else:
+                logger.info(f"No payslip templates in {settings.TEMPLATES_DIR}; every document goes to the LLM")
+    return _engine
+
+
+def _validated(data: dict) -> dict:
+    """A complete template result, validated like an LLM one (pydantic is imported on first use)."""
+    from app.schemas import PayslipRecordIn
+
+    return PayslipRecordIn(**data).model_dump()
+
+
+def _merge(result: TemplateResult, structured: dict) -> dict:
+    """Keep the template's values; take only what it couldn't read from the LLM."""
+    merged = dict(structured)
+    for k, v in result.data.items():
+        if k == "components":
+            merged["components"] = {**(structured.get("components") or {}), **v}
+        elif v is not None:
+            merged[k] = v
+    return merged
+
+
+def parse_with_fast_path(text: str, fallback: Callable[[str], dict]) -> dict:
+    """
+    Extract with a known template when possible; otherwise (or for fields the
+    template could not read with confidence) use `fallback`, typically the LLM.
+    """
+    result = get_engine().extract(text) if settings.TEMPLATES_ENABLED else None
+    if result is not None and result.complete:
+        return _validated(result.data)
+
+    structured = fallback(text)
+    if result is None or not isinstance(structured, dict):
+        return structured
+    return _merge(result, structured)
+
+
+def parse_many_with_fast_path(texts: List[str], batch_fallback: Callable[[List[str]], list]) -> list:
+    """
+    Batch variant of parse_with_fast_path: documents the templates can't fully
+    extract are handed to `batch_fallback` together. Entries in the returned
+    list are dicts or the exception raised for that document.
+    """
+    engine = get_engine() if settings.TEMPLATES_ENABLED else None
+    results = [engine.extract(t) if engine else None for t in texts]
+    out = [None] * len(texts)
+    todo = []
+    for i, r in enumerate(results):
+        if r is not None and r.complete:
+            out[i] = _validated(r.data)
+        else:
+            todo.append(i)
+    if todo:
+        for i, structured in zip(todo, batch_fallback([texts[i] for i in todo])):
+            if results[i] is not None and isinstance(structured, dict):
+                structured = _merge(results[i], structured)
+            out[i] = structured
+    return out
@@ -0,0 +1,343 @@
+# app/metrics.py
+"""
+In-process metrics for the ingestion pipeline.
+
+Counters and histograms live in one registry and are exported in the
+Prometheus text format, either to a file (METRICS_FILE, e.g. for the
+node_exporter textfile collector) or over HTTP (METRICS_PORT, /metrics).
+At the end of a batch run, run_report() turns them into a summary with
+per-stage p50/p95, token counts, cache and template hit rates and retry
+counts, and write_report() saves it as JSON under METRICS_REPORT_DIR.
+
+Extraction runs in worker processes: the pipeline drains each worker's
+registry after every document and merges the snapshot into the parent's.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger("metrics")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+PAGE_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, registry, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self.registry.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        with self.registry.lock:
+            return sum(self.values.values())
+
+    def _merge(self, values: dict):
+        for key, v in values.items():
+            self.values[key] = self.values.get(key, 0) + v
+
+    def _render(self):
+        for key, v in sorted(self.values.items()):
+            yield f"{self.name}{self._labels(key)} {v:g}"
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, the +Inf bucket last, then sum
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _merge(self, values: dict):
+        for key, (counts, total) in values.items():
+            state = self.values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            state[0] = [a + b for a, b in zip(state[0], counts)]
+            state[1] += total
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate a quantile by linear interpolation within the bucket (like histogram_quantile)."""
+        with self.registry.lock:
+            state = self.values.get(self._key(labels))
+            counts = list(state[0]) if state else None
+        if not counts or not sum(counts):
+            return None
+        rank = q * sum(counts)
+        seen, lower = 0, 0.0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            if n and seen + n >= rank:
+                if bound == float("inf"):
+                    return self.buckets[-1]
+                return lower + (bound - lower) * (rank - seen) / n
+            seen += n
+            lower = bound if bound != float("inf") else lower
+        return self.buckets[-1]
+
+    def stats(self, **labels) -> dict:
+        with self.registry.lock:
+            state = self.values.get(self._key(labels))
+            count, total = (sum(state[0]), state[1]) if state else (0, 0.0)
+        return {
+            "count": count,
+            "sum": round(total, 3),
+            "mean": round(total / count, 3) if count else None,
+            "p50": _round(self.quantile(0.5, **labels)),
+            "p95": _round(self.quantile(0.95, **labels)),
+        }
+
+    def _render(self):
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f"{self.name}_bucket{self._labels(key, ('le', f'{bound:g}'))} {cumulative}"
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket{self._labels(key, ('le', '+Inf'))} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {total:g}"
+            yield f"{self.name}_count{self._labels(key)} {cumulative}"
+
+
+def _round(v):
+    return round(v, 3) if v is not None else None
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help, tuple(labelnames)))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, tuple(labelnames), buckets))
+
+    def _register(self, metric):
+        with self.lock:
+            self.metrics.setdefault(metric.name, metric)
+            return self.metrics[metric.name]
+
+    def snapshot(self) -> dict:
+        """Picklable copy of all values."""
+        with self.lock:
+            return {
+                name: {k: (list(v[0]), v[1]) if isinstance(v, list) else v for k, v in m.values.items()}
+                for name, m in self.metrics.items() if m.values
+            }
+
+    def reset(self):
+        with self.lock:
+            for m in self.metrics.values():
+                m.values.clear()
+
+    def drain(self) -> dict:
+        """Snapshot and reset, atomically (worker processes hand this to the parent)."""
+        with self.lock:
+            snap = self.snapshot()
+            self.reset()
+        return snap
+
+    def merge(self, snapshot: dict):
+        with self.lock:
+            for name, values in snapshot.items():
+                if name in self.metrics:
+                    self.metrics[name]._merge(values)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for m in self.metrics.values():
+                lines.append(f"# HELP {m.name} {m.help}")
+                lines.append(f"# TYPE {m.name} {m.type}")
+                lines.extend(m._render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "payslip_stage_duration_seconds", "Time spent per document (or batch) in each pipeline stage.", ("stage",))
+DOCUMENTS = REGISTRY.counter(
+    "payslip_documents_total", "Documents finished, by outcome (saved, parse_failed, failed, skipped).", ("outcome",))
+LLM_REQUESTS = REGISTRY.counter(
+    "payslip_llm_requests_total", "Chat completion requests, by outcome (ok, failed).", ("outcome",))
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "payslip_llm_request_duration_seconds", "Latency of single chat completion HTTP requests.")
+LLM_TOKENS = REGISTRY.histogram(
+    "payslip_llm_tokens", "Tokens per LLM call, by kind (prompt, completion).", ("kind",), buckets=TOKEN_BUCKETS)
+LLM_TEXT_TOKENS = REGISTRY.histogram(
+    "payslip_llm_text_tokens", "Estimated tokens of payslip text per document, by stage (raw, compressed).",
+    ("stage",), buckets=TOKEN_BUCKETS)
+LLM_RETRIES = REGISTRY.counter(
+    "payslip_llm_retries_total", "LLM retries, by reason (throttled, transient, malformed, batch).", ("reason",))
+LLM_CACHE = REGISTRY.counter(
+    "payslip_llm_cache_lookups_total", "Extraction cache lookups, by result (hit, miss).", ("result",))
+TEMPLATES = REGISTRY.counter(
+    "payslip_template_extractions_total", "Template fast-path outcomes (complete, partial, unmatched).", ("result",))
+OCR_PAGES = REGISTRY.histogram(
+    "payslip_ocr_pages", "Pages OCR'd per document.", buckets=PAGE_BUCKETS)
+INGEST_LATENCY = REGISTRY.histogram(
+    "payslip_ingest_latency_seconds", "Daemon mode: time from a file's last write to its record being saved.")
+DB_ROWS = REGISTRY.counter(
+    "payslip_db_rows_written_total", "payslips_raw rows written, by result (ok, error).", ("result",))
+
+
+def timed(stage: str):
+    """Context manager recording the block's duration under payslip_stage_duration_seconds{stage}."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def write_textfile(path: Optional[str] = None):
+    """Write the registry in Prometheus text format, atomically (write + rename)."""
+    path = path or settings.METRICS_FILE
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port: Optional[int] = None, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread; returns None when METRICS_PORT is 0."""
+    port = settings.METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def _rate(a: float, b: float) -> Optional[float]:
+    return round(a / (a + b), 3) if a + b else None
+
+
+def run_report(**extra) -> dict:
+    """Summary of the current registry plus `extra` (e.g. pipeline stats)."""
+    stages = sorted({k[0] for k in STAGE_SECONDS.values})
+    hits, misses = LLM_CACHE.get(result="hit"), LLM_CACHE.get(result="miss")
+    complete = TEMPLATES.get(result="complete")
+    return {
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        **extra,
+        "stages": {s: STAGE_SECONDS.stats(stage=s) for s in stages},
+        "documents": {k[0]: v for k, v in DOCUMENTS.values.items()},
+        "llm": {
+            "requests": {k[0]: v for k, v in LLM_REQUESTS.values.items()},
+            "request_latency_s": LLM_REQUEST_SECONDS.stats(),
+            "prompt_tokens": LLM_TOKENS.stats(kind="prompt"),
+            "completion_tokens": LLM_TOKENS.stats(kind="completion"),
+            "text_tokens": {s: LLM_TEXT_TOKENS.stats(stage=s) for s in ("raw", "compressed")},
+            "retries": {k[0]: v for k, v in LLM_RETRIES.values.items()},
+            "cache_hit_rate": _rate(hits, misses),
+        },
+        "templates": {
+            "by_result": {k[0]: v for k, v in TEMPLATES.values.items()},
+            "hit_rate": _rate(complete, TEMPLATES.total() - complete),
+        },
+        "ocr_pages": OCR_PAGES.stats(),
+        "db_rows": {k[0]: v for k, v in DB_ROWS.values.items()},
+        "ingest_latency_s": INGEST_LATENCY.stats(),
+    }
+
+
+def write_report(report: dict, directory: Optional[str] = None) -> Optional[str]:
+    directory = directory or settings.METRICS_REPORT_DIR
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"run-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    return path
+
+
+def log_report(report: dict):
+    for stage, s in report["stages"].items():
+        logger.info(f"stage {stage:<12} n={s['count']:<6} mean={s['mean']}s p50={s['p50']}s p95={s['p95']}s")
+    llm = report["llm"]
+    logger.info(
+        f"llm requests={llm['requests']} retries={llm['retries']} cache_hit_rate={llm['cache_hit_rate']} "
+        f"prompt_tokens p50={llm['prompt_tokens']['p50']} "
+        f"text_tokens sum={llm['text_tokens']['raw']['sum']}->{llm['text_tokens']['compressed']['sum']} templates={report['templates']['by_result']} "
+        f"ocr_pages={report['ocr_pages']['sum']}"
+    )
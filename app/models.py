@@ -1,27 +1,48 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Numeric, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Text, Boolean, LargeBinary, Numeric, Float, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from app.db import Base
 
+class RawTextBlob(Base):
+    """Compressed extracted text, keyed by its sha256 (see app/services/raw_text.py)."""
+    __tablename__ = "raw_text_blobs"
+    hash = Column(String(64), primary_key=True)
+    codec = Column(String(8), nullable=False)     # "zstd" or "zlib"
+    size = Column(Integer, nullable=False)        # uncompressed characters
+    data = deferred(Column(LargeBinary, nullable=False))
+
 class PayslipRaw(Base):
     __tablename__ = "payslips_raw"
     id = Column(Integer, primary_key=True)
     filename = Column(String(255), unique=True, nullable=False)
     upload_date = Column(DateTime, default=datetime.utcnow)
-    raw_text = Column(Text)
+    raw_text = deferred(Column(Text))   # legacy inline text; new rows use text_hash
+    text_hash = Column(String(64), ForeignKey('raw_text_blobs.hash'), nullable=True, index=True)
     parsed = Column(Boolean, default=False)
     parse_errors = Column(Text, nullable=True)
     records = relationship("PayslipRecord", back_populates="raw")
+    blob = relationship("RawTextBlob")
+
+    @property
+    def text(self):
+        """Extracted text, loaded on first access."""
+        if self.blob is not None:
+            from app.services.raw_text import decompress
+            return decompress(self.blob.codec, self.blob.data)
+        return self.raw_text
 
 class PayslipRecord(Base):
     __tablename__ = "payslip_records"
+    __table_args__ = (Index("ix_payslip_records_employee_month", "employee_code", "pay_month"),)
     id = Column(Integer, primary_key=True)
-    payslip_raw_id = Column(Integer, ForeignKey('payslips_raw.id'))
+    payslip_raw_id = Column(Integer, ForeignKey('payslips_raw.id'), index=True)
     employee_name = Column(String(200), nullable=True)
     employee_code = Column(String(100), nullable=True)
-    pan = Column(String(20), nullable=True)
+    pan = Column(String(20), nullable=True, index=True)
     month = Column(String(50), nullable=True)
     pay_date = Column(String(50), nullable=True)
+    pay_month = Column(Date, nullable=True, index=True)   # first day of the pay month
+    paid_on = Column(Date, nullable=True)                 # pay_date parsed
     gross_salary = Column(Numeric(12, 2), nullable=True)
     basic = Column(Numeric(12, 2), nullable=True)
     hra = Column(Numeric(12, 2), nullable=True)
@@ -33,4 +54,86 @@ class PayslipRecord(Base):
     components_json = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    raw = relationship("PayslipRaw", back_populates="records")
\ No newline at end of file
+    raw = relationship("PayslipRaw", back_populates="records")
+    components = relationship("PayslipComponent", back_populates="record")
+
+class PayslipComponent(Base):
+    """One earning/deduction line of a record (normalized name, numeric amount)."""
+    __tablename__ = "payslip_components"
+    __table_args__ = (Index("ix_payslip_components_name_record", "name", "record_id"),)
+    id = Column(Integer, primary_key=True)
+    record_id = Column(Integer, ForeignKey('payslip_records.id', ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String(100), nullable=False)
+    amount = Column(Numeric(12, 2), nullable=False)
+    record = relationship("PayslipRecord", back_populates="components")
+
+class IngestManifest(Base):
+    __tablename__ = "ingest_manifest"
+    id = Column(Integer, primary_key=True)
+    path = Column(String(512), unique=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    content_hash = Column(String(64), index=True, nullable=False)
+    payslip_raw_id = Column(Integer, ForeignKey('payslips_raw.id'), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    raw = relationship("PayslipRaw")
+
+class IngestJob(Base):
+    """One file to ingest and how far it got (see app/services/job_queue.py)."""
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (Index("ix_ingest_jobs_state_lease", "state", "lease_expires_at"),)
+    id = Column(Integer, primary_key=True)
+    path = Column(String(512), unique=True, nullable=False)
+    state = Column(String(16), nullable=False, default="pending")  # pending/extracting/parsing/done/failed
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String(128), nullable=True)       # host:pid of the worker holding it
+    lease_expires_at = Column(DateTime, nullable=True)     # pending jobs: not before (retry delay)
+    # file snapshot taken when queued, recorded in ingest_manifest on success
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    manifest_id = Column(Integer, ForeignKey('ingest_manifest.id'), nullable=True)
+    text_hash = Column(String(64), nullable=True)          # extracted text (raw_text_blobs) while parsing
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class MonthlySummary(Base):
+    """Per employee and month totals, maintained by BulkWriter (see app/services/monthly_summary.py)."""
+    __tablename__ = "monthly_summary"
+    __table_args__ = (UniqueConstraint("employee_code", "month", name="uq_monthly_summary_employee_month"),)
+    id = Column(Integer, primary_key=True)
+    employee_code = Column(String(100), nullable=False, default="")  # "" when the payslip has none
+    month = Column(String(7), nullable=False, index=True)  # YYYY-MM
+    payslips = Column(Integer, nullable=False, default=0)
+    gross_salary = Column(Numeric(14, 2), nullable=False, default=0)
+    net_pay = Column(Numeric(14, 2), nullable=False, default=0)
+    tds = Column(Numeric(14, 2), nullable=False, default=0)
+    pf_employee = Column(Numeric(14, 2), nullable=False, default=0)
+    pf_employer = Column(Numeric(14, 2), nullable=False, default=0)
+    savings = Column(Numeric(14, 2), nullable=False, default=0)
+    savings_rate_sum = Column(Float, nullable=False, default=0)   # sum of (gross - net) / gross
+    savings_rate_n = Column(Integer, nullable=False, default=0)   # payslips with gross > 0
+    components_json = Column(Text, nullable=True)                 # {component: total}
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class EmployeeStats(Base):
+    """Running per-employee statistics over monthly totals, maintained by BulkWriter (see app/services/employee_stats.py)."""
+    __tablename__ = "employee_stats"
+    __table_args__ = (Index("ix_employee_stats_anomaly", "anomaly", "last_month"),)
+    id = Column(Integer, primary_key=True)
+    employee_code = Column(String(100), unique=True, nullable=False)
+    months = Column(Integer, nullable=False, default=0)       # months with payslips
+    net_pay_mean = Column(Float, nullable=False, default=0)   # Welford mean / sum of squared
+    net_pay_m2 = Column(Float, nullable=False, default=0)     # deviations of monthly net pay
+    recent_json = Column(Text, nullable=True)                 # {"YYYY-MM": [gross, net, tds]}, latest months
+    last_month = Column(String(7), nullable=True)             # YYYY-MM
+    last_net_pay = Column(Numeric(14, 2), nullable=True)
+    net_pay_z = Column(Float, nullable=True)          # last month against the other months
+    anomaly = Column(Boolean, nullable=False, default=False)
+    net_pay_yoy = Column(Float, nullable=True)        # last month vs the same month a year earlier
+    fiscal_year = Column(String(7), nullable=True)    # "2024-25", April to March
+    tds_fy_to_date = Column(Numeric(14, 2), nullable=True)
+    tds_projected = Column(Numeric(14, 2), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,50 @@
+# scripts/export_payslips.py
+"""
+Stream payslip records to CSV or Parquet with bounded memory.
+
+    python -m app.scripts.export_payslips --out payslips.csv
+    python -m app.scripts.export_payslips --format parquet --out payslips.parquet --from 2024-04 --to 2025-03
+    python -m app.scripts.export_payslips --employee E1234 > e1234.csv
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Ensure project root is on path when running as script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from app.services.export import DEFAULT_CHUNK_SIZE, FORMATS, export
+from app.services.normalize import parse_month
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", stream=sys.stderr)
+logger = logging.getLogger("export_payslips")
+
+
+def _month(value):
+    month = parse_month(value)
+    if month is None:
+        raise argparse.ArgumentTypeError(f"not a month: {value!r} (use YYYY-MM)")
+    return month
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    ap.add_argument("--out", default="-", help="output file (default: stdout, CSV only)")
+    ap.add_argument("--from", dest="start", type=_month, help="first pay month, YYYY-MM")
+    ap.add_argument("--to", dest="end", type=_month, help="last pay month, YYYY-MM")
+    ap.add_argument("--employee", help="only this employee_code")
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = ap.parse_args(argv)
+
+    if args.out == "-" and args.format != "csv":
+        ap.error("--out is required for Parquet")
+    out = sys.stdout if args.out == "-" else args.out
+    rows = export(out, args.format, chunk_size=args.chunk_size,
+                  start=args.start, end=args.end, employee_code=args.employee)
+    logger.info(f"Exported {rows} record(s) to {args.out if args.out != '-' else 'stdout'}")
+
+
+if __name__ == "__main__":
+    main()
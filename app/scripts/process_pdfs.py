@@ -1,8 +1,10 @@
 # scripts/process_pdfs.py
 import os
 import time
-import json
+import signal
 import logging
+import argparse
+import threading
 from pathlib import Path
 from tqdm import tqdm
 from typing import Optional
@@ -11,12 +13,21 @@ from typing import Optional
 import sys
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from app import metrics
 from app.config import settings
-from app.db import SessionLocal, init_db
-from app.models import PayslipRaw, PayslipRecord
+from app.db import SessionLocal, engine, init_db
 from app.extractors.pdf_loader import load_pdf_text
 from app.extractors.ocr_fallback import ocr_pdf
-from app.extractors.llm_parser import parse_with_llm
+from app.extractors.hybrid_loader import load_pdf_text_hybrid
+from app.extractors.llm_parser import parse_batch_with_llm, parse_prompt_text, parse_with_llm, usage_stats
+from app.extractors.llm_cache import get_cache
+from app.extractors.llm_dispatcher import dispatcher_status
+from app.extractors.template_parser import get_engine, parse_many_with_fast_path, parse_with_fast_path
+from app.services.bulk_writer import BulkWriter, PayslipRow, record_values
+from app.services import job_queue
+from app.services.folder_watcher import FolderWatcher
+from app.services.manifest import Manifest
+from app.services.pipeline import WorkItem, run_pipeline
 
 # Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
@@ -24,19 +35,25 @@ logger = logging.getLogger("process_pdfs")
 
 # Controls
 PDF_DIR = Path(settings.PDF_FOLDER)
-PDF_DIR.mkdir(parents=True, exist_ok=True)
 MIN_TEXT_LENGTH_FOR_NO_OCR = 200  # if extracted text shorter -> use OCR fallback
-LLM_RETRY_COUNT = 3
-LLM_RETRY_BACKOFF = 2  # seconds (exponential backoff base)
-
-# Make sure DB exists / tables created
-init_db()
+LLM_RETRY_COUNT = 3  # attempts for unparseable LLM output
+WATCH_TICK = 0.5  # daemon: longest wait for new files before checking for shutdown
+WATCH_CLAIM_INTERVAL = 10  # daemon: how often to look for retries that fell due
+WATCH_METRICS_INTERVAL = 15  # daemon: how often to rewrite METRICS_FILE
 
 def load_text_with_fallback(path: str) -> str:
     """
-    Try to load text with PyPDFLoader first. If the text is short or empty,
-    use OCR fallback (pdf2image + pytesseract).
+    Extract text page by page, OCR'ing only pages without a usable text layer
+    (see hybrid_loader). If that fails, load the whole document with the
+    configured text backend and use OCR fallback (pdf2image + pytesseract)
+    when the text is short or empty.
     """
+    if settings.HYBRID_EXTRACTION:
+        try:
+            return load_pdf_text_hybrid(path)
+        except Exception as e:
+            logger.warning(f"Per-page extraction failed for {path}: {e}. Falling back to whole-document load.")
+
     try:
         text = load_pdf_text(path)
     except Exception as e:
@@ -55,111 +72,312 @@ def load_text_with_fallback(path: str) -> str:
             logger.exception(f"OCR fallback failed for {path}: {e}")
     return text
 
-def llm_parse_with_retries(text: str, retries: int = LLM_RETRY_COUNT) -> dict:
+def llm_parse_with_retries(text: str, retries: int = LLM_RETRY_COUNT, parse=parse_with_llm) -> dict:
     """
-    Call the LLM parser with retries and exponential backoff.
+    Call the LLM parser (`parse`), re-asking when the answer isn't usable JSON.
+    Rate limits and transient API errors are already retried (with
+    Retry-After / jittered backoff) by the dispatcher, so API errors that
+    reach this point are final and are not retried again.
     """
+    import openai
+
     last_exc = None
     for attempt in range(1, retries + 1):
         try:
-            parsed = parse_with_llm(text)
+            parsed = parse(text)
             # Basic validation: should be a dict
             if isinstance(parsed, dict):
                 return parsed
             else:
                 raise ValueError("LLM returned non-dict output")
+        except openai.APIError:
+            raise
         except Exception as e:
             last_exc = e
             logger.warning(f"LLM parse attempt {attempt}/{retries} failed: {e}")
-            sleep_time = LLM_RETRY_BACKOFF ** attempt
-            logger.info(f"Sleeping {sleep_time}s before retry...")
-            time.sleep(sleep_time)
+            if attempt < retries:
+                metrics.LLM_RETRIES.inc(reason="malformed")
     # after retries
     raise last_exc
 
+def parse_payslip(text: str) -> dict:
+    """Known layouts are extracted locally; everything else goes to the LLM."""
+    return parse_with_fast_path(text, llm_parse_with_retries)
+
+def parse_payslips(texts) -> list:
+    """Batch variant of parse_payslip; malformed batch elements are retried one by one."""
+    return parse_many_with_fast_path(
+        texts, lambda batch: parse_batch_with_llm(
+            batch, single_fn=lambda prompt_text: llm_parse_with_retries(prompt_text, parse=parse_prompt_text)
+        )
+    )
+
+def to_row(item: WorkItem) -> PayslipRow:
+    """
+    `item.meta` is the claimed job. An earlier attempt may have left a raw row
+    behind, so the writer reuses the row with this filename if there is one.
+    """
+    job = item.meta
+    return PayslipRow(
+        filename=item.path.name,
+        raw_text=item.text,
+        record=record_values(item.structured) if not item.error else None,
+        parse_errors=item.error,
+        replace=True,
+        manifest=job.entry,
+        job_id=job.id,
+    )
+
+def write_results(items) -> list:
+    """Pipeline writer callback: bulk-insert a batch, one error (or None) per item."""
+    return [r.error for r in BulkWriter(batch_size=len(items)).write([to_row(i) for i in items])]
+
+def job_item(job: job_queue.Job) -> WorkItem:
+    return WorkItem(path=job.path, text=job.text or "", meta=job)
+
+def mark_parsing(item: WorkItem):
+    """Pipeline on_extracted callback: keep the text with the job and move it to parsing."""
+    job_queue.mark_parsing(engine, item.meta.id, item.text)
+
+def mark_failed(item: WorkItem, error: str):
+    """Pipeline on_failed callback: record the failed attempt (retried later, up to JOB_MAX_ATTEMPTS)."""
+    job_queue.fail(engine, [(item.meta.id, error)])
+
 def process_file(path: Path):
     session = SessionLocal()
     try:
         filename = path.name
-        # Skip already processed filename (based on PayslipRaw.filename)
-        existing = session.query(PayslipRaw).filter_by(filename=filename).first()
-        if existing:
-            logger.info(f"Skipping {filename}: already processed (id={existing.id}, parsed={existing.parsed})")
+        manifest = Manifest.load(session, paths=[path])
+        state = manifest.check(path)
+        manifest.flush(session)
+        session.commit()
+        if state is None:
+            metrics.DOCUMENTS.inc(outcome="skipped")
+            logger.info(f"Skipping {filename}: unchanged since it was last processed")
             return
+    finally:
+        session.close()
 
-        logger.info(f"Processing {filename} ...")
-        text = load_text_with_fallback(str(path))
+    with engine.begin() as conn:
+        job_queue.enqueue(conn, [state])
+    claimed = job_queue.claim(limit=1, paths=[state.entry.path])
+    if not claimed:
+        logger.info(f"Skipping {filename}: being processed by another worker, or failed too often")
+        return
+    item = job_item(claimed[0])
 
-        # Save raw
-        raw = PayslipRaw(filename=filename, raw_text=text)
-        session.add(raw)
-        session.commit()  # so raw.id is available
-        logger.debug(f"Saved PayslipRaw id={raw.id}")
+    try:
+        logger.info(f"Processing {filename} ({state.action}, attempt {item.meta.attempts}) ...")
+        if not item.text:
+            with metrics.timed("extract"):
+                item.text = load_text_with_fallback(str(path))
+            mark_parsing(item)
 
         # Parse with LLM (with retries)
         try:
-            structured = llm_parse_with_retries(text)
+            with metrics.timed("parse"):
+                item.structured = parse_payslip(item.text)
         except Exception as e:
-            session.rollback()
-            raw.parse_errors = f"LLM parse failed after retries: {repr(e)}"
-            session.add(raw)
-            session.commit()
+            item.error = f"LLM parse failed after retries: {repr(e)}"
             logger.exception(f"LLM parse failed for {filename}; logged error and continuing.")
-            return
 
-        # Normalize / safe-extract fields (some fields might be strings)
-        def get_number(v):
-            if v is None:
-                return None
-            try:
-                if isinstance(v, (int, float)):
-                    return v
-                # strip commas and currency symbols
-                s = str(v).strip().replace(",", "").replace("₹", "").replace("Rs.", "").replace("INR", "")
-                return float(s) if s != "" else None
-            except Exception:
-                return None
-
-        rec = PayslipRecord(
-            payslip_raw_id=raw.id,
-            employee_name=structured.get("employee_name"),
-            employee_code=structured.get("employee_code"),
-            pan=structured.get("pan"),
-            pay_date=structured.get("pay_date"),
-            month=structured.get("month"),
-            gross_salary=get_number(structured.get("gross_salary")),
-            basic=get_number(structured.get("basic")),
-            hra=get_number(structured.get("hra")),
-            special_allowance=get_number(structured.get("special_allowance")),
-            tds=get_number(structured.get("tds")),
-            pf_employee=get_number(structured.get("pf_employee")),
-            pf_employer=get_number(structured.get("pf_employer")),
-            net_pay=get_number(structured.get("net_pay")),
-            components_json=json.dumps(structured.get("components", {}), ensure_ascii=False)
-        )
-        session.add(rec)
-        raw.parsed = True
-        session.add(raw)
-        session.commit()
-        logger.info(f"Parsed and saved record for {filename} (record id={rec.id})")
+        error = write_results([item])[0]
+        metrics.DOCUMENTS.inc(outcome="failed" if error else "parse_failed" if item.error else "saved")
+        if error:
+            mark_failed(item, f"DB write failed: {error}")
+            logger.error(f"Failed to save {filename}: {error}")
+        elif not item.error:
+            logger.info(f"Parsed and saved record for {filename}")
     except Exception as e:
-        session.rollback()
+        metrics.DOCUMENTS.inc(outcome="failed")
+        mark_failed(item, repr(e))
         logger.exception(f"Unexpected error processing {path}: {e}")
+
+def queue_pending(pdfs, whole_manifest: bool = True) -> int:
+    """
+    Queue files that are new or whose content changed since they were
+    ingested, decided in memory against the manifest (loaded with one query
+    per table; only the rows of `pdfs` unless `whole_manifest`). Returns the
+    number of files queued.
+    """
+    session = SessionLocal()
+    try:
+        manifest = Manifest.load(session, paths=None if whole_manifest else pdfs)
+        todo = manifest.scan(pdfs)
+        manifest.flush(session)
+        session.commit()
     finally:
         session.close()
+    skipped = len(pdfs) - len(todo)
+    if skipped:
+        metrics.DOCUMENTS.inc(skipped, outcome="skipped")
+        logger.info(f"Skipping {skipped} unchanged file(s)")
+    with engine.begin() as conn:
+        return job_queue.enqueue(conn, todo)
+
+def log_saved(item: WorkItem):
+    """Daemon on_saved callback: log and record how long after its last write the file was saved."""
+    latency = time.time() - item.meta.entry.mtime_ns / 1e9
+    metrics.INGEST_LATENCY.observe(latency)
+    outcome = "with a parse error" if item.error else "and saved"
+    logger.info(f"Parsed {item.path.name} {outcome}, {latency:.1f}s after it was written")
+
+def watch_items(watcher: FolderWatcher, stop: threading.Event):
+    """
+    Daemon source for run_pipeline: queues files as the watcher reports them
+    and yields their jobs (and retries that fell due), or None while idle.
+    Jobs claimed but not handed out yet when `stop` is set are released.
+    """
+    next_claim = next_metrics = 0.0
+    while not stop.is_set():
+        ready = watcher.poll(timeout=WATCH_TICK)
+        if ready:
+            queued = queue_pending(ready, whole_manifest=False)
+            logger.info(f"{len(ready)} file(s) landed, {queued} queued")
+        now = time.monotonic()
+        if ready or now >= next_claim:
+            next_claim = now + WATCH_CLAIM_INTERVAL
+            while not stop.is_set():
+                batch = job_queue.claim()
+                if not batch:
+                    break
+                for i, job in enumerate(batch):
+                    if stop.is_set():
+                        job_queue.release(engine, [j.id for j in batch[i:]])
+                        return
+                    yield job_item(job)
+        if now >= next_metrics:
+            next_metrics = now + WATCH_METRICS_INTERVAL
+            metrics.write_textfile()
+        yield None
+
+def watch():
+    """
+    Daemon mode: ingest PDFs as they land in PDF_FOLDER until SIGINT/SIGTERM.
+    The first signal stops taking new files and lets the ones in progress
+    finish; a second one exits immediately.
+    """
+    stop = threading.Event()
+    main_pid = os.getpid()
+
+    def request_stop(signum, frame):
+        if os.getpid() != main_pid:
+            return  # an extraction worker (forked with this handler): the daemon winds it down
+        logger.info(f"Received {signal.Signals(signum).name}: finishing files in progress (signal again to exit now)")
+        stop.set()
+        signal.signal(signum, signal.default_int_handler if signum == signal.SIGINT else signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    metrics.start_http_server()
+    logger.info(f"Jobs by state: {job_queue.counts()}")
+    with FolderWatcher(PDF_DIR) as watcher, job_queue.LeaseKeeper():
+        run_stats = run_pipeline(
+            watch_items(watcher, stop),
+            extract_fn=load_text_with_fallback,
+            parse_fn=parse_payslip,
+            parse_many_fn=parse_payslips,
+            write_fn=write_results,
+            on_saved=log_saved,
+            on_extracted=mark_parsing,
+            on_failed=mark_failed,
+        )
+    logger.info(f"Stopped watching {PDF_DIR}; jobs by state: {job_queue.counts()}")
+    report_run(run_stats)
+
+def report_run(run_stats: dict):
+    logger.info(f"Template fast path: {get_engine().stats()}")
+    logger.info(f"LLM usage: {usage_stats()}, dispatcher: {dispatcher_status()}")
+    cache = get_cache()
+    if cache is not None:
+        logger.info(f"LLM cache: {cache.stats()}")
+
+    report = metrics.run_report(pipeline=run_stats, dispatcher=dispatcher_status())
+    metrics.log_report(report)
+    metrics.write_textfile()
+    path = metrics.write_report(report)
+    if path:
+        logger.info(f"Run report written to {path}")
+
+def dry_run(pdfs) -> int:
+    """
+    Print what a run would do with `pdfs`, decided against the manifest like
+    queue_pending() but without writing anything or calling the LLM.
+    Returns the number of files that would be queued.
+    """
+    session = SessionLocal()
+    try:
+        todo = Manifest.load(session).scan(pdfs)
+    finally:
+        session.close()
+    for state in todo:
+        print(f"{state.action:<10} {state.entry.path}")
+    print(f"{len(todo)} of {len(pdfs)} file(s) in {PDF_DIR} would be queued, "
+          f"{len(pdfs) - len(todo)} unchanged; jobs by state: {job_queue.counts() or 'none'}")
+    return len(todo)
+
+def status():
+    """Print the job queue and the LLM and template configuration, without processing anything."""
+    jobs = job_queue.counts()
+    print(f"PDF folder:      {PDF_DIR} ({len(list(PDF_DIR.glob('*.pdf')))} PDF(s))")
+    print(f"Jobs by state:   {jobs or 'none'}")
+    print(f"LLM:             {settings.LLM_MODEL}, batch size {settings.LLM_BATCH_SIZE}, "
+          f"cache {'on' if settings.LLM_CACHE_ENABLED else 'off'}")
+    print(f"Templates:       {len(get_engine().templates) if settings.TEMPLATES_ENABLED else 'disabled'}")
 
 def main():
+    ap = argparse.ArgumentParser(description="Ingest the payslip PDFs in PDF_FOLDER.")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--watch", action="store_true",
+                      help="keep running and ingest files as they land in the folder (stop with Ctrl-C / SIGTERM)")
+    mode.add_argument("--dry-run", action="store_true",
+                      help="list the files that would be queued (new or changed) and exit")
+    mode.add_argument("--status", action="store_true",
+                      help="show the job queue and configuration and exit")
+    args = ap.parse_args()
+
+    # Make sure DB exists / tables created
+    init_db()
+    if args.status:
+        status()
+        return
+    if args.watch:
+        watch()
+        return
+
+    PDF_DIR.mkdir(parents=True, exist_ok=True)
     pdfs = sorted(PDF_DIR.glob("*.pdf"))
+    if args.dry_run:
+        dry_run(pdfs)
+        return
     if not pdfs:
         logger.info(f"No PDF files found in {PDF_DIR}. Drop your payslips there and re-run.")
         return
 
     logger.info(f"Found {len(pdfs)} PDF(s) in {PDF_DIR}")
-    for p in tqdm(pdfs, desc="Processing PDFs"):
-        try:
-            process_file(p)
-        except Exception as e:
-            logger.exception(f"Failed to process {p.name}: {e}")
+    metrics.start_http_server()
+    queued = queue_pending(pdfs)
+    jobs = job_queue.counts()
+    outstanding = sum(jobs.get(s, 0) for s in (job_queue.PENDING,) + job_queue.ACTIVE)
+    logger.info(f"Queued {queued} file(s); jobs by state: {jobs}")
+    if not outstanding:
+        return
+
+    # Jobs are claimed as the pipeline pulls them, so other workers can share the queue
+    items = (job_item(job) for job in job_queue.iter_claims())
+    with job_queue.LeaseKeeper(), tqdm(total=outstanding, desc="Processing PDFs") as bar:
+        run_stats = run_pipeline(
+            items,
+            extract_fn=load_text_with_fallback,
+            parse_fn=parse_payslip,
+            parse_many_fn=parse_payslips,
+            write_fn=write_results,
+            on_saved=lambda item: bar.update(1),
+            on_extracted=mark_parsing,
+            on_failed=mark_failed,
+        )
+    logger.info(f"Jobs by state: {job_queue.counts()}")
+    report_run(run_stats)
 
 if __name__ == "__main__":
     main()
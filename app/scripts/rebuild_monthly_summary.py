@@ -0,0 +1,26 @@
+# scripts/rebuild_monthly_summary.py
+"""Recompute the monthly_summary and employee_stats tables from payslip_records (backfill / repair)."""
+import logging
+import sys
+from pathlib import Path
+
+# Ensure project root is on path when running as script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from app.db import init_db
+from app.services import employee_stats, monthly_summary
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger("rebuild_monthly_summary")
+
+
+def main():
+    init_db()
+    rows = monthly_summary.rebuild()
+    logger.info(f"monthly_summary now holds {rows} employee-month row(s)")
+    employees = employee_stats.rebuild()
+    logger.info(f"employee_stats now holds {employees} employee(s)")
+
+
+if __name__ == "__main__":
+    main()
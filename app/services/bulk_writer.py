@@ -0,0 +1,233 @@
+# app/services/bulk_writer.py
+"""
+Bulk persistence for parsed payslips.
+
+Rows are written in chunks of DB_BATCH_SIZE, one transaction per chunk:
+the extracted texts go to raw_text_blobs (compressed, deduplicated by hash),
+payslips_raw and payslip_records rows are inserted with a single executemany
+INSERT ... RETURNING each (one INSERT per row on backends without executemany
+RETURNING, e.g. MySQL), then payslip_components and manifest rows with plain
+executemany, and the monthly_summary totals and the employee_stats of the
+employees concerned are adjusted for the added and replaced records. Rows that come from the job queue close their job in the
+same transaction (see app.services.job_queue). If a chunk fails it is split
+in halves and retried, down to one row per transaction, so a bad row only
+fails itself.
+"""
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from app import metrics
+from app.config import settings
+from app.db import engine
+from app.models import IngestManifest, PayslipRaw, PayslipRecord
+from app.services import components, employee_stats, job_queue, monthly_summary, raw_text
+from app.services.normalize import parse_amount, parse_date, pay_month
+
+logger = logging.getLogger("bulk_writer")
+
+raws = PayslipRaw.__table__
+records = PayslipRecord.__table__
+manifest = IngestManifest.__table__
+
+
+def record_values(structured: dict) -> dict:
+    """Map parser output onto payslip_records column values."""
+    return {
+        "employee_name": structured.get("employee_name"),
+        "employee_code": structured.get("employee_code"),
+        "pan": structured.get("pan"),
+        "pay_date": structured.get("pay_date"),
+        "month": structured.get("month"),
+        "pay_month": pay_month(structured.get("month"), structured.get("pay_date")),
+        "paid_on": parse_date(structured.get("pay_date")),
+        "gross_salary": parse_amount(structured.get("gross_salary")),
+        "basic": parse_amount(structured.get("basic")),
+        "hra": parse_amount(structured.get("hra")),
+        "special_allowance": parse_amount(structured.get("special_allowance")),
+        "tds": parse_amount(structured.get("tds")),
+        "pf_employee": parse_amount(structured.get("pf_employee")),
+        "pf_employer": parse_amount(structured.get("pf_employer")),
+        "net_pay": parse_amount(structured.get("net_pay")),
+        "components_json": json.dumps(structured.get("components", {}), ensure_ascii=False),
+    }
+
+
+@dataclass
+class PayslipRow:
+    filename: str
+    raw_text: str
+    record: Optional[dict] = None        # record_values(...), None when parsing failed
+    parse_errors: Optional[str] = None
+    replace: bool = False                # a payslips_raw row with this filename may already exist
+    manifest: Optional[object] = None    # ManifestEntry to record on success
+    job_id: Optional[int] = None         # ingest_jobs row to close with this write
+
+
+@dataclass
+class WriteResult:
+    raw_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+def _insert_returning_ids(conn, table, params: List[dict]) -> List[int]:
+    """Insert rows and return their primary keys in parameter order."""
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        return conn.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), params
+        ).scalars().all()
+    return [conn.execute(insert(table), p).inserted_primary_key[0] for p in params]
+
+
+class BulkWriter:
+    def __init__(self, batch_size: Optional[int] = None, bind=None):
+        self.batch_size = max(1, batch_size or settings.DB_BATCH_SIZE)
+        self.bind = bind or engine
+        self._buffer: List[PayslipRow] = []
+
+    def add(self, row: PayslipRow) -> List[WriteResult]:
+        """Buffer a row; returns the results of the chunk if this filled it."""
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[WriteResult]:
+        rows, self._buffer = self._buffer, []
+        return self.write(rows)
+
+    def write(self, rows: List[PayslipRow]) -> List[WriteResult]:
+        """Write rows in chunks of batch_size; one WriteResult per row, in order."""
+        results = []
+        for i in range(0, len(rows), self.batch_size):
+            with metrics.timed("db_write"):
+                results.extend(self._write_chunk(rows[i:i + self.batch_size]))
+        for r in results:
+            metrics.DB_ROWS.inc(result="error" if r.error else "ok")
+        return results
+
+    def _write_chunk(self, rows: List[PayslipRow]) -> List[WriteResult]:
+        try:
+            with self.bind.begin() as conn:
+                ids = self._insert(conn, rows)
+            return [WriteResult(raw_id=i) for i in ids]
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error(f"DB write failed for {rows[0].filename}: {e}")
+                return [WriteResult(error=repr(e))]
+            # Bisect so only the bad row(s) end up failing
+            logger.warning(f"Bulk write of {len(rows)} row(s) failed ({e}); retrying in halves")
+            mid = len(rows) // 2
+            return self._write_chunk(rows[:mid]) + self._write_chunk(rows[mid:])
+
+    def _insert(self, conn, rows: List[PayslipRow]) -> List[int]:
+        now = datetime.utcnow()
+        raw_ids: List[Optional[int]] = [None] * len(rows)
+        deltas = monthly_summary.Deltas()
+        hashes = raw_text.store(conn, [r.raw_text for r in rows])
+
+        # Re-ingested files keep their raw row. Their old records are only replaced when the
+        # new text parsed; a failed re-parse keeps them and just records the error.
+        replaced = [r.filename for r in rows if r.replace]
+        old_hashes = []
+        if replaced:
+            existing = {}
+            for filename, raw_id, old_hash in conn.execute(
+                select(raws.c.filename, raws.c.id, raws.c.text_hash).where(raws.c.filename.in_(replaced))
+            ):
+                existing[filename] = (raw_id, old_hash)
+            for i, r in enumerate(rows):
+                if r.replace and r.filename in existing:
+                    raw_ids[i], old_hash = existing[r.filename]
+                    old_hashes.append(old_hash if r.record is not None else hashes[i])
+            reparsed = [i for i, raw_id in enumerate(raw_ids) if raw_id is not None and rows[i].record is not None]
+            failed = [i for i, raw_id in enumerate(raw_ids) if raw_id is not None and rows[i].record is None]
+            if reparsed:
+                reparsed_ids = [raw_ids[i] for i in reparsed]
+                monthly_summary.subtract_records(conn, deltas, reparsed_ids)
+                components.delete_for_raws(conn, reparsed_ids)
+                conn.execute(delete(records).where(records.c.payslip_raw_id.in_(reparsed_ids)))
+                conn.execute(
+                    update(raws).where(raws.c.id == bindparam("b_id")).values(
+                        raw_text=None,
+                        text_hash=bindparam("b_text_hash"),
+                        parsed=True,
+                        parse_errors=bindparam("b_parse_errors"),
+                        upload_date=now,
+                    ),
+                    [{"b_id": raw_ids[i], "b_text_hash": hashes[i], "b_parse_errors": rows[i].parse_errors}
+                     for i in reparsed],
+                )
+            if failed:
+                conn.execute(
+                    update(raws).where(raws.c.id == bindparam("b_id")).values(
+                        parse_errors=bindparam("b_parse_errors"),
+                    ),
+                    [{"b_id": raw_ids[i], "b_parse_errors": rows[i].parse_errors} for i in failed],
+                )
+
+        new = [i for i, raw_id in enumerate(raw_ids) if raw_id is None]
+        if new:
+            params = [
+                {
+                    "filename": rows[i].filename,
+                    "text_hash": hashes[i],
+                    "parsed": rows[i].record is not None,
+                    "parse_errors": rows[i].parse_errors,
+                    "upload_date": now,
+                }
+                for i in new
+            ]
+            ids = _insert_returning_ids(conn, raws, params)
+            for i, raw_id in zip(new, ids):
+                raw_ids[i] = raw_id
+
+        parsed = [i for i, r in enumerate(rows) if r.record is not None]
+        if parsed:
+            record_ids = _insert_returning_ids(conn, records, [
+                dict(rows[i].record, payslip_raw_id=raw_ids[i], created_at=now, updated_at=now)
+                for i in parsed
+            ])
+            component_rows = [
+                c for i, record_id in zip(parsed, record_ids)
+                for c in components.component_rows(record_id, rows[i].record.get("components_json"))
+            ]
+            if component_rows:
+                conn.execute(insert(components.components), component_rows)
+            for i in parsed:
+                deltas.add(rows[i].record)
+        employee_stats.apply(conn, monthly_summary.apply(conn, deltas))
+
+        # Only successful parses enter the manifest, so failures are retried next run
+        entries = [(rows[i].manifest, raw_ids[i]) for i in parsed if rows[i].manifest is not None]
+        updates = [
+            {"b_id": e.id, "b_size": e.size, "b_mtime_ns": e.mtime_ns, "b_hash": e.content_hash, "b_raw_id": raw_id}
+            for e, raw_id in entries if e.id is not None
+        ]
+        inserts = [
+            {"path": e.path, "size": e.size, "mtime_ns": e.mtime_ns, "content_hash": e.content_hash,
+             "payslip_raw_id": raw_id, "updated_at": now}
+            for e, raw_id in entries if e.id is None
+        ]
+        if updates:
+            conn.execute(
+                update(manifest).where(manifest.c.id == bindparam("b_id")).values(
+                    size=bindparam("b_size"),
+                    mtime_ns=bindparam("b_mtime_ns"),
+                    content_hash=bindparam("b_hash"),
+                    payslip_raw_id=bindparam("b_raw_id"),
+                    updated_at=now,
+                ),
+                updates,
+            )
+        if inserts:
+            conn.execute(insert(manifest), inserts)
+        job_queue.finish(conn, [(r.job_id, r.parse_errors) for r in rows if r.job_id is not None])
+        # replaced texts, and the new texts of failed re-parses (the row keeps its old one); after
+        # finish() so the jobs closed here no longer hold them
+        raw_text.prune(conn, old_hashes)
+        return raw_ids
@@ -0,0 +1,101 @@
+# app/services/components.py
+"""
+Normalized payslip components (the payslip_components table).
+
+Parser output keeps components as a {name: amount} dict that is also stored
+in payslip_records.components_json. BulkWriter additionally writes one
+payslip_components row per component, with the name normalized and the
+amount numeric, so top-N queries are one indexed GROUP BY instead of parsing
+JSON in Python. backfill() fills the table for records that have no rows
+yet (the rebuild script runs it; migration 0001 keeps its own copy).
+"""
+import json
+import logging
+import re
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from app.db import engine
+from app.models import PayslipComponent, PayslipRecord
+from app.services.normalize import parse_decimal
+
+logger = logging.getLogger("components")
+
+components = PayslipComponent.__table__
+records = PayslipRecord.__table__
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_name(name) -> str:
+    """Collapse whitespace, drop trailing punctuation and capitalize words (acronyms kept)."""
+    words = _SPACES.sub(" ", str(name)).strip(" :-.").split(" ")
+    return " ".join(w if w.isupper() else w.capitalize() for w in words if w)[:100]
+
+
+def component_amounts(raw) -> Dict[str, Decimal]:
+    """{normalized name: amount} from a components dict or its JSON; unparseable values are skipped."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return {}
+    out: Dict[str, Decimal] = {}
+    if isinstance(raw, dict):
+        for name, value in raw.items():
+            amount = parse_decimal(value)
+            key = normalize_name(name)
+            if amount is not None and key:
+                out[key] = out.get(key, Decimal(0)) + amount
+    return out
+
+
+def component_rows(record_id: int, raw) -> List[dict]:
+    return [{"record_id": record_id, "name": k, "amount": v} for k, v in component_amounts(raw).items()]
+
+
+def delete_for_raws(conn, raw_ids: Iterable[int]):
+    """Remove the components of the records belonging to `raw_ids`."""
+    raw_ids = list(raw_ids)
+    if raw_ids:
+        record_ids = select(records.c.id).where(records.c.payslip_raw_id.in_(raw_ids))
+        conn.execute(delete(components).where(components.c.record_id.in_(record_ids)))
+
+
+def backfill(conn, chunk_size: int = 1000) -> int:
+    """Insert components for records that have none yet; returns the rows inserted."""
+    has_rows = select(components.c.id).where(components.c.record_id == records.c.id).exists()
+    stmt = select(records.c.id, records.c.components_json).where(
+        records.c.components_json.isnot(None), ~has_rows
+    )
+    pending = conn.execute(stmt).all()
+    inserted = 0
+    for i in range(0, len(pending), chunk_size):
+        rows = [r for record_id, raw in pending[i:i + chunk_size] for r in component_rows(record_id, raw)]
+        if rows:
+            conn.execute(insert(components), rows)
+            inserted += len(rows)
+    logger.info(f"Backfilled {inserted} component row(s) for {len(pending)} record(s)")
+    return inserted
+
+
+def top_components(limit: int = 5, months: Optional[Iterable[date]] = None,
+                   employee_code: Optional[str] = None, bind=None) -> List[tuple]:
+    """
+    [(name, total)] of the `limit` largest components, across all records or
+    only those whose pay_month is in `months` / of `employee_code`.
+    """
+    total = func.sum(components.c.amount).label("total")
+    stmt = select(components.c.name, total)
+    if months is not None or employee_code is not None:
+        stmt = stmt.join(records, records.c.id == components.c.record_id)
+        if months is not None:
+            stmt = stmt.where(records.c.pay_month.in_(list(months)))
+        if employee_code is not None:
+            stmt = stmt.where(records.c.employee_code == employee_code)
+    stmt = stmt.group_by(components.c.name).order_by(total.desc()).limit(limit)
+    with (bind or engine).connect() as conn:
+        return [(name, float(amount)) for name, amount in conn.execute(stmt).all()]
@@ -0,0 +1,116 @@
+# app/services/dashboard_data.py
+"""
+Data access for the Streamlit dashboard.
+
+monthly_totals() reads the monthly_summary table, which BulkWriter
+maintains at ingest time, so charting costs O(months) rather than
+O(payslips). Record months come from the typed pay_month column; nothing is
+parsed from strings here.
+
+record_rows() reads the detail table: the month / employee filters and a
+row limit (DASHBOARD_DETAIL_ROWS) are applied in SQL on the indexed
+pay_month and employee_code columns, so only the rows shown are loaded. The
+full record set is only read by the export (app/services/export.py), which
+streams it.
+"""
+import logging
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.db import engine
+from app.models import MonthlySummary, PayslipRaw, PayslipRecord
+from app.services.normalize import month_labels, parse_amounts, parse_dates
+
+logger = logging.getLogger("dashboard_data")
+
+records = PayslipRecord.__table__
+raws = PayslipRaw.__table__
+summary = MonthlySummary.__table__
+
+RECORD_COLUMNS = [
+    "id", "filename", "employee_code", "pay_month", "pay_date", "gross_salary", "net_pay",
+    "tds", "pf_employee", "pf_employer", "components_json",
+]
+MONEY_COLUMNS = ["gross_salary", "net_pay", "tds", "pf_employee", "pf_employer"]
+
+
+def monthly_totals(employee_code: Optional[str] = None, bind=None) -> pd.DataFrame:
+    """
+    Per-month sums of gross, net, TDS and savings, plus the sum and count of
+    per-payslip savings rates so callers can average them over any month range.
+    """
+    c = summary.c
+    stmt = (
+        select(
+            c.month,
+            func.sum(c.payslips).label("payslips"),
+            func.sum(c.gross_salary).label("gross_salary"),
+            func.sum(c.net_pay).label("net_pay"),
+            func.sum(c.tds).label("tds"),
+            func.sum(c.savings).label("savings"),
+            func.sum(c.savings_rate_sum).label("savings_rate_sum"),
+            func.sum(c.savings_rate_n).label("savings_rate_n"),
+        )
+        .group_by(c.month)
+        .order_by(c.month)
+    )
+    if employee_code is not None:
+        stmt = stmt.where(c.employee_code == employee_code)
+    with (bind or engine).connect() as conn:
+        df = pd.DataFrame(conn.execute(stmt).all(), columns=list(stmt.selected_columns.keys()))
+    for col in ("gross_salary", "net_pay", "tds", "savings", "savings_rate_sum"):
+        df[col] = parse_amounts(df[col])
+    df["date"] = pd.to_datetime(df["month"], format="%Y-%m")
+    return df
+
+
+def _record_filter(stmt, months: Optional[Iterable[date]], employee_code: Optional[str]):
+    if months is not None:
+        stmt = stmt.where(records.c.pay_month.in_(list(months)))
+    if employee_code is not None:
+        stmt = stmt.where(records.c.employee_code == employee_code)
+    return stmt
+
+
+def _to_frame(rows: List) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=RECORD_COLUMNS)
+    for col in MONEY_COLUMNS:
+        df[col] = parse_amounts(df[col])
+    df["components_json"] = df["components_json"].fillna("{}")
+    df["date"] = parse_dates(df["pay_month"])
+    df["month"] = month_labels(df["date"])
+    df["savings"] = df["gross_salary"] - df["net_pay"]
+    df["savings_rate"] = (df["savings"] / df["gross_salary"]).replace([np.inf, -np.inf], np.nan)
+    return df
+
+
+def record_rows(months: Optional[Iterable[date]] = None, employee_code: Optional[str] = None,
+                limit: Optional[int] = None, bind=None) -> Tuple[pd.DataFrame, int]:
+    """
+    (detail rows, number of matching records): records whose pay_month is in
+    `months` / of `employee_code`, newest first, at most `limit` of them
+    (default DASHBOARD_DETAIL_ROWS).
+    """
+    months = None if months is None else list(months)
+    limit = settings.DASHBOARD_DETAIL_ROWS if limit is None else limit
+    stmt = (
+        select(
+            records.c.id, raws.c.filename, records.c.employee_code,
+            records.c.pay_month, records.c.pay_date,
+            records.c.gross_salary, records.c.net_pay, records.c.tds,
+            records.c.pf_employee, records.c.pf_employer, records.c.components_json,
+        )
+        .select_from(records.outerjoin(raws, raws.c.id == records.c.payslip_raw_id))
+        .order_by(records.c.pay_month.desc(), records.c.id.desc())
+        .limit(limit)
+    )
+    count = select(func.count()).select_from(records)
+    with (bind or engine).connect() as conn:
+        rows = conn.execute(_record_filter(stmt, months, employee_code)).all()
+        total = conn.execute(_record_filter(count, months, employee_code)).scalar_one()
+    return _to_frame(rows), total
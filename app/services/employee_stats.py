@@ -0,0 +1,320 @@
+# app/services/employee_stats.py
+"""
+Per-employee analytics over monthly totals (the employee_stats table).
+
+For every employee code the table keeps running statistics of monthly net
+pay (count, Welford mean and sum of squared deviations) and the totals of
+the last ANALYTICS_WINDOW_MONTHS months. From those it stores, for the
+latest month:
+
+- net_pay_z: how far net pay is from the employee's other months, in
+  standard deviations (once there are ANALYTICS_MIN_MONTHS of them), and
+  anomaly when that exceeds ANALYTICS_ANOMALY_Z;
+- net_pay_yoy: the change from the same month a year earlier;
+- tds_fy_to_date / tds_projected: TDS of the fiscal year (April to March)
+  so far, and projected to March at the rate of the last
+  ANALYTICS_TDS_RUN_RATE_MONTHS months.
+
+BulkWriter passes apply() the month totals monthly_summary.apply() changed,
+in the same transaction: an old total is removed from the running
+statistics and the new one added, so an ingest touches only the employees
+it wrote. When a month inside the window goes away and older months exist,
+that employee's latest months are re-read from monthly_summary. rebuild() recomputes the
+table from monthly_summary (it also clears the small float drift of many
+add/remove updates):
+
+    python -m app.scripts.rebuild_monthly_summary
+
+The lookups (get, anomalies, yoy_changes, overview) read single indexed
+rows for the dashboard; nothing is aggregated per request.
+"""
+import json
+import logging
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Float, bindparam, case, delete, func, insert, select, true, type_coerce, update
+
+from app.config import settings
+from app.db import engine
+from app.models import EmployeeStats, MonthlySummary
+from app.services.monthly_summary import Change
+
+logger = logging.getLogger("employee_stats")
+
+stats = EmployeeStats.__table__
+summary = MonthlySummary.__table__
+
+# A deviation is measured in units of at least this share of mean net pay, so a
+# flat salary history doesn't turn every small change into an anomaly
+_MIN_STD_FRACTION = 0.01
+_COLUMNS = ("months", "net_pay_mean", "net_pay_m2", "recent_json", "last_month", "last_net_pay", "net_pay_z",
+            "anomaly", "net_pay_yoy", "fiscal_year", "tds_fy_to_date", "tds_projected")
+
+Totals = Tuple[float, float, float]   # gross, net, tds
+
+
+def _window() -> int:
+    return max(13, settings.ANALYTICS_WINDOW_MONTHS)   # YoY needs the same month a year back
+
+
+def _shift(month: str, months: int) -> str:
+    y, m = divmod(int(month[:4]) * 12 + int(month[5:7]) - 1 + months, 12)
+    return f"{y:04d}-{m + 1:02d}"
+
+
+@dataclass
+class _State:
+    months: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    recent: Dict[str, Totals] = field(default_factory=dict)
+    stale: bool = False   # a month left the window while older ones exist outside it
+
+    @classmethod
+    def from_row(cls, row) -> "_State":
+        recent = {m: tuple(v) for m, v in json.loads(row["recent_json"] or "{}").items()}
+        return cls(row["months"], row["net_pay_mean"], row["net_pay_m2"], recent)
+
+    def add(self, month: str, totals: Totals, window: int):
+        x = totals[1]
+        self.months += 1
+        d = x - self.mean
+        self.mean += d / self.months
+        self.m2 += d * (x - self.mean)
+        self.recent[month] = totals
+        if len(self.recent) > window:
+            del self.recent[min(self.recent)]
+
+    def remove(self, month: str, totals: Totals):
+        x = totals[1]
+        if self.months <= 1:
+            self.months, self.mean, self.m2 = 0, 0.0, 0.0
+        else:
+            mean = (self.months * self.mean - x) / (self.months - 1)
+            self.m2 = max(0.0, self.m2 - (x - self.mean) * (x - mean))
+            self.mean = mean
+            self.months -= 1
+        if self.recent.pop(month, None) is not None and self.months > len(self.recent):
+            self.stale = True
+
+    def std(self) -> Optional[float]:
+        return math.sqrt(self.m2 / (self.months - 1)) if self.months > 1 else None
+
+    def z(self, x: float) -> Optional[float]:
+        """z-score of the month with net pay `x` against the other months (leave-one-out)."""
+        n = self.months - 1
+        if n < max(2, settings.ANALYTICS_MIN_MONTHS):
+            return None
+        mean = (self.months * self.mean - x) / n
+        m2 = max(0.0, self.m2 - (x - self.mean) * (x - mean))
+        std = max(math.sqrt(m2 / (n - 1)), abs(mean) * _MIN_STD_FRACTION)
+        return (x - mean) / std if std > 0 else None
+
+    def values(self) -> dict:
+        """Row values: the running statistics and the latest month's analytics."""
+        v = dict(months=self.months, net_pay_mean=self.mean, net_pay_m2=self.m2,
+                 recent_json=json.dumps({m: list(t) for m, t in sorted(self.recent.items())}),
+                 last_month=None, last_net_pay=None, net_pay_z=None, anomaly=False, net_pay_yoy=None,
+                 fiscal_year=None, tds_fy_to_date=None, tds_projected=None)
+        if not self.recent:
+            return v
+        last = max(self.recent)
+        net = self.recent[last][1]
+        z = self.z(net)
+        year_ago = self.recent.get(_shift(last, -12))
+        v.update(last_month=last, last_net_pay=round(net, 2), net_pay_z=z,
+                 anomaly=z is not None and abs(z) > settings.ANALYTICS_ANOMALY_Z,
+                 net_pay_yoy=(net - year_ago[1]) / year_ago[1] if year_ago and year_ago[1] > 0 else None)
+
+        # Fiscal year April-March: months of it so far, and the TDS run rate over the latest of them
+        start = int(last[:4]) - (int(last[5:7]) < 4)
+        fy_months = sorted(m for m in self.recent if f"{start:04d}-04" <= m <= last)
+        to_date = sum(self.recent[m][2] for m in fy_months)
+        rate_months = fy_months[-max(1, settings.ANALYTICS_TDS_RUN_RATE_MONTHS):]
+        rate = sum(self.recent[m][2] for m in rate_months) / len(rate_months)
+        remaining = (start + 1) * 12 + 3 - (int(last[:4]) * 12 + int(last[5:7]))
+        v.update(fiscal_year=f"{start}-{(start + 1) % 100:02d}", tds_fy_to_date=round(to_date, 2),
+                 tds_projected=round(to_date + rate * remaining, 2))
+        return v
+
+
+def _totals_query():
+    """(employee_code, month, gross, net, tds) of monthly_summary, skipping the Decimal conversion."""
+    c = summary.c
+    return select(c.employee_code, c.month, *[type_coerce(c[a], Float) for a in ("gross_salary", "net_pay", "tds")])
+
+
+def _totals(gross, net, tds) -> Totals:
+    return float(gross or 0), float(net or 0), float(tds or 0)
+
+
+def _latest_months(conn, employee_code: str, window: int) -> Dict[str, Totals]:
+    c = summary.c
+    stmt = _totals_query().where(c.employee_code == employee_code).order_by(c.month.desc()).limit(window)
+    return {month: _totals(*amounts) for _, month, *amounts in conn.execute(stmt)}
+
+
+def apply(conn, changes: List[Change]):
+    """Update the statistics of the employees in `changes` inside the caller's transaction."""
+    by_employee = defaultdict(list)
+    for employee_code, month, old, new in changes:
+        if employee_code:   # payslips without an employee code have no history to compare with
+            by_employee[employee_code].append((month, old, new))
+    if not by_employee:
+        return
+    codes = list(by_employee)
+    existing = {}
+    for i in range(0, len(codes), 500):
+        stmt = select(stats).where(stats.c.employee_code.in_(codes[i:i + 500])).with_for_update()
+        for row in conn.execute(stmt).mappings():
+            existing[row["employee_code"]] = row
+
+    window = _window()
+    now = datetime.utcnow()
+    updates, inserts, removed = [], [], []
+    for code, month_changes in by_employee.items():
+        row = existing.get(code)
+        state = _State.from_row(row) if row is not None else _State()
+        for month, old, new in month_changes:
+            if old is not None:
+                state.remove(month, old)
+            if new is not None:
+                state.add(month, new, window)
+        if state.stale:
+            # a month inside the window went away: refill it from older months
+            state.recent = _latest_months(conn, code, window)
+        if state.months <= 0:
+            if row is not None:
+                removed.append(row["id"])
+        elif row is not None:
+            updates.append(dict({f"b_{k}": v for k, v in state.values().items()}, b_id=row["id"]))
+        else:
+            inserts.append(dict(state.values(), employee_code=code, updated_at=now))
+
+    if removed:
+        conn.execute(delete(stats).where(stats.c.id.in_(removed)))
+    if updates:
+        conn.execute(
+            update(stats).where(stats.c.id == bindparam("b_id")).values(
+                **{c: bindparam(f"b_{c}") for c in _COLUMNS}, updated_at=now
+            ),
+            updates,
+        )
+    if inserts:
+        conn.execute(insert(stats), inserts)
+
+
+def recompute(conn, chunk_size: int = 50000) -> int:
+    """Recompute employee_stats from monthly_summary on `conn`; returns the row count."""
+    c = summary.c
+    window = _window()
+    now = datetime.utcnow()
+    conn.execute(delete(stats))
+    result = conn.execution_options(yield_per=chunk_size).execute(
+        _totals_query().where(c.employee_code != "").order_by(c.employee_code, c.month)
+    )
+    rows, total = [], 0
+    code, state = None, None
+    for employee_code, month, *amounts in result:
+        if employee_code != code:
+            if state is not None:
+                rows.append(dict(state.values(), employee_code=code, updated_at=now))
+            code, state = employee_code, _State()
+        state.add(month, _totals(*amounts), window)
+        if len(rows) >= 5000:
+            conn.execute(insert(stats), rows)
+            total += len(rows)
+            rows = []
+    if state is not None:
+        rows.append(dict(state.values(), employee_code=code, updated_at=now))
+    if rows:
+        conn.execute(insert(stats), rows)
+        total += len(rows)
+    return total
+
+
+def rebuild(bind=None) -> int:
+    """Recompute employee_stats from monthly_summary in one transaction; returns the row count."""
+    with (bind or engine).begin() as conn:
+        total = recompute(conn)
+    logger.info(f"Rebuilt employee_stats: {total} employee(s)")
+    return total
+
+
+# ---------------------------------------------------------------- lookups
+
+def _view(row, history: bool = False) -> dict:
+    state = _State.from_row(row)
+    out = {
+        "employee_code": row["employee_code"],
+        "months": row["months"],
+        "net_pay_mean": round(row["net_pay_mean"], 2),
+        "net_pay_std": None if state.std() is None else round(state.std(), 2),
+        "last_month": row["last_month"],
+        "last_net_pay": None if row["last_net_pay"] is None else float(row["last_net_pay"]),
+        "net_pay_z": row["net_pay_z"],
+        "anomaly": bool(row["anomaly"]),
+        "net_pay_yoy": row["net_pay_yoy"],
+        "fiscal_year": row["fiscal_year"],
+        "tds_fy_to_date": None if row["tds_fy_to_date"] is None else float(row["tds_fy_to_date"]),
+        "tds_projected": None if row["tds_projected"] is None else float(row["tds_projected"]),
+    }
+    if history:
+        # every month of the window scored against the others, like the latest one
+        out["history"] = []
+        for month, (gross, net, tds) in sorted(state.recent.items()):
+            z = state.z(net)
+            out["history"].append({"month": month, "gross_salary": gross, "net_pay": net, "tds": tds, "net_pay_z": z,
+                                   "anomaly": z is not None and abs(z) > settings.ANALYTICS_ANOMALY_Z})
+    return out
+
+
+def get(employee_code: str, bind=None) -> Optional[dict]:
+    """Analytics of one employee, with the months of the window ("history"); None if unknown."""
+    with (bind or engine).connect() as conn:
+        row = conn.execute(select(stats).where(stats.c.employee_code == employee_code)).mappings().first()
+    return None if row is None else _view(row, history=True)
+
+
+def anomalies(limit: int = 50, since: Optional[str] = None, bind=None) -> List[dict]:
+    """Employees whose latest month is an anomaly (optionally from month `since` on), largest |z| first."""
+    stmt = select(stats).where(stats.c.anomaly == true())
+    if since:
+        stmt = stmt.where(stats.c.last_month >= since)
+    stmt = stmt.order_by(func.abs(stats.c.net_pay_z).desc()).limit(limit)
+    with (bind or engine).connect() as conn:
+        return [_view(row) for row in conn.execute(stmt).mappings()]
+
+
+def yoy_changes(limit: int = 50, bind=None) -> List[dict]:
+    """Employees with the largest year-over-year change of their latest month's net pay."""
+    stmt = (
+        select(stats)
+        .where(stats.c.net_pay_yoy.isnot(None))
+        .order_by(func.abs(stats.c.net_pay_yoy).desc())
+        .limit(limit)
+    )
+    with (bind or engine).connect() as conn:
+        return [_view(row) for row in conn.execute(stmt).mappings()]
+
+
+def overview(bind=None) -> dict:
+    """
+    Employee count, anomalies flagged and the projected TDS of the latest
+    fiscal year in the data, over the employees whose last payslip is in it.
+    """
+    latest = select(func.max(stats.c.fiscal_year)).scalar_subquery()
+    stmt = select(
+        func.count(),
+        func.sum(case((stats.c.anomaly == true(), 1), else_=0)),
+        latest,
+        func.sum(case((stats.c.fiscal_year == latest, stats.c.tds_projected), else_=0)),
+    )
+    with (bind or engine).connect() as conn:
+        employees, flagged, fiscal_year, tds = conn.execute(stmt).one()
+    return {"employees": employees, "anomalies": int(flagged or 0), "fiscal_year": fiscal_year,
+            "tds_projected": float(tds or 0)}
@@ -0,0 +1,145 @@
+# app/services/export.py
+"""
+Streaming export of payslip records to CSV or Parquet.
+
+Rows are read with a server-side cursor (stream_results + yield_per) and
+written chunk by chunk, so memory stays bounded by chunk_size whatever the
+size of the history. Parquet needs pyarrow, which is imported on first use.
+
+    python -m app.scripts.export_payslips --format parquet --out payslips.parquet
+"""
+import csv
+import io
+import logging
+from datetime import date
+from typing import IO, Iterable, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from app.db import engine
+from app.models import PayslipRaw, PayslipRecord
+
+logger = logging.getLogger("export")
+
+records = PayslipRecord.__table__
+raws = PayslipRaw.__table__
+
+EXPORT_COLUMNS = [
+    records.c.id, raws.c.filename, records.c.employee_name, records.c.employee_code, records.c.pan,
+    records.c.month, records.c.pay_date, records.c.pay_month, records.c.paid_on,
+    records.c.gross_salary, records.c.basic, records.c.hra, records.c.special_allowance,
+    records.c.tds, records.c.pf_employee, records.c.pf_employer, records.c.net_pay,
+    records.c.components_json,
+]
+HEADER = [c.name for c in EXPORT_COLUMNS]
+DATE_COLUMNS = {"pay_month", "paid_on"}
+AMOUNT_COLUMNS = {"gross_salary", "basic", "hra", "special_allowance", "tds", "pf_employee", "pf_employer", "net_pay"}
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def export_query(start: Optional[date] = None, end: Optional[date] = None,
+                 months: Optional[Iterable[date]] = None, employee_code: Optional[str] = None):
+    """Records (with their filename) by pay_month range / months / employee, in id order."""
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .select_from(records.outerjoin(raws, raws.c.id == records.c.payslip_raw_id))
+        .order_by(records.c.id)
+    )
+    if start is not None:
+        stmt = stmt.where(records.c.pay_month >= start)
+    if end is not None:
+        stmt = stmt.where(records.c.pay_month <= end)
+    if months is not None:
+        stmt = stmt.where(records.c.pay_month.in_(list(months)))
+    if employee_code is not None:
+        stmt = stmt.where(records.c.employee_code == employee_code)
+    return stmt
+
+
+def iter_chunks(chunk_size: int = DEFAULT_CHUNK_SIZE, bind=None, **filters) -> Iterator[List[tuple]]:
+    """Yield lists of at most chunk_size rows (HEADER order) from a server-side cursor."""
+    with (bind or engine).connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+            export_query(**filters)
+        )
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+
+def write_csv(out: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE, bind=None, **filters) -> int:
+    """Write records as CSV to a text stream; returns the number of rows."""
+    writer = csv.writer(out)
+    writer.writerow(HEADER)
+    count = 0
+    for chunk in iter_chunks(chunk_size, bind, **filters):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def iter_csv(chunk_size: int = DEFAULT_CHUNK_SIZE, bind=None, **filters) -> Iterator[bytes]:
+    """CSV as a stream of UTF-8 byte chunks (one per DB chunk), for HTTP responses."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    for chunk in iter_chunks(chunk_size, bind, **filters):
+        writer.writerows(chunk)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _arrow_schema(pa):
+    fields = []
+    for name in HEADER:
+        if name == "id":
+            fields.append(pa.field(name, pa.int64()))
+        elif name in DATE_COLUMNS:
+            fields.append(pa.field(name, pa.date32()))
+        elif name in AMOUNT_COLUMNS:
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def write_parquet(out, chunk_size: int = DEFAULT_CHUNK_SIZE, bind=None, **filters) -> int:
+    """Write records to a Parquet file (path or binary stream), one row group per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from e
+
+    schema = _arrow_schema(pa)
+    amount_idx = [i for i, name in enumerate(HEADER) if name in AMOUNT_COLUMNS]
+    count = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for chunk in iter_chunks(chunk_size, bind, **filters):
+            columns = [list(col) for col in zip(*chunk)]
+            for i in amount_idx:
+                columns[i] = [float(v) if v is not None else None for v in columns[i]]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+            ))
+            count += len(chunk)
+        if count == 0:
+            writer.write_table(schema.empty_table())
+    return count
+
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def export(out, fmt: str = "csv", **kwargs) -> int:
+    """Export to `out` (a path, or a text stream for CSV / binary stream for Parquet)."""
+    if fmt == "csv":
+        if isinstance(out, (str, bytes)) or hasattr(out, "__fspath__"):
+            with open(out, "w", newline="", encoding="utf-8") as f:
+                return write_csv(f, **kwargs)
+        return write_csv(out, **kwargs)
+    if fmt == "parquet":
+        return write_parquet(out, **kwargs)
+    raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
@@ -0,0 +1,261 @@
+# app/services/folder_watcher.py
+"""
+Watches a folder for new or rewritten files (daemon mode of process_pdfs).
+
+On Linux the folder is watched with inotify (through libc, no extra
+dependency): create, write, close and rename events mark a file as pending.
+Elsewhere, or if inotify can't be set up, the folder is listed every
+WATCH_POLL_SECONDS instead. Either way a pending file is reported only once
+its size and mtime have not changed for WATCH_DEBOUNCE_SECONDS, so files
+still being copied in are not picked up half written.
+
+The backlog (pending plus ready files not yet taken by poll()) is bounded by
+WATCH_MAX_BACKLOG. Past that, further events are dropped and the folder is
+listed again once the backlog has drained, so nothing is lost; a kernel
+event queue overflow is handled the same way. With inotify the folder is
+also re-listed every WATCH_RESCAN_SECONDS as a safety net.
+"""
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import os
+import select
+import struct
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger("folder_watcher")
+
+# <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")   # wd, mask, cookie, len; followed by the name
+
+Signature = Tuple[int, int]      # (size, mtime_ns)
+
+
+class _Inotify:
+    """Non-blocking inotify watch on one directory."""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, os.fsencode(str(directory)), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        self.fd = fd
+
+    def read(self, timeout: float) -> Tuple[List[Tuple[int, str]], bool]:
+        """Wait up to `timeout` seconds for events; returns ([(mask, name)], queue overflowed)."""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return [], False
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return [], False
+        events, overflow, pos = [], False, 0
+        while pos + _EVENT.size <= len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+            pos += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                events.append((mask, os.fsdecode(name)))
+        return events, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Reports files of `directory` matching `pattern` once they have been
+    written completely: new files, and files rewritten since they were last
+    reported. Files already present at start() count as written if their
+    mtime is older than the debounce period.
+
+        with FolderWatcher(folder) as watcher:
+            while running:
+                for path in watcher.poll(timeout=1.0):
+                    ...
+    """
+
+    def __init__(self, directory, pattern: str = "*.pdf", debounce: Optional[float] = None,
+                 poll_interval: Optional[float] = None, max_backlog: Optional[int] = None,
+                 rescan_interval: Optional[float] = None, use_inotify: bool = True):
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.debounce = settings.WATCH_DEBOUNCE_SECONDS if debounce is None else debounce
+        self.poll_interval = poll_interval or settings.WATCH_POLL_SECONDS
+        self.max_backlog = max(1, max_backlog or settings.WATCH_MAX_BACKLOG)
+        self.rescan_interval = settings.WATCH_RESCAN_SECONDS if rescan_interval is None else rescan_interval
+        self.use_inotify = use_inotify
+        self._inotify: Optional[_Inotify] = None
+        # path -> (last signature seen or None, monotonic time it was first seen unchanged)
+        self._pending: Dict[str, Tuple[Optional[Signature], float]] = {}
+        self._ready: "OrderedDict[str, None]" = OrderedDict()
+        # signature of every file reported so far, so re-listing the folder doesn't report it again
+        self._reported: Dict[str, Signature] = {}
+        self._overflow = False
+        self._next_scan = 0.0
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self._inotify is not None else "polling"
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending) + len(self._ready)
+
+    def start(self) -> "FolderWatcher":
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify(self.directory)
+            except (OSError, AttributeError, TypeError) as e:
+                # no inotify (not Linux) or out of watches (fs.inotify.max_user_watches)
+                logger.warning(f"inotify unavailable ({e}); polling {self.directory} every {self.poll_interval}s")
+        # watch first, then list: a file landing in between is seen by one or the other
+        self._scan()
+        logger.info(f"Watching {self.directory} ({self.backend}, debounce {self.debounce}s, "
+                     f"{len(self._ready)} file(s) ready, {len(self._pending)} settling)")
+        return self
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _matches(self, name: str) -> bool:
+        return fnmatch.fnmatch(name, self.pattern)
+
+    def _add(self, path: str, signature: Optional[Signature], settled: bool):
+        if path in self._pending or path in self._ready:
+            return
+        if self.backlog >= self.max_backlog:
+            if not self._overflow:
+                logger.warning(f"Watch backlog full ({self.max_backlog} files); the folder will be re-listed once it drains")
+            self._overflow = True
+            return
+        if settled:
+            self._ready[path] = None
+            self._reported[path] = signature
+        else:
+            self._pending[path] = (signature, time.monotonic())
+
+    def _forget(self, path: str):
+        self._pending.pop(path, None)
+        self._ready.pop(path, None)
+        self._reported.pop(path, None)
+
+    def _scan(self):
+        """List the folder and pick up files not reported yet (or changed since)."""
+        self._overflow = False
+        interval = self.rescan_interval if self._inotify is not None else self.poll_interval
+        self._next_scan = time.monotonic() + interval if interval > 0 else float("inf")
+        settled_before = time.time() - self.debounce
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError as e:
+            logger.warning(f"Cannot list {self.directory}: {e}")
+            return
+        for entry in entries:
+            if not self._matches(entry.name):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            path = os.path.join(self.directory, entry.name)
+            if self._reported.get(path) == signature or not entry.is_file():
+                continue
+            self._add(path, signature, settled=st.st_size > 0 and st.st_mtime_ns / 1e9 < settled_before)
+
+    def _on_event(self, mask: int, name: str):
+        if not self._matches(name):
+            return
+        path = os.path.join(self.directory, name)
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self._forget(path)
+        else:
+            self._ready.pop(path, None)   # written again before it was taken: let it settle again
+            self._add(path, None, settled=False)
+
+    def _settle(self):
+        """Move pending files whose size and mtime held still for the debounce period to ready."""
+        now = time.monotonic()
+        for path, (previous, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if signature != previous:
+                self._pending[path] = (signature, now)
+            elif now - since >= self.debounce and st.st_size > 0:
+                del self._pending[path]
+                if self._reported.get(path) != signature:   # an event without a content change
+                    self._ready[path] = None
+                    self._reported[path] = signature
+
+    def _take(self, limit: int) -> List[Path]:
+        taken = []
+        while self._ready and len(taken) < limit:
+            taken.append(Path(self._ready.popitem(last=False)[0]))
+        return taken
+
+    def poll(self, timeout: float, limit: Optional[int] = None) -> List[Path]:
+        """
+        Wait up to `timeout` seconds for files to become ready and return up
+        to `limit` of them (oldest first); an empty list on timeout.
+        """
+        limit = limit or self.max_backlog
+        deadline = time.monotonic() + timeout
+        # granularity of the debounce checks
+        step = min(max(self.debounce / 4, 0.05), 0.5)
+        while True:
+            if self._ready:
+                return self._take(limit)
+            now = time.monotonic()
+            if now >= self._next_scan or (self._overflow and self.backlog < self.max_backlog // 2):
+                self._scan()
+                continue
+            remaining = deadline - now
+            if remaining <= 0:
+                return []
+            wait = min(remaining, self._next_scan - now, step if self._pending else remaining)
+            if self._inotify is not None:
+                events, overflow = self._inotify.read(wait)
+                if overflow:
+                    logger.warning(f"inotify event queue overflowed; re-listing {self.directory}")
+                    self._overflow = True
+                    self._next_scan = 0.0
+                for mask, name in events:
+                    self._on_event(mask, name)
+            else:
+                time.sleep(wait)
+            self._settle()
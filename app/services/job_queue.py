@@ -0,0 +1,376 @@
+# app/services/job_queue.py
+"""
+Durable ingestion job queue (the ingest_jobs table).
+
+Every file that needs processing gets a job that moves through
+pending -> extracting -> parsing -> done, or ends up failed. A worker claims
+jobs by taking a lease (owner host:pid + expiry) and keeps renewing it while
+it works (LeaseKeeper). Extracted text is stored with the job when it moves
+to parsing, and the move to done is committed in the same transaction as the
+parsed data (BulkWriter calls finish()). So when a run is killed, its jobs
+keep their state; once the lease expires the next run -- on this host or any
+other sharing the database -- claims them again and carries on from there,
+re-using the extracted text of jobs that were already parsing. A job only
+holds its text while it is queued or in progress: closing or restarting it
+drops the reference and prunes the blob unless a payslip row uses it.
+
+Claims use SELECT ... FOR UPDATE SKIP LOCKED where the backend supports it
+(PostgreSQL, MySQL 8, Oracle). Elsewhere (SQLite) each candidate is taken
+with a compare-and-set UPDATE on its state and attempt count, so concurrent
+claimers never get the same job.
+
+A failed attempt is retried after JOB_RETRY_DELAY seconds, up to
+JOB_MAX_ATTEMPTS attempts; then the job stays failed until the file changes.
+"""
+import logging
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, insert, or_, select, update
+
+from app.config import settings
+from app.db import engine
+from app.models import IngestJob
+from app.services import raw_text
+from app.services.manifest import FileState, ManifestEntry
+
+logger = logging.getLogger("job_queue")
+
+jobs = IngestJob.__table__
+
+PENDING = "pending"
+EXTRACTING = "extracting"
+PARSING = "parsing"
+DONE = "done"
+FAILED = "failed"
+ACTIVE = (EXTRACTING, PARSING)
+
+SKIP_LOCKED_DIALECTS = {"postgresql", "mysql", "mariadb", "oracle"}
+CHUNK = 500
+
+
+class LeaseLost(RuntimeError):
+    """The job's lease expired and another worker claimed it."""
+
+
+@dataclass
+class Job:
+    id: int
+    path: Path
+    state: str
+    attempts: int
+    entry: ManifestEntry           # recorded in ingest_manifest when the job is done
+    text: Optional[str] = None     # extracted text, when resuming a job that was parsing
+
+
+def owner() -> str:
+    """Lease owner id of this process."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def _insert_new(conn, params: List[dict]):
+    """Insert jobs, ignoring paths another worker queued meanwhile."""
+    name = conn.dialect.name
+    if name in ("sqlite", "postgresql"):
+        if name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(jobs).on_conflict_do_nothing(index_elements=["path"])
+    elif name in ("mysql", "mariadb"):
+        stmt = insert(jobs).prefix_with("IGNORE")
+    else:
+        stmt = insert(jobs)
+    conn.execute(stmt, params)
+
+
+def enqueue(conn, states: Iterable[FileState]) -> int:
+    """
+    Queue files that need processing (from Manifest.scan); returns how many
+    were queued or re-queued. Jobs already queued or in progress are left as
+    they are; done jobs, and failed ones whose content changed, start over.
+    """
+    states = list(states)
+    if not states:
+        return 0
+    paths = [s.entry.path for s in states]
+    existing = {}
+    for i in range(0, len(paths), CHUNK):
+        for row in conn.execute(
+            select(jobs.c.id, jobs.c.path, jobs.c.state, jobs.c.content_hash, jobs.c.text_hash)
+            .where(jobs.c.path.in_(paths[i:i + CHUNK]))
+        ):
+            existing[row.path] = row
+
+    now = _now()
+    new, refresh, restart, dropped = [], [], [], []
+    for s in states:
+        e = s.entry
+        job = existing.get(e.path)
+        if job is None:
+            new.append({
+                "path": e.path, "state": PENDING, "attempts": 0, "size": e.size, "mtime_ns": e.mtime_ns,
+                "content_hash": e.content_hash, "manifest_id": e.id, "created_at": now, "updated_at": now,
+            })
+            continue
+        snapshot = {"b_id": job.id, "b_state": job.state, "b_size": e.size, "b_mtime_ns": e.mtime_ns,
+                    "b_hash": e.content_hash, "b_manifest_id": e.id}
+        if job.state == PENDING:
+            refresh.append(snapshot)
+        elif job.state == DONE or (job.state == FAILED and job.content_hash != e.content_hash):
+            restart.append(snapshot)
+            dropped.append(job.text_hash)
+        # active jobs are being worked on (or wait to be reclaimed); failed ones with the same content are given up
+
+    snapshot_values = dict(
+        size=bindparam("b_size"), mtime_ns=bindparam("b_mtime_ns"),
+        content_hash=bindparam("b_hash"), manifest_id=bindparam("b_manifest_id"), updated_at=now,
+    )
+    # matching on the state seen above keeps a job another worker just claimed untouched
+    where = and_(jobs.c.id == bindparam("b_id"), jobs.c.state == bindparam("b_state"))
+    if new:
+        _insert_new(conn, new)
+    if refresh:
+        conn.execute(update(jobs).where(where).values(**snapshot_values), refresh)
+    if restart:
+        conn.execute(
+            update(jobs).where(where).values(
+                state=PENDING, attempts=0, lease_owner=None, lease_expires_at=None,
+                text_hash=None, last_error=None, finished_at=None, **snapshot_values,
+            ),
+            restart,
+        )
+        raw_text.prune(conn, dropped)
+    return len(new) + len(restart)
+
+
+def _reap(conn, now: datetime, max_attempts: int):
+    """Fail jobs whose worker died on their last attempt."""
+    conn.execute(
+        update(jobs)
+        .where(jobs.c.state.in_(ACTIVE), jobs.c.lease_expires_at <= now, jobs.c.attempts >= max_attempts)
+        .values(state=FAILED, lease_owner=None, lease_expires_at=None, finished_at=now, updated_at=now,
+                last_error=func.coalesce(jobs.c.last_error, "worker lost on the last attempt"))
+    )
+
+
+def claim(bind=None, limit: Optional[int] = None, paths: Optional[List[str]] = None,
+          lease_seconds: Optional[float] = None, max_attempts: Optional[int] = None) -> List[Job]:
+    """
+    Lease up to `limit` claimable jobs (pending and due, or active with an
+    expired lease), oldest first; `paths` restricts the claim to those files.
+    """
+    limit = max(1, limit or settings.JOB_CLAIM_BATCH)
+    lease_seconds = lease_seconds or settings.JOB_LEASE_SECONDS
+    max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+    me = owner()
+
+    with (bind or engine).begin() as conn:
+        now = _now()
+        _reap(conn, now, max_attempts)
+        stmt = (
+            select(jobs.c.id, jobs.c.state, jobs.c.attempts)
+            .where(
+                jobs.c.state.in_((PENDING,) + ACTIVE),
+                or_(jobs.c.lease_expires_at.is_(None), jobs.c.lease_expires_at <= now),
+                jobs.c.attempts < max_attempts,
+            )
+            .order_by(jobs.c.id)
+            .limit(limit)
+        )
+        if paths is not None:
+            stmt = stmt.where(jobs.c.path.in_(paths))
+        values = dict(
+            # a job that got as far as parsing resumes there when its text was kept
+            state=case((and_(jobs.c.state == PARSING, jobs.c.text_hash.isnot(None)), PARSING), else_=EXTRACTING),
+            attempts=jobs.c.attempts + 1,
+            lease_owner=me,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            updated_at=now,
+        )
+        if conn.dialect.name in SKIP_LOCKED_DIALECTS:
+            ids = list(conn.execute(stmt.with_for_update(skip_locked=True)).scalars())
+            if ids:
+                conn.execute(update(jobs).where(jobs.c.id.in_(ids)).values(**values))
+        else:
+            ids = []
+            for job_id, state, attempts in conn.execute(stmt).all():
+                taken = conn.execute(
+                    update(jobs)
+                    .where(jobs.c.id == job_id, jobs.c.state == state, jobs.c.attempts == attempts)
+                    .values(**values)
+                )
+                if taken.rowcount == 1:
+                    ids.append(job_id)
+        if not ids:
+            return []
+
+        rows = conn.execute(select(jobs).where(jobs.c.id.in_(ids)).order_by(jobs.c.id)).all()
+        texts = raw_text.load_blobs(conn, [r.text_hash for r in rows if r.state == PARSING])
+
+    claimed = []
+    for r in rows:
+        text = texts.get(r.text_hash) if r.state == PARSING else None
+        claimed.append(Job(
+            id=r.id, path=Path(r.path), state=r.state if text is not None else EXTRACTING, attempts=r.attempts,
+            entry=ManifestEntry(r.path, r.size, r.mtime_ns, r.content_hash, id=r.manifest_id), text=text,
+        ))
+    resumed = sum(1 for j in claimed if j.text is not None)
+    logger.debug(f"Claimed {len(claimed)} job(s) ({resumed} resuming at parsing)")
+    return claimed
+
+
+def iter_claims(bind=None, limit: Optional[int] = None) -> Iterator[Job]:
+    """Claim and yield jobs batch by batch until nothing is left to claim."""
+    while True:
+        batch = claim(bind, limit)
+        if not batch:
+            return
+        yield from batch
+
+
+def mark_parsing(bind, job_id: int, text: str):
+    """Record that a job's text was extracted, keeping the text so a retry can skip extraction."""
+    now = _now()
+    with (bind or engine).begin() as conn:
+        previous = conn.execute(select(jobs.c.text_hash).where(jobs.c.id == job_id)).scalar()
+        text_hash = raw_text.store(conn, [text])[0]
+        conn.execute(
+            update(jobs)
+            .where(jobs.c.id == job_id, jobs.c.lease_owner == owner(), jobs.c.state.in_(ACTIVE))
+            .values(state=PARSING, text_hash=text_hash,
+                    lease_expires_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS), updated_at=now)
+        )
+        if previous != text_hash:
+            raw_text.prune(conn, [previous])
+
+
+def heartbeat(bind=None, lease_seconds: Optional[float] = None) -> int:
+    """Extend the leases of all jobs this process holds; returns how many."""
+    now = _now()
+    with (bind or engine).begin() as conn:
+        return conn.execute(
+            update(jobs)
+            .where(jobs.c.lease_owner == owner(), jobs.c.state.in_(ACTIVE))
+            .values(lease_expires_at=now + timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS))
+        ).rowcount
+
+
+def _texts(conn, job_ids: List[int]) -> List[str]:
+    """Text hashes the given jobs hold (to prune once they let go of them)."""
+    return list(conn.execute(
+        select(jobs.c.text_hash).where(jobs.c.id.in_(job_ids), jobs.c.text_hash.isnot(None))
+    ).scalars())
+
+
+def _fail(conn, failures: List[Tuple[int, str]], now: datetime):
+    max_attempts = settings.JOB_MAX_ATTEMPTS
+    give_up = jobs.c.attempts >= max_attempts
+    conn.execute(
+        update(jobs)
+        .where(jobs.c.id == bindparam("b_id"), jobs.c.lease_owner == owner(), jobs.c.state.in_(ACTIVE))
+        .values(
+            state=case((give_up, FAILED), else_=PENDING),
+            lease_owner=None,
+            # pending jobs are not claimed before lease_expires_at: that's the retry delay
+            lease_expires_at=case((give_up, None), else_=now + timedelta(seconds=settings.JOB_RETRY_DELAY)),
+            finished_at=case((give_up, now), else_=None),
+            text_hash=None,
+            last_error=bindparam("b_error"),
+            updated_at=now,
+        ),
+        [{"b_id": job_id, "b_error": error} for job_id, error in failures],
+    )
+
+
+def finish(conn, results: List[Tuple[int, Optional[str]]]):
+    """
+    Close jobs in the caller's transaction: (job id, None) is done, (job id,
+    error) is a failed attempt. Raises LeaseLost if this process no longer
+    holds one of them, so the caller's data is rolled back with it. The jobs'
+    texts are pruned unless a payslips_raw row written meanwhile uses them.
+    """
+    if not results:
+        return
+    ids = [job_id for job_id, _ in results]
+    held = set(conn.execute(
+        select(jobs.c.id).where(jobs.c.id.in_(ids), jobs.c.lease_owner == owner(), jobs.c.state.in_(ACTIVE))
+    ).scalars())
+    lost = [job_id for job_id in ids if job_id not in held]
+    if lost:
+        raise LeaseLost(f"Lease lost for job(s) {lost}")
+
+    now = _now()
+    texts = _texts(conn, ids)
+    done = [job_id for job_id, error in results if not error]
+    if done:
+        conn.execute(
+            update(jobs).where(jobs.c.id.in_(done)).values(
+                state=DONE, lease_owner=None, lease_expires_at=None, text_hash=None, last_error=None,
+                finished_at=now, updated_at=now,
+            )
+        )
+    failures = [(job_id, error) for job_id, error in results if error]
+    if failures:
+        _fail(conn, failures, now)
+    raw_text.prune(conn, texts)
+
+
+def fail(bind, failures: List[Tuple[int, str]]):
+    """Record failed attempts in their own transaction (ignores jobs this process no longer holds)."""
+    if failures:
+        with (bind or engine).begin() as conn:
+            texts = _texts(conn, [job_id for job_id, _ in failures])
+            _fail(conn, failures, _now())
+            raw_text.prune(conn, texts)
+
+
+def release(bind, job_ids: List[int]):
+    """Give back jobs claimed but not started (e.g. on shutdown), without counting the attempt."""
+    if job_ids:
+        with (bind or engine).begin() as conn:
+            conn.execute(
+                update(jobs)
+                .where(jobs.c.id.in_(job_ids), jobs.c.lease_owner == owner(), jobs.c.state.in_(ACTIVE))
+                .values(lease_owner=None, lease_expires_at=None, attempts=jobs.c.attempts - 1, updated_at=_now())
+            )
+
+
+def counts(bind=None) -> Dict[str, int]:
+    """Number of jobs per state."""
+    with (bind or engine).connect() as conn:
+        return dict(conn.execute(select(jobs.c.state, func.count()).group_by(jobs.c.state)).all())
+
+
+class LeaseKeeper:
+    """Renews this process's leases every third of the lease period while the block runs."""
+
+    def __init__(self, bind=None, lease_seconds: Optional[float] = None):
+        self.bind = bind
+        self.lease_seconds = lease_seconds or settings.JOB_LEASE_SECONDS
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="job-leases", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                heartbeat(self.bind, self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"Could not renew job leases: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,169 @@
+# app/services/manifest.py
+"""
+Incremental ingestion manifest.
+
+Every successfully ingested PDF gets a row of (path, size, mtime, content
+hash). The manifest is loaded once at startup and skip decisions are made in
+memory: a file whose size and mtime are unchanged is skipped without being
+read, a file that was only touched is skipped after hashing, and only files
+whose content really changed (or that never parsed) are processed again.
+"""
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models import IngestManifest, PayslipRaw
+
+logger = logging.getLogger("manifest")
+
+NEW = "new"            # never seen
+CHANGED = "changed"    # same path, different content
+RETRY = "retry"        # raw row exists but was never parsed
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    id: Optional[int] = None
+    payslip_raw_id: Optional[int] = None
+
+
+@dataclass
+class FileState:
+    """A file that needs processing, with the stat/hash already computed for the manifest."""
+    path: Path
+    action: str
+    entry: ManifestEntry
+
+    @property
+    def replaces_existing(self) -> bool:
+        return self.action in (CHANGED, RETRY)
+
+
+def file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Manifest:
+    def __init__(self, entries: Dict[str, ManifestEntry], raws: Dict[str, Tuple[int, bool]], session=None):
+        self.entries = entries
+        # content hash -> raw id, for files already ingested under another path
+        self.hashes = {e.content_hash: e.payslip_raw_id for e in entries.values()}
+        # filename -> (raw id, parsed), covers rows ingested before the manifest existed
+        self.raws = raws
+        # set for partial loads: hashes not in memory are looked up in the DB
+        self._session = session
+        self._pending: List[ManifestEntry] = []
+
+    @classmethod
+    def load(cls, session, paths: Optional[List[Path]] = None) -> "Manifest":
+        """
+        Load the manifest with one query per table. Pass `paths` to load only
+        the rows relevant to those files (e.g. when ingesting a single upload).
+        """
+        mq = session.query(
+            IngestManifest.id, IngestManifest.path, IngestManifest.size,
+            IngestManifest.mtime_ns, IngestManifest.content_hash, IngestManifest.payslip_raw_id,
+        )
+        rq = session.query(PayslipRaw.id, PayslipRaw.filename, PayslipRaw.parsed)
+        if paths is not None:
+            mq = mq.filter(IngestManifest.path.in_([os.path.abspath(p) for p in paths]))
+            rq = rq.filter(PayslipRaw.filename.in_([Path(p).name for p in paths]))
+        entries = {
+            path: ManifestEntry(path, size, mtime_ns, content_hash, id_, raw_id)
+            for id_, path, size, mtime_ns, content_hash, raw_id in mq
+        }
+        raws = {filename: (raw_id, bool(parsed)) for raw_id, filename, parsed in rq}
+        return cls(entries, raws, session=session if paths is not None else None)
+
+    def _known_hash(self, digest: str) -> bool:
+        if digest in self.hashes:
+            return True
+        if self._session is None:
+            return False
+        row = self._session.query(IngestManifest.payslip_raw_id).filter_by(content_hash=digest).first()
+        if row is None:
+            return False
+        self.hashes[digest] = row[0]
+        return True
+
+    def check(self, path: Path) -> Optional[FileState]:
+        """Return the file's state if it needs processing, or None to skip it."""
+        key = os.path.abspath(path)
+        st = path.stat()
+        entry = self.entries.get(key)
+        if entry is not None and entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns:
+            return None
+
+        digest = file_hash(path)
+        fresh = ManifestEntry(key, st.st_size, st.st_mtime_ns, digest)
+        if entry is not None and entry.content_hash == digest:
+            # touched but identical: just remember the new stat
+            fresh.id, fresh.payslip_raw_id = entry.id, entry.payslip_raw_id
+            self._remember(fresh)
+            return None
+
+        raw = self.raws.get(path.name)
+        if entry is None and self._known_hash(digest):
+            # same bytes already ingested under another name
+            fresh.payslip_raw_id = self.hashes[digest]
+            self._remember(fresh)
+            return None
+        if entry is None and raw is not None and raw[1]:
+            # parsed before the manifest existed: adopt it
+            fresh.payslip_raw_id = raw[0]
+            self._remember(fresh)
+            return None
+
+        if entry is not None:
+            fresh.id = entry.id
+            return FileState(path, CHANGED, fresh)
+        return FileState(path, RETRY if raw is not None else NEW, fresh)
+
+    def scan(self, paths: Iterable[Path]) -> List[FileState]:
+        todo = []
+        for p in paths:
+            try:
+                state = self.check(p)
+            except OSError as e:
+                logger.warning(f"Cannot read {p}: {e}")
+                continue
+            if state is not None:
+                todo.append(state)
+        return todo
+
+    def _remember(self, entry: ManifestEntry):
+        self.entries[entry.path] = entry
+        self.hashes.setdefault(entry.content_hash, entry.payslip_raw_id)
+        self._pending.append(entry)
+
+    def flush(self, session):
+        """Persist entries learned while scanning (touched, duplicate or adopted files)."""
+        for entry in self._pending:
+            record(session, entry)
+        self._pending = []
+
+
+def record(session, entry: ManifestEntry, raw: Optional[PayslipRaw] = None):
+    """Add or update the manifest row for entry; `raw` links it to the ingested row."""
+    row = session.get(IngestManifest, entry.id) if entry.id is not None else None
+    if row is None:
+        row = IngestManifest(path=entry.path)
+        session.add(row)
+    row.size = entry.size
+    row.mtime_ns = entry.mtime_ns
+    row.content_hash = entry.content_hash
+    if raw is not None:
+        row.raw = raw
+    else:
+        row.payslip_raw_id = entry.payslip_raw_id
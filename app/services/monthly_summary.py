@@ -0,0 +1,319 @@
+# app/services/monthly_summary.py
+"""
+Materialized per employee / month totals (the monthly_summary table).
+
+BulkWriter calls apply() in the same transaction that inserts or replaces
+payslip_records: inserted records add to their (employee_code, month) row,
+replaced ones are subtracted first, and rows that drop to zero payslips are
+deleted. rebuild() recomputes the whole table from payslip_records, for
+backfill or after manual edits:
+
+    python -m app.scripts.rebuild_monthly_summary
+"""
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Float, Numeric, and_, bindparam, case, delete, func, insert, or_, select, type_coerce, update
+
+from app.db import engine
+from app.models import MonthlySummary, PayslipComponent, PayslipRecord
+from app.services.components import backfill as backfill_components, component_amounts
+from app.services.normalize import month_labels, parse_amounts, parse_dates, parse_decimal, pay_month, pay_months
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger("monthly_summary")
+
+summary = MonthlySummary.__table__
+records = PayslipRecord.__table__
+payslip_components = PayslipComponent.__table__
+
+AMOUNTS = ("gross_salary", "net_pay", "tds", "pf_employee", "pf_employer", "savings")
+# Columns a record needs for Deltas.add(); rebuild() selects them too, components_json aside
+RECORD_FIELDS = ("employee_code", "month", "pay_date", "pay_month", "gross_salary", "net_pay", "tds",
+                 "pf_employee", "pf_employer", "components_json")
+
+
+def month_key(month: Optional[str], pay_date: Optional[str]) -> Optional[str]:
+    """YYYY-MM of a payslip: from pay_date if it parses, else from the month label."""
+    m = pay_month(month, pay_date)
+    return m.strftime("%Y-%m") if m else None
+
+
+def _amount(v) -> Decimal:
+    return parse_decimal(v) or Decimal(0)
+
+
+class Deltas:
+    """Accumulated changes per (employee_code, month)."""
+
+    def __init__(self):
+        self.rows: Dict[Tuple[str, str], dict] = {}
+
+    def add(self, record: dict, sign: int = 1):
+        m = record.get("pay_month") or pay_month(record.get("month"), record.get("pay_date"))
+        key = m.strftime("%Y-%m") if m else None
+        if key is None:
+            return
+        k = (record.get("employee_code") or "", key)
+        d = self.rows.get(k)
+        if d is None:
+            d = self.rows[k] = dict({a: Decimal(0) for a in AMOUNTS}, payslips=0, savings_rate_sum=0.0,
+                                    savings_rate_n=0, components=defaultdict(Decimal))
+        gross, net = _amount(record.get("gross_salary")), _amount(record.get("net_pay"))
+        d["payslips"] += sign
+        for name in ("tds", "pf_employee", "pf_employer"):
+            d[name] += sign * _amount(record.get(name))
+        d["gross_salary"] += sign * gross
+        d["net_pay"] += sign * net
+        d["savings"] += sign * (gross - net)
+        if gross > 0:
+            d["savings_rate_sum"] += sign * float((gross - net) / gross)
+            d["savings_rate_n"] += sign
+        for name, amount in component_amounts(record.get("components_json")).items():
+            d["components"][name] += sign * amount
+
+    def __bool__(self):
+        return bool(self.rows)
+
+
+# (employee_code, month, (gross, net, tds) before or None, (gross, net, tds) after or None)
+Change = Tuple[str, str, Optional[Tuple[float, float, float]], Optional[Tuple[float, float, float]]]
+
+
+def _totals(values) -> Tuple[float, float, float]:
+    return float(values["gross_salary"]), float(values["net_pay"]), float(values["tds"])
+
+
+def apply(conn, deltas: Deltas) -> List[Change]:
+    """
+    Add `deltas` to monthly_summary inside the caller's transaction. Returns
+    the month totals that changed, for employee_stats.apply().
+    """
+    if not deltas:
+        return []
+    now = datetime.utcnow()
+    keys = list(deltas.rows)
+    existing = {}
+    for i in range(0, len(keys), 200):
+        chunk = keys[i:i + 200]
+        cond = or_(*[and_(summary.c.employee_code == e, summary.c.month == m) for e, m in chunk])
+        for row in conn.execute(select(summary).where(cond).with_for_update()).mappings():
+            existing[(row["employee_code"], row["month"])] = row
+
+    updates, inserts, removed, changes = [], [], [], []
+    for key, d in deltas.rows.items():
+        row = existing.get(key)
+        values = {a: (Decimal(str(row[a])) if row else Decimal(0)) + d[a] for a in AMOUNTS}
+        values["payslips"] = (row["payslips"] if row else 0) + d["payslips"]
+        values["savings_rate_sum"] = (row["savings_rate_sum"] if row else 0.0) + d["savings_rate_sum"]
+        values["savings_rate_n"] = (row["savings_rate_n"] if row else 0) + d["savings_rate_n"]
+        components = defaultdict(Decimal)
+        if row is not None:
+            for name, amount in json.loads(row["components_json"] or "{}").items():
+                components[name] = Decimal(str(amount))
+        for name, amount in d["components"].items():
+            components[name] += amount
+        values["components_json"] = json.dumps(
+            {k: float(v) for k, v in sorted(components.items()) if v}, ensure_ascii=False
+        )
+        if row is not None and values["payslips"] <= 0:
+            removed.append(row["id"])
+            changes.append((key[0], key[1], _totals(row), None))
+        elif row is not None:
+            updates.append(dict({f"b_{k}": v for k, v in values.items()}, b_id=row["id"]))
+            changes.append((key[0], key[1], _totals(row), _totals(values)))
+        elif values["payslips"] > 0:
+            inserts.append(dict(values, employee_code=key[0], month=key[1], updated_at=now))
+            changes.append((key[0], key[1], None, _totals(values)))
+
+    if removed:
+        conn.execute(delete(summary).where(summary.c.id.in_(removed)))
+    if updates:
+        cols = list(AMOUNTS) + ["payslips", "savings_rate_sum", "savings_rate_n", "components_json"]
+        conn.execute(
+            update(summary).where(summary.c.id == bindparam("b_id")).values(
+                **{c: bindparam(f"b_{c}") for c in cols}, updated_at=now
+            ),
+            updates,
+        )
+    if inserts:
+        conn.execute(insert(summary), inserts)
+    return changes
+
+
+TOTAL_COLUMNS = ["payslips", "gross_salary", "net_pay", "tds", "pf_employee", "pf_employer",
+                 "savings_rate_sum", "savings_rate_n"]
+
+
+def _paise(values) -> "np.ndarray":
+    """Amounts as exact integer paise (unparseable -> 0), so column sums match Decimal arithmetic."""
+    import numpy as np
+
+    return np.round(parse_amounts(values).fillna(0).to_numpy() * 100).astype(np.int64)
+
+
+def _raw(column):
+    """Numeric columns as the driver returns them, skipping per-value Decimal conversion (_paise rounds anyway)."""
+    return type_coerce(column, Float) if isinstance(column.type, Numeric) else column
+
+
+def _sum_paise(column):
+    return func.sum(func.round(func.coalesce(column, 0) * 100))
+
+
+def _sql_totals(conn):
+    """
+    Totals and component sums of records with a pay_month, grouped by the
+    database: (employee_code, pay_month) rows, months labelled afterwards.
+    """
+    import pandas as pd
+
+    employee = func.coalesce(records.c.employee_code, "")
+    gross, net = func.coalesce(records.c.gross_salary, 0), func.coalesce(records.c.net_pay, 0)
+    stmt = (
+        select(
+            employee.label("employee_code"), records.c.pay_month, func.count().label("payslips"),
+            *[_sum_paise(records.c[a]).label(a) for a in ("gross_salary", "net_pay", "tds", "pf_employee", "pf_employer")],
+            func.sum(case((gross > 0, (gross - net) * 1.0 / gross), else_=0), type_=Float).label("savings_rate_sum"),
+            func.sum(case((gross > 0, 1), else_=0)).label("savings_rate_n"),
+        )
+        .where(records.c.pay_month.isnot(None))
+        .group_by(employee, records.c.pay_month)
+    )
+    totals = pd.DataFrame(conn.execute(stmt).all(), columns=["employee_code", "pay_month"] + TOTAL_COLUMNS)
+    totals["month"] = month_labels(parse_dates(totals["pay_month"]))
+
+    stmt = (
+        select(employee.label("employee_code"), records.c.pay_month, payslip_components.c.name, _sum_paise(payslip_components.c.amount))
+        .select_from(payslip_components.join(records, records.c.id == payslip_components.c.record_id))
+        .where(records.c.pay_month.isnot(None))
+        .group_by(employee, records.c.pay_month, payslip_components.c.name)
+    )
+    comps = pd.DataFrame(conn.execute(stmt).all(), columns=["employee_code", "pay_month", "name", "amount"])
+    comps["month"] = month_labels(parse_dates(comps["pay_month"]))
+    return totals.drop(columns="pay_month"), comps.drop(columns="pay_month")
+
+
+def _unlabelled_totals(conn, chunk_size: int):
+    """
+    Same for records without a pay_month (written before it existed, or
+    edited by hand): their month is parsed from month / pay_date, as
+    Deltas.add does, in one vectorized pass per chunk.
+    """
+    import numpy as np
+    import pandas as pd
+
+    fields = ["employee_code", "month", "pay_date", "gross_salary", "net_pay", "tds", "pf_employee", "pf_employer"]
+    unlabelled = records.c.pay_month.is_(None)
+    totals, ids = [], []
+    result = conn.execution_options(yield_per=chunk_size).execute(
+        select(records.c.id, *[_raw(records.c[f]) for f in fields]).where(unlabelled)
+    )
+    for rows in result.partitions():
+        df = pd.DataFrame(rows, columns=["id"] + fields)
+        df["month"] = month_labels(pay_months(df["month"], df["pay_date"]))
+        df = df[df["month"].notna()]
+        gross, net = _paise(df["gross_salary"]), _paise(df["net_pay"])
+        totals.append(pd.DataFrame({
+            "employee_code": df["employee_code"].fillna("").to_numpy(dtype=object),
+            "month": df["month"].to_numpy(dtype=object),
+            "payslips": 1,
+            "gross_salary": gross,
+            "net_pay": net,
+            "tds": _paise(df["tds"]),
+            "pf_employee": _paise(df["pf_employee"]),
+            "pf_employer": _paise(df["pf_employer"]),
+            "savings_rate_sum": np.where(gross > 0, (gross - net) / np.where(gross > 0, gross, 1), 0.0),
+            "savings_rate_n": (gross > 0).astype(int),
+        }))
+        ids.append(df["id"].to_numpy())
+    if not totals:
+        return None, None
+
+    totals = pd.concat(totals, ignore_index=True)
+    by_id = pd.Index(np.concatenate(ids))
+    employee_codes, months = totals["employee_code"].to_numpy(), totals["month"].to_numpy()
+    comps = []
+    result = conn.execution_options(yield_per=chunk_size).execute(
+        select(payslip_components.c.record_id, payslip_components.c.name, _raw(payslip_components.c.amount))
+        .select_from(payslip_components.join(records, records.c.id == payslip_components.c.record_id))
+        .where(unlabelled)
+    )
+    for rows in result.partitions():
+        df = pd.DataFrame(rows, columns=["record_id", "name", "amount"])
+        pos = by_id.get_indexer(df["record_id"].to_numpy())
+        keep = pos >= 0   # records whose month didn't parse
+        comps.append(pd.DataFrame({
+            "employee_code": employee_codes[pos[keep]],
+            "month": months[pos[keep]],
+            "name": df["name"].to_numpy(dtype=object)[keep],
+            "amount": _paise(df["amount"])[keep],
+        }))
+    comps = pd.concat(comps, ignore_index=True) if comps else pd.DataFrame(columns=["employee_code", "month", "name", "amount"])
+    return totals, comps
+
+
+def rebuild(bind=None, chunk_size: int = 50000) -> int:
+    """
+    Recompute monthly_summary from payslip_records in one transaction; returns the row count.
+
+    Records are summed by the database per (employee_code, pay_month), in
+    integer paise so totals match the Decimal arithmetic of apply(); component
+    totals come from payslip_components, backfilled first for records that
+    have none. Only records without a pay_month are read into Python.
+    """
+    import numpy as np
+    import pandas as pd
+
+    bind = bind or engine
+    with bind.begin() as conn:
+        backfill_components(conn)
+        conn.execute(delete(summary))
+        totals, comps = _sql_totals(conn)
+        extra_totals, extra_comps = _unlabelled_totals(conn, chunk_size)
+        if extra_totals is not None:
+            totals, comps = pd.concat([totals, extra_totals]), pd.concat([comps, extra_comps])
+        totals = totals[totals["month"].notna()]
+        for a in ("gross_salary", "net_pay", "tds", "pf_employee", "pf_employer"):
+            totals[a] = np.round(parse_amounts(totals[a]).fillna(0).to_numpy()).astype(np.int64)
+        totals["savings_rate_sum"] = parse_amounts(totals["savings_rate_sum"]).fillna(0)
+        totals = totals.groupby(["employee_code", "month"])[TOTAL_COLUMNS].sum()
+
+        comps = comps[comps["month"].notna()].assign(
+            amount=np.round(parse_amounts(comps["amount"]).fillna(0).to_numpy()).astype(np.int64)
+        )
+        comps = comps.groupby(["employee_code", "month", "name"])["amount"].sum()
+        component_json = {}
+        for (employee_code, month, name), paise in comps[comps != 0].sort_index().items():
+            component_json.setdefault((employee_code, month), {})[name] = paise / 100
+
+        now = datetime.utcnow()
+        rows = []
+        for (employee_code, month), t in zip(totals.index, totals.itertuples(index=False)):
+            amounts = {a: Decimal(int(getattr(t, a))) / 100 for a in AMOUNTS if a != "savings"}
+            rows.append(dict(
+                amounts, savings=amounts["gross_salary"] - amounts["net_pay"],
+                employee_code=employee_code, month=month, payslips=int(t.payslips),
+                savings_rate_sum=float(t.savings_rate_sum), savings_rate_n=int(t.savings_rate_n),
+                components_json=json.dumps(component_json.get((employee_code, month), {}), ensure_ascii=False),
+                updated_at=now,
+            ))
+        for i in range(0, len(rows), 5000):
+            conn.execute(insert(summary), rows[i:i + 5000])
+    logger.info(f"Rebuilt monthly_summary: {len(rows)} row(s)")
+    return len(rows)
+
+
+def subtract_records(conn, deltas: Deltas, raw_ids: Iterable[int]):
+    """Add to `deltas` the removal of the current records of `raw_ids` (before they are replaced)."""
+    raw_ids = list(raw_ids)
+    if raw_ids:
+        stmt = select(*[records.c[f] for f in RECORD_FIELDS]).where(records.c.payslip_raw_id.in_(raw_ids))
+        for row in conn.execute(stmt).mappings():
+            deltas.add(row, sign=-1)
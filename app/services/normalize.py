@@ -0,0 +1,244 @@
+# app/services/normalize.py
+"""
+Normalization of parser output into typed column values.
+
+Amounts arrive as numbers or as Indian-format strings: "₹ 1,23,456.50",
+"Rs. 5,000/-", "INR 1200", "(2,500.00)" or "-2500" for negatives. Dates come
+in many shapes ("2024-03-31", "31/03/2024", "31 Mar 2024", "March 2024",
+"Mar'24"). Both are parsed with precompiled patterns. Dates are parsed once at
+ingest into the Date columns payslip_records.paid_on and pay_month (first day
+of the month), so queries filter on indexed dates instead of parsing strings.
+
+Each parser has a scalar form (parse_amount, parse_decimal, parse_date,
+parse_month, pay_month) and a column form (parse_amounts, parse_dates,
+parse_months, pay_months, month_labels) that takes a pandas Series, NumPy array or list and
+normalizes it in one vectorized pass: amounts with pandas string methods,
+dates by parsing each distinct value once (date columns repeat a few values).
+NumPy and pandas are only imported by the column forms, so the scalar
+parsers stay cheap to import for the ingestion entry points.
+"""
+import math
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Currency markers, the "/-" suffix, digit grouping (1,23,456 or 123,456) and spaces
+_AMOUNT_NOISE = re.compile(r"₹|rs\.?|inr|/-|[,\s]", re.IGNORECASE)
+_AMOUNT_TOKENS = (",", " ", "₹", "/-", "Rs.", "Rs", "INR")
+_AMOUNT = re.compile(r"^(?P<open>\()?(?P<sign>[+-])?(?P<digits>\d+(?:\.\d*)?|\.\d+)(?P<close>\))?(?P<trail>-)?$")
+# The subset of _AMOUNT that pd.to_numeric reads the same way (no parentheses or trailing minus)
+_PLAIN_AMOUNT = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)"
+
+_MONTH_NAMES = ("january", "february", "march", "april", "may", "june", "july", "august",
+                "september", "october", "november", "december")
+_MONTHS = {**{n: i for i, n in enumerate(_MONTH_NAMES, 1)}, **{n[:3]: i for i, n in enumerate(_MONTH_NAMES, 1)},
+           "sept": 9}
+
+_ORDINAL = r"(?:st|nd|rd|th)?"
+_YMD = re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:[t ]\d.*)?")      # 2024-03-31, 2024/03/31, ISO datetimes
+_DMY = re.compile(r"(\d{1,2})[-/.](\d{1,2})[-/.](\d{4}|\d{2})")             # 31/03/2024, 31-03-24, 31.03.2024
+_D_MON_Y = re.compile(rf"(\d{{1,2}}){_ORDINAL}[ -]([a-z]+)\.?,?[ -](\d{{4}}|\d{{2}})")  # 31 Mar 2024, 31-March-24
+_MON_D_Y = re.compile(rf"([a-z]+)\.? (\d{{1,2}}){_ORDINAL},? (\d{{4}})")            # March 31, 2024
+_YM = re.compile(r"(\d{4})[-/](\d{1,2})")                                   # 2024-03
+_MON_Y = re.compile(r"([a-z]+)\.?[ ,'-]*(\d{4}|\d{2})")                     # March 2024, Mar-24, Mar'24
+_M_Y = re.compile(r"(\d{1,2})[-/](\d{4})")                                  # 03/2024
+
+
+# ---------------------------------------------------------------- amounts
+
+def _amount_text(value: str) -> Optional[str]:
+    """Canonical decimal string ("-123456.50") of an amount string, or None."""
+    m = _AMOUNT.match(_AMOUNT_NOISE.sub("", value))
+    if m is None or bool(m.group("open")) != bool(m.group("close")):
+        return None
+    negative = bool(m.group("open")) or m.group("sign") == "-" or bool(m.group("trail"))
+    return ("-" if negative else "") + m.group("digits")
+
+
+def parse_amount(value) -> Optional[float]:
+    """An amount as float (numbers pass through), or None if it doesn't parse."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        f = float(value)
+        return None if math.isnan(f) else f
+    text = _amount_text(str(value))
+    return float(text) if text is not None else None
+
+
+def parse_decimal(value) -> Optional[Decimal]:
+    """Like parse_amount, as an exact Decimal for money arithmetic."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value if isinstance(value, Decimal) else Decimal(str(value))
+    text = _amount_text(str(value))
+    try:
+        return Decimal(text) if text is not None else None
+    except InvalidOperation:
+        return None
+
+
+def _series(values) -> "pd.Series":
+    import pandas as pd
+
+    return values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+
+
+def parse_amounts(values) -> "pd.Series":
+    """parse_amount over a column: float64 Series (same index), NaN where it doesn't parse."""
+    import numpy as np
+    import pandas as pd
+
+    s = _series(values)
+    if s.dtype.kind in "iuf":
+        return s.astype(float)
+    if s.dtype.kind == "b":
+        return pd.Series(np.nan, index=s.index)
+    if pd.api.types.infer_dtype(s, skipna=True) in ("integer", "floating", "mixed-integer-float", "decimal", "empty"):
+        # numbers, Decimals and None convert in one C loop (strings and bools would too, so they don't get here)
+        return pd.Series(np.asarray(s, dtype=float), index=s.index)
+    # Common shapes ("₹ 1,23,456.50", "Rs. 5,000/-") are cleaned with literal replaces and
+    # converted in C. to_numeric also reads what parse_amount rejects ("1e5", "inf"), so only
+    # cleaned strings of the plain amount shape are taken from it; the rest (parentheses, odd
+    # spacing, anything else) goes through parse_amount one by one.
+    text = s.astype("string")
+    cleaned = text
+    for token in _AMOUNT_TOKENS:
+        cleaned = cleaned.str.replace(token, "", regex=False)
+    plain = cleaned.str.fullmatch(_PLAIN_AMOUNT).fillna(False).to_numpy(dtype=bool)
+    amounts = pd.to_numeric(cleaned.where(plain), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    rest = ~plain & text.notna().to_numpy()
+    if rest.any():
+        parsed = [parse_amount(v) for v in s[rest]]
+        amounts[rest] = [np.nan if a is None else a for a in parsed]
+    return pd.Series(amounts, index=s.index)
+
+
+# ---------------------------------------------------------------- dates
+
+def _year(text: str) -> int:
+    y = int(text)
+    if len(text) == 2:
+        # same pivot as strptime's %y
+        y += 2000 if y < 69 else 1900
+    return y
+
+
+def _date(y: str, m, d) -> Optional[date]:
+    try:
+        return date(_year(y), int(m), int(d))
+    except (TypeError, ValueError):
+        return None
+
+
+def _clean(value) -> str:
+    return " ".join(str(value).split()).lower()
+
+
+def _parse_date_text(text: str) -> Optional[date]:
+    m = _YMD.fullmatch(text)
+    if m:
+        return _date(m.group(1), m.group(2), m.group(3))
+    m = _DMY.fullmatch(text)
+    if m:
+        return _date(m.group(3), m.group(2), m.group(1))
+    m = _D_MON_Y.fullmatch(text)
+    if m:
+        return _date(m.group(3), _MONTHS.get(m.group(2)), m.group(1))
+    m = _MON_D_Y.fullmatch(text)
+    if m:
+        return _date(m.group(3), _MONTHS.get(m.group(1)), m.group(2))
+    return None
+
+
+def parse_date(value) -> Optional[date]:
+    """A calendar date from a pay_date string, or None."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str) or not value:
+        return None
+    return _parse_date_text(_clean(value))
+
+
+def parse_month(value) -> Optional[date]:
+    """First day of the month named by a month label ("2024-03", "March 2024", ...), or None."""
+    if isinstance(value, datetime):
+        return value.date().replace(day=1)
+    if isinstance(value, date):
+        return value.replace(day=1)
+    if not isinstance(value, str) or not value:
+        return None
+    text = _clean(value)
+    m = _YM.fullmatch(text)
+    if m:
+        return _date(m.group(1), m.group(2), 1)
+    m = _MON_Y.fullmatch(text)
+    if m:
+        return _date(m.group(2), _MONTHS.get(m.group(1)), 1)
+    m = _M_Y.fullmatch(text)
+    if m:
+        return _date(m.group(2), m.group(1), 1)
+    full = _parse_date_text(text)
+    return full.replace(day=1) if full else None
+
+
+def pay_month(month, pay_date) -> Optional[date]:
+    """Month a payslip belongs to: from pay_date if it parses, else from the month label."""
+    paid = parse_date(pay_date)
+    if paid:
+        return paid.replace(day=1)
+    return parse_month(month)
+
+
+def _parse_distinct(values, parse: Callable) -> "pd.Series":
+    """Apply a scalar date parser to each distinct value once; datetime64 Series, NaT where None."""
+    import numpy as np
+    import pandas as pd
+
+    s = _series(values)
+    codes, uniques = pd.factorize(s)
+    parsed = [parse(u) for u in uniques]
+    table = np.array([np.datetime64(d, "D") if d else np.datetime64("NaT") for d in parsed]
+                     + [np.datetime64("NaT")], dtype="datetime64[D]")
+    # code -1 (missing values) picks the trailing NaT
+    return pd.Series(table[codes].astype("datetime64[ns]"), index=s.index)
+
+
+def parse_dates(values) -> "pd.Series":
+    """parse_date over a column."""
+    return _parse_distinct(values, parse_date)
+
+
+def parse_months(values) -> "pd.Series":
+    """parse_month over a column."""
+    return _parse_distinct(values, parse_month)
+
+
+def pay_months(months, pay_dates) -> "pd.Series":
+    """pay_month over two aligned columns."""
+    import pandas as pd
+
+    paid = parse_dates(pay_dates)
+    labelled = parse_months(months)
+    paid_month = pd.Series(paid.to_numpy().astype("datetime64[M]").astype("datetime64[ns]"), index=paid.index)
+    return paid_month.where(paid_month.notna(), labelled.to_numpy())
+
+
+def month_labels(values) -> "pd.Series":
+    """"YYYY-MM" labels for a column of dates / datetimes (None where missing)."""
+    import numpy as np
+    import pandas as pd
+
+    s = _series(values)
+    codes, uniques = pd.factorize(s)
+    table = np.array([pd.Timestamp(u).strftime("%Y-%m") for u in uniques] + [None], dtype=object)
+    return pd.Series(table[codes], index=s.index)
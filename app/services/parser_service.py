@@ -1,51 +1,52 @@
 import os
-import json
+from pathlib import Path
+from app import metrics
 from app.db import SessionLocal, init_db
-from app.models import PayslipRaw, PayslipRecord
 from app.extractors.pdf_loader import load_pdf_text
 from app.extractors.llm_parser import parse_with_llm
+from app.extractors.template_parser import parse_with_fast_path
 from app.config import settings
+from app.services.bulk_writer import BulkWriter, PayslipRow, record_values
+from app.services.manifest import Manifest
 
-init_db()
+_db_ready = False
+
+def _ensure_db():
+    """Create missing tables on first use rather than when this module is imported."""
+    global _db_ready
+    if not _db_ready:
+        init_db()
+        _db_ready = True
 
 def process_pdf_file(path: str):
+    _ensure_db()
     session = SessionLocal()
     filename = os.path.basename(path)
-    existing = session.query(PayslipRaw).filter_by(filename=filename).first()
-    if existing:
+    try:
+        manifest = Manifest.load(session, paths=[path])
+        state = manifest.check(Path(path))
+        if state is None:
+            manifest.flush(session)
+            session.commit()
+            metrics.DOCUMENTS.inc(outcome="skipped")
+            return
+    finally:
         session.close()
-        return
-
-    text = load_pdf_text(path)
-    raw = PayslipRaw(filename=filename, raw_text=text)
-    session.add(raw)
-    session.commit()
 
+    with metrics.timed("extract"):
+        text = load_pdf_text(path)
+    row = PayslipRow(
+        filename=filename,
+        raw_text=text,
+        replace=state.replaces_existing,
+        manifest=state.entry,
+    )
     try:
-        structured = parse_with_llm(text)
-        rec = PayslipRecord(
-            payslip_raw_id=raw.id,
-            employee_name=structured.get('employee_name'),
-            employee_code=structured.get('employee_code'),
-            pan=structured.get('pan'),
-            pay_date=structured.get('pay_date'),
-            month=structured.get('month'),
-            gross_salary=structured.get('gross_salary'),
-            basic=structured.get('basic'),
-            hra=structured.get('hra'),
-            special_allowance=structured.get('special_allowance'),
-            tds=structured.get('tds'),
-            pf_employee=structured.get('pf_employee'),
-            pf_employer=structured.get('pf_employer'),
-            net_pay=structured.get('net_pay'),
-            components_json=json.dumps(structured.get('components', {}), ensure_ascii=False)
-        )
-        session.add(rec)
-        raw.parsed = True
-        session.commit()
+        with metrics.timed("parse"):
+            structured = parse_with_fast_path(text, parse_with_llm)
+        row.record = record_values(structured)
     except Exception as e:
-        session.rollback()
-        raw.parse_errors = str(e)
-        session.commit()
-    finally:
-        session.close()
\ No newline at end of file
+        row.parse_errors = str(e)
+    # raw row, record and manifest entry are written in one transaction
+    result = BulkWriter(batch_size=1).write([row])[0]
+    metrics.DOCUMENTS.inc(outcome="failed" if result.error else "parse_failed" if row.parse_errors else "saved")
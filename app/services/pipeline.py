@@ -0,0 +1,299 @@
+# app/services/pipeline.py
+"""
+Staged ingestion pipeline.
+
+PDF/OCR extraction runs in a process pool, LLM parsing runs in a thread pool
+with a fixed concurrency limit and a single writer thread persists results in
+batches (see app.services.bulk_writer). Stages are connected by bounded queues so a slow stage applies
+back-pressure instead of buffering the whole folder in memory.
+
+Each stage records its duration in app.metrics; metrics recorded inside the
+extraction worker processes are sent back with every result and merged.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Union
+
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger("pipeline")
+
+_STOP = object()
+
+
+@dataclass
+class WorkItem:
+    path: Path
+    text: str = ""
+    structured: Optional[dict] = None
+    error: Optional[str] = None
+    # caller-owned context carried through to write_fn (e.g. manifest state)
+    meta: Any = None
+
+
+class PipelineStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.saved = 0
+        self.parse_failed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        done = self.saved + self.parse_failed
+        return {
+            "saved": self.saved,
+            "parse_failed": self.parse_failed,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "docs_per_min": round(done / elapsed * 60, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def _extract_in_worker(extract_fn, path):
+    """Runs in a worker process: returns (text, error, metrics recorded meanwhile)."""
+    try:
+        with metrics.timed("extract"):
+            text, error = extract_fn(path), None
+    except Exception as e:
+        text, error = None, e
+    return text, error, metrics.REGISTRY.drain()
+
+
+def _worker_result(fut):
+    text, error, snapshot = fut.result()
+    metrics.REGISTRY.merge(snapshot)
+    if error is not None:
+        raise error
+    return text
+
+
+def _notify(callback, *args):
+    if callback is not None:
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.warning(f"Pipeline callback {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def _extract_stage(paths, extract_fn, workers, llm_q, stats, on_extracted=None, on_failed=None):
+    """
+    Submit extraction jobs with at most 2 * workers in flight and hand the
+    results to the LLM queue as they complete. Items that already carry
+    their text go straight to the LLM queue. `paths` may yield None while it
+    waits for more input (a watched folder): finished extractions are passed
+    on at every step, so they don't wait for the next item.
+    """
+    def emit(item, get_text):
+        try:
+            item.text = get_text() or ""
+        except Exception as e:
+            stats.incr("failed")
+            metrics.DOCUMENTS.inc(outcome="failed")
+            logger.exception(f"Extraction failed for {item.path}: {e}")
+            _notify(on_failed, item, f"Extraction failed: {e!r}")
+            return
+        _notify(on_extracted, item)
+        llm_q.put(item)
+
+    def to_extract():
+        for p in paths:
+            if p is None:
+                yield None
+                continue
+            item = p if isinstance(p, WorkItem) else WorkItem(path=p)
+            if item.text:
+                llm_q.put(item)
+            else:
+                yield item
+
+    items = to_extract()
+    if workers <= 0:
+        for item in items:
+            if item is not None:
+                with metrics.timed("extract"):
+                    emit(item, lambda: extract_fn(str(item.path)))
+        return
+
+    max_in_flight = workers * 2
+    # Workers start from an empty registry so forked copies of the parent's values aren't merged back
+    with ProcessPoolExecutor(max_workers=workers, initializer=metrics.REGISTRY.reset) as pool:
+        in_flight = {}
+        for item in items:
+            if item is not None:
+                in_flight[pool.submit(_extract_in_worker, extract_fn, str(item.path))] = item
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            else:
+                done = [fut for fut in in_flight if fut.done()]
+            for fut in done:
+                emit(in_flight.pop(fut), lambda: _worker_result(fut))
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                emit(in_flight.pop(fut), lambda: _worker_result(fut))
+
+
+def _llm_worker(parse_fn, parse_many_fn, llm_batch_size, llm_q, db_q):
+    while True:
+        item = llm_q.get()
+        if item is _STOP:
+            return
+        # Opportunistically batch whatever is already queued
+        items, stop = [item], False
+        while parse_many_fn is not None and len(items) < llm_batch_size:
+            try:
+                nxt = llm_q.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _STOP:
+                stop = True
+                break
+            items.append(nxt)
+
+        if len(items) == 1:
+            try:
+                with metrics.timed("parse"):
+                    item.structured = parse_fn(item.text)
+            except Exception as e:
+                item.error = f"LLM parse failed after retries: {repr(e)}"
+                logger.warning(f"LLM parse failed for {item.path.name}: {e}")
+        else:
+            try:
+                with metrics.timed("parse_batch"):
+                    results = parse_many_fn([i.text for i in items])
+            except Exception as e:
+                results = [e] * len(items)
+            for it, res in zip(items, results):
+                if isinstance(res, Exception):
+                    it.error = f"LLM parse failed after retries: {repr(res)}"
+                    logger.warning(f"LLM parse failed for {it.path.name}: {res}")
+                else:
+                    it.structured = res
+        for it in items:
+            db_q.put(it)
+        if stop:
+            return
+
+
+def _write_batch(write_fn, batch, stats, on_saved, on_failed):
+    try:
+        errors = write_fn(batch)
+    except Exception as e:
+        logger.exception(f"DB write of {len(batch)} item(s) failed: {e}")
+        errors = [repr(e)] * len(batch)
+    for item, error in zip(batch, errors):
+        if error:
+            stats.incr("failed")
+            metrics.DOCUMENTS.inc(outcome="failed")
+            _notify(on_failed, item, f"DB write failed: {error}")
+            continue
+        outcome = "parse_failed" if item.error else "saved"
+        stats.incr(outcome)
+        metrics.DOCUMENTS.inc(outcome=outcome)
+        if on_saved:
+            on_saved(item)
+
+
+def _writer(write_fn, db_q, batch_size, flush_interval, stats, on_saved, on_failed):
+    batch = []
+    deadline = time.monotonic() + flush_interval
+    while True:
+        timeout = max(0.0, deadline - time.monotonic())
+        try:
+            item = db_q.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+        if item is _STOP:
+            if batch:
+                _write_batch(write_fn, batch, stats, on_saved, on_failed)
+            return
+        if item is not None:
+            batch.append(item)
+        if batch and (len(batch) >= batch_size or time.monotonic() >= deadline):
+            _write_batch(write_fn, batch, stats, on_saved, on_failed)
+            batch = []
+        if time.monotonic() >= deadline:
+            deadline = time.monotonic() + flush_interval
+
+
+def run_pipeline(
+    paths: Iterable[Union[Path, WorkItem]],
+    extract_fn: Callable[[str], str],
+    parse_fn: Callable[[str], dict],
+    write_fn: Callable[[list], list],
+    extract_workers: Optional[int] = None,
+    llm_workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    on_saved: Optional[Callable[[WorkItem], None]] = None,
+    parse_many_fn: Optional[Callable[[list], list]] = None,
+    on_extracted: Optional[Callable[[WorkItem], None]] = None,
+    on_failed: Optional[Callable[[WorkItem, str], None]] = None,
+) -> dict:
+    """
+    Run paths through extract -> LLM -> DB and return run statistics.
+
+    `extract_fn` must be picklable (a module-level function) because it runs in
+    worker processes. `write_fn(items)` persists a batch and returns one error
+    (or None) per item; it is only ever called from the single writer thread.
+    Pass WorkItems instead of paths to carry `meta` through to `write_fn`.
+    A long-running source can yield None while it has nothing new, so
+    results keep flowing (see _extract_stage); the run ends when it stops.
+
+    When `parse_many_fn` is given and LLM_BATCH_SIZE > 1, LLM workers hand it
+    several queued texts at once; it returns one dict or exception per text.
+
+    `on_extracted(item)` runs once an item's text is extracted (items passed
+    in with text skip extraction), `on_failed(item, error)` when extraction
+    or the DB write fails; parse failures are written and reach `write_fn`.
+    """
+    extract_workers = settings.EXTRACT_WORKERS if extract_workers is None else extract_workers
+    llm_workers = max(1, llm_workers or settings.LLM_CONCURRENCY)
+    batch_size = max(1, batch_size or settings.DB_BATCH_SIZE)
+    queue_size = max(1, queue_size or settings.PIPELINE_QUEUE_SIZE)
+    if settings.LLM_BATCH_SIZE <= 1:
+        parse_many_fn = None
+
+    stats = PipelineStats()
+    llm_q = queue.Queue(maxsize=queue_size)
+    db_q = queue.Queue(maxsize=queue_size)
+
+    llm_threads = [
+        threading.Thread(target=_llm_worker, args=(parse_fn, parse_many_fn, settings.LLM_BATCH_SIZE, llm_q, db_q), name=f"llm-{i}", daemon=True)
+        for i in range(llm_workers)
+    ]
+    writer = threading.Thread(
+        target=_writer,
+        args=(write_fn, db_q, batch_size, settings.DB_FLUSH_INTERVAL, stats, on_saved, on_failed),
+        name="db-writer",
+        daemon=True,
+    )
+    for t in llm_threads:
+        t.start()
+    writer.start()
+
+    try:
+        _extract_stage(paths, extract_fn, extract_workers, llm_q, stats, on_extracted, on_failed)
+    finally:
+        for _ in llm_threads:
+            llm_q.put(_STOP)
+        for t in llm_threads:
+            t.join()
+        db_q.put(_STOP)
+        writer.join()
+
+    result = stats.as_dict()
+    logger.info(f"Pipeline finished: {result}")
+    return result
@@ -0,0 +1,115 @@
+# app/services/raw_text.py
+"""
+Content-addressed, compressed storage for extracted payslip text.
+
+The text lives in raw_text_blobs keyed by the sha256 of the text, so
+identical extractions (re-uploads, duplicate files) are stored once.
+payslips_raw only keeps that hash (text_hash) next to the metadata the
+pipeline and dashboard scan. Blobs are compressed with zstd when the
+zstandard package is installed, otherwise zlib; the codec is stored per blob
+so both can be read back either way. PayslipRaw.raw_text is the legacy
+inline column: it is deferred and only read for rows not yet migrated.
+"""
+import hashlib
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert, select
+
+from app.models import IngestJob, PayslipRaw, RawTextBlob
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+blobs = RawTextBlob.__table__
+raws = PayslipRaw.__table__
+jobs = IngestJob.__table__
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress(text: str) -> tuple:
+    """(codec, bytes) for `text`."""
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This text is zstd-compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown raw text codec {codec!r}")
+
+
+def store(conn, texts: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """Store texts that aren't stored yet; returns their hashes (None for None)."""
+    texts = list(texts)
+    hashes = [text_hash(t) if t is not None else None for t in texts]
+    wanted: Dict[str, str] = {h: t for h, t in zip(hashes, texts) if h is not None}
+    if wanted:
+        known = set(conn.execute(select(blobs.c.hash).where(blobs.c.hash.in_(list(wanted)))).scalars())
+        rows = []
+        for h, t in wanted.items():
+            if h not in known:
+                codec, data = compress(t)
+                rows.append({"hash": h, "codec": codec, "size": len(t), "data": data})
+        if rows:
+            conn.execute(insert(blobs), rows)
+    return hashes
+
+
+def prune(conn, hashes: Iterable[Optional[str]]):
+    """Delete blobs among `hashes` that no payslips_raw row or unfinished job refers to any more."""
+    hashes = [h for h in set(hashes) if h]
+    if hashes:
+        from app.services.job_queue import ACTIVE, PENDING
+
+        referenced = select(raws.c.id).where(raws.c.text_hash == blobs.c.hash).exists()
+        queued = select(jobs.c.id).where(
+            jobs.c.text_hash == blobs.c.hash, jobs.c.state.in_((PENDING,) + ACTIVE)
+        ).exists()
+        conn.execute(delete(blobs).where(blobs.c.hash.in_(hashes), ~referenced, ~queued))
+
+
+def load_blobs(conn, hashes: Iterable[str]) -> Dict[str, str]:
+    """{hash: text} for the stored blobs among `hashes`."""
+    hashes = [h for h in set(hashes) if h]
+    if not hashes:
+        return {}
+    stmt = select(blobs.c.hash, blobs.c.codec, blobs.c.data).where(blobs.c.hash.in_(hashes))
+    return {h: decompress(codec, data) for h, codec, data in conn.execute(stmt)}
+
+
+def load_texts(conn, raw_ids: Iterable[int]) -> Dict[int, str]:
+    """{raw id: text} for the given payslips_raw rows, from blobs or the legacy column."""
+    raw_ids = list(raw_ids)
+    if not raw_ids:
+        return {}
+    stmt = (
+        select(raws.c.id, blobs.c.codec, blobs.c.data, raws.c.raw_text)
+        .select_from(raws.outerjoin(blobs, blobs.c.hash == raws.c.text_hash))
+        .where(raws.c.id.in_(raw_ids))
+    )
+    out = {}
+    for raw_id, codec, data, legacy in conn.execute(stmt):
+        if data is not None:
+            out[raw_id] = decompress(codec, data)
+        elif legacy is not None:
+            out[raw_id] = legacy
+    return out
+
+
+def load_text(conn, raw_id: int) -> Optional[str]:
+    return load_texts(conn, [raw_id]).get(raw_id)
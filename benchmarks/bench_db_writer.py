@@ -0,0 +1,76 @@
+# benchmarks/bench_db_writer.py
+"""
+Rows/s of the bulk writer against the previous per-file ORM path (one
+session and two commits per payslip).
+
+    python benchmarks/bench_db_writer.py --rows 5000
+    python benchmarks/bench_db_writer.py --url postgresql://user:pw@localhost/payslips_bench
+
+The target database is emptied of payslip tables first; don't point it at
+real data.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic import payslip_fields, payslip_text
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--batch-size", type=int, nargs="+", default=[1, 50, 500])
+    ap.add_argument("--url", help="database URL (default: a temporary SQLite file)")
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.url or f"sqlite:///{tmp.name}/bench.db"
+
+    from app.db import Base, SessionLocal, engine, init_db
+    from app.models import PayslipRaw, PayslipRecord
+    from app.services.bulk_writer import BulkWriter, PayslipRow, record_values
+
+    docs = [(f"bench_{i:07d}.pdf", payslip_text(i), payslip_fields(i)) for i in range(args.rows)]
+
+    def reset():
+        Base.metadata.drop_all(bind=engine)
+        init_db()
+
+    def report(label, elapsed):
+        print(f"{label:>18}: {args.rows / elapsed:9.1f} rows/s  ({elapsed:.2f}s)")
+
+    print(f"{engine.dialect.name}, {args.rows} payslips")
+
+    reset()
+    start = time.perf_counter()
+    for filename, text, fields in docs:
+        session = SessionLocal()
+        raw = PayslipRaw(filename=filename, raw_text=text)
+        session.add(raw)
+        session.commit()
+        rec = PayslipRecord(payslip_raw_id=raw.id, **record_values(fields))
+        session.add(rec)
+        raw.parsed = True
+        session.commit()
+        session.close()
+    report("orm per file", time.perf_counter() - start)
+
+    for batch_size in args.batch_size:
+        reset()
+        rows = [PayslipRow(filename, text, record_values(fields)) for filename, text, fields in docs]
+        start = time.perf_counter()
+        BulkWriter(batch_size=batch_size).write(rows)
+        report(f"bulk batch={batch_size}", time.perf_counter() - start)
+
+    Base.metadata.drop_all(bind=engine)
+
+
+if __name__ == "__main__":
+    main()
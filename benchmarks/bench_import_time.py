@@ -0,0 +1,168 @@
+# benchmarks/bench_import_time.py
+"""
+Import time of the entry points, measured with `python -X importtime`.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --runs 9 --top 15
+    python benchmarks/bench_import_time.py --compare benchmarks/results/import-a.json benchmarks/results/import-b.json
+
+Each entry point is imported --runs times in a fresh interpreter (against a
+scratch database and PDF folder) and the median cumulative time is reported,
+with the packages that cost the most. The CLIs must start quickly (`--help`,
+`--status`, `--dry-run`), so the heavy dependencies (pandas / NumPy, OCR,
+PyMuPDF, the OpenAI client, LangChain, pydantic) are imported on first use.
+The run fails when an entry point imports one of them, leaves files behind
+(creating tables or folders at import), or goes over its budget in BUDGETS_MS.
+Results are written as JSON to benchmarks/results/ so runs can be compared
+across commits.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+# Median cumulative import time allowed per entry point, in ms. Generous on
+# purpose (machines differ): they catch a heavy import creeping back in, not
+# a few milliseconds. Most of what is left is SQLAlchemy.
+BUDGETS_MS = {
+    "app.scripts.process_pdfs": 1000,
+    "app.services.parser_service": 1000,
+    "app.scripts.export_payslips": 800,
+    "app.scripts.rebuild_monthly_summary": 800,
+}
+
+# Packages none of the entry points may import at module level
+DEFERRED = ("pandas", "numpy", "pyarrow", "pytesseract", "pdf2image", "pymupdf", "fitz", "pdfplumber",
+            "pypdf", "openai", "langchain", "langchain_community", "pydantic")
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _parse(stderr: str, module: str):
+    """`-X importtime` output -> (cumulative µs of importing `module`, {module: self µs})."""
+    total, modules = 0, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name == module:
+            total = int(cumulative)
+        modules[name] = int(self_us)
+    return total, modules
+
+
+def measure(module: str, runs: int) -> dict:
+    totals, self_times = [], defaultdict(list)
+    loaded = set()
+    with tempfile.TemporaryDirectory(prefix="bench_import_") as tmp:
+        work = Path(tmp)
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "stub"),
+            DATABASE_URL=f"sqlite:///{work / 'import.db'}",
+            PDF_FOLDER=str(work / "pdfs"),
+            PYTHONPATH=str(ROOT),
+            PYTHONDONTWRITEBYTECODE="1",
+        )
+        for _ in range(runs):
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                  cwd=ROOT, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                sys.stderr.write(proc.stderr[-4000:])
+                raise SystemExit(f"importing {module} failed with exit code {proc.returncode}")
+            total, modules = _parse(proc.stderr, module)
+            totals.append(total)
+            loaded.update(modules)
+            for name, us in modules.items():
+                self_times[name].append(us)
+        side_effects = sorted(p.name for p in work.iterdir())
+
+    # self time summed per top-level package (median over runs)
+    packages = defaultdict(float)
+    for name, times in self_times.items():
+        packages[name.split(".")[0]] += statistics.median(times) / 1000
+    return {
+        "median_ms": round(statistics.median(totals) / 1000, 1),
+        "min_ms": round(min(totals) / 1000, 1),
+        "modules": len(loaded),
+        "deferred_imported": sorted({m.split(".")[0] for m in loaded} & set(DEFERRED)),
+        "side_effects": side_effects,
+        "packages_ms": {k: round(v, 1) for k, v in sorted(packages.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def compare(a_path: str, b_path: str):
+    a, b = (json.loads(Path(p).read_text()) for p in (a_path, b_path))
+    print(f"{'median import ms':<40} {a.get('commit') or 'a':>10} {b.get('commit') or 'b':>10}")
+    for module in sorted(set(a["entry_points"]) | set(b["entry_points"])):
+        x = a["entry_points"].get(module, {}).get("median_ms")
+        y = b["entry_points"].get(module, {}).get("median_ms")
+        change = f"{(y - x) / x * 100:+7.1f}%" if x and y is not None else ""
+        print(f"{module:<40} {x!s:>10} {y!s:>10} {change}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point")
+    ap.add_argument("--top", type=int, default=8, help="packages to list per entry point")
+    ap.add_argument("--module", action="append", help="entry point to measure (default: all in BUDGETS_MS)")
+    ap.add_argument("--label", default="")
+    ap.add_argument("--out", help=f"result file (default: {RESULTS_DIR.relative_to(ROOT)}/import-<time>-<commit>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("A", "B"), help="compare two result files and exit")
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = {
+        "label": args.label,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "entry_points": {},
+    }
+    failures = []
+    for module in args.module or BUDGETS_MS:
+        m = result["entry_points"][module] = measure(module, args.runs)
+        budget = BUDGETS_MS.get(module)
+        print(f"{module}: {m['median_ms']} ms median, {m['min_ms']} ms min, {m['modules']} modules"
+              + (f" (budget {budget} ms)" if budget else ""))
+        for name, ms in list(m["packages_ms"].items())[:args.top]:
+            print(f"  {name:<28} {ms:8.1f} ms")
+        if m["deferred_imported"]:
+            failures.append(f"{module} imports {', '.join(m['deferred_imported'])} at module level")
+        if m["side_effects"]:
+            failures.append(f"{module} creates {', '.join(m['side_effects'])} when imported")
+        if budget and m["median_ms"] > budget:
+            failures.append(f"{module} takes {m['median_ms']} ms to import, over its {budget} ms budget")
+
+    result["failures"] = failures
+    out = Path(args.out) if args.out else RESULTS_DIR / f"import-{datetime.now():%Y%m%d-%H%M%S}-{result['commit'] or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {out}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_llm_batch.py
+"""
+Compare single-document and batched LLM extraction against the local stub
+server: throughput in docs/min and prompt tokens per document.
+
+    python benchmarks/bench_llm_batch.py --docs 200 --batch-size 8 --concurrency 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_openai_server import serve_in_thread
+from synthetic import payslip_text
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--token-budget", type=int, default=6000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency", type=float, default=0.5)
+    args = ap.parse_args()
+
+    server = serve_in_thread(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = "http://%s:%d/v1" % server.server_address
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["LLM_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["LLM_BATCH_TOKEN_BUDGET"] = str(args.token_budget)
+
+    from app.extractors import llm_parser
+
+    texts = [payslip_text(i) for i in range(args.docs)]
+
+    def run(label, fn, chunks):
+        before = llm_parser.usage_stats()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(fn, chunks))
+        elapsed = time.perf_counter() - start
+        after = llm_parser.usage_stats()
+        requests = after["requests"] - before["requests"]
+        prompt_tokens = after["prompt_tokens"] - before["prompt_tokens"]
+        print(f"{label:>7}: {args.docs / elapsed * 60:8.1f} docs/min  "
+              f"{requests:5d} requests  {prompt_tokens / args.docs:7.1f} prompt tokens/doc")
+
+    run("single", llm_parser.parse_with_llm, texts)
+    chunks = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+    run("batched", llm_parser.parse_batch_with_llm, chunks)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_llm_dispatcher.py
+"""
+Compare the old blind-retry LLM calls with the rate-limited dispatcher
+against a stub server that enforces a requests-per-minute limit: sustained
+throughput, 429s received, retries and failed documents.
+
+    python benchmarks/bench_llm_dispatcher.py --docs 120 --rpm-limit 60 --concurrency 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_openai_server import serve_in_thread
+from synthetic import payslip_text
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=120)
+    ap.add_argument("--rpm-limit", type=int, default=60, help="limit enforced by the stub server")
+    ap.add_argument("--rpm", type=int, default=None, help="client-side LLM_RPM (default: the stub's limit)")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--latency", type=float, default=0.3)
+    ap.add_argument("--skip-baseline", action="store_true")
+    args = ap.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["LLM_RPM"] = str(args.rpm or args.rpm_limit)
+    os.environ["LLM_CONCURRENCY"] = str(args.concurrency)
+    os.environ["LLM_BACKOFF_MAX"] = "8"
+
+    texts = [payslip_text(i) for i in range(args.docs)]
+
+    def run(label, fn):
+        server = serve_in_thread(latency=args.latency, rpm_limit=args.rpm_limit)
+        os.environ["OPENAI_BASE_URL"] = "http://%s:%d/v1" % server.server_address
+        failed = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for ok in pool.map(fn, texts):
+                failed += not ok
+        elapsed = time.perf_counter() - start
+        cfg = server.RequestHandlerClass.config
+        print(f"{label:>10}: {(args.docs - failed) / elapsed * 60:7.1f} docs/min  "
+              f"{cfg.requests:5d} requests  {cfg.throttled:5d} x 429  {failed:4d} failed  {elapsed:6.1f}s")
+        server.shutdown()
+
+    if not args.skip_baseline:
+        from openai import OpenAI
+        from app.extractors.llm_parser import EXTRACTION_PROMPT
+
+        def blind(text, retries=3, backoff=2):
+            # The previous behaviour: client without rate awareness, fixed exponential sleeps
+            client = OpenAI(base_url=os.environ["OPENAI_BASE_URL"], max_retries=0)
+            for attempt in range(1, retries + 1):
+                try:
+                    client.chat.completions.create(
+                        model="stub", max_tokens=1500, temperature=0.0,
+                        messages=[{"role": "user", "content": EXTRACTION_PROMPT.replace("{text}", text)}],
+                    )
+                    return True
+                except Exception:
+                    time.sleep(backoff ** attempt)
+            return False
+
+        run("blind", blind)
+
+    from app.extractors import llm_dispatcher
+    from app.extractors.llm_parser import parse_with_llm
+
+    def dispatched(text):
+        try:
+            parse_with_llm(text, use_cache=False)
+            return True
+        except Exception:
+            return False
+
+    run("dispatcher", dispatched)
+    print(f"dispatcher status: {llm_dispatcher.dispatcher_status()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_pdf_backends.py
+"""
+Compare the PDF text backends in app/extractors/pdf_loader.py on a synthetic
+corpus: pages/s, peak RSS and whether the output matches the original
+LangChain PyPDFLoader text (exactly, and after whitespace normalization).
+Each backend runs in a fresh process, so its library import and memory are
+its own.
+
+    python benchmarks/bench_pdf_backends.py --docs 200 --pages 3
+"""
+import argparse
+import multiprocessing as mp
+import re
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic import write_payslip_pdf
+
+
+def _run(backend, paths, out):
+    from app.extractors.pdf_loader import load_pdf_pages
+    texts, pages = [], 0
+    start = time.perf_counter()
+    for p in paths:
+        page_texts = load_pdf_pages(str(p), backend=backend)
+        pages += len(page_texts)
+        texts.append("\n\n".join(page_texts))
+    elapsed = time.perf_counter() - start
+    out.put({
+        "backend": backend,
+        "pages_per_s": pages / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "texts": texts,
+    })
+
+
+def run_backend(backend, paths):
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(backend, paths, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--pages", type=int, default=3)
+    ap.add_argument("--backends", nargs="+", default=["langchain", "pypdf", "pymupdf", "pdfplumber"])
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.docs):
+            p = Path(tmp) / f"payslip_{i:05d}.pdf"
+            write_payslip_pdf(p, i, pages=args.pages)
+            paths.append(p)
+
+        results = [run_backend(b, paths) for b in args.backends]
+
+    ws = re.compile(r"\s+")
+    reference = next((r["texts"] for r in results if r["backend"] == "langchain"), None)
+    print(f"{args.docs} docs x {args.pages} pages")
+    print(f"{'backend':>11} {'pages/s':>9} {'peak MB':>8}  exact  normalized")
+    for r in results:
+        exact = normalized = "-"
+        if reference is not None:
+            exact = sum(a == b for a, b in zip(r["texts"], reference)) / len(reference)
+            normalized = sum(
+                ws.sub(" ", a).strip() == ws.sub(" ", b).strip() for a, b in zip(r["texts"], reference)
+            ) / len(reference)
+            exact, normalized = f"{exact:.0%}", f"{normalized:.0%}"
+        print(f"{r['backend']:>11} {r['pages_per_s']:9.1f} {r['peak_rss_mb']:8.1f}  {exact:>5}  {normalized:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of `python -m app.scripts.process_pdfs`.
+
+Generates a synthetic corpus (text PDFs plus a fraction of image-only
+scans), starts the stub OpenAI server with the given latency / error rate,
+and runs process_pdfs in a fresh process against a new SQLite database. The
+result (docs/s, per-stage p50/p95 from the run report, peak RSS, LLM and
+stub counters, git commit) is written as JSON to benchmarks/results/ so runs
+can be compared across commits:
+
+    python benchmarks/bench_pipeline.py --docs 200 --image-fraction 0.1 --latency 0.5 --error-rate 0.02
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/a.json benchmarks/results/b.json
+
+Image-only documents need tesseract and poppler (pdftoppm) for OCR.
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_openai_server import serve_in_thread
+from synthetic import write_corpus
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args) -> dict:
+    tmp = tempfile.TemporaryDirectory(prefix="bench_pipeline_")
+    work = Path(tmp.name)
+    start = time.perf_counter()
+    write_corpus(work / "pdfs", args.docs, image_fraction=args.image_fraction, pages=args.pages, seed=args.seed)
+    print(f"Corpus: {args.docs} PDF(s) in {time.perf_counter() - start:.1f}s")
+
+    server = serve_in_thread(latency=args.latency, error_rate=args.error_rate, rpm_limit=args.rpm_limit)
+    cfg = server.RequestHandlerClass.config
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL="http://%s:%d/v1" % server.server_address,
+        OPENAI_API_KEY="stub",
+        PDF_FOLDER=str(work / "pdfs"),
+        DATABASE_URL=f"sqlite:///{work / 'bench.db'}",
+        LLM_CACHE_ENABLED="0",
+        METRICS_REPORT_DIR=str(work / "reports"),
+        METRICS_FILE=str(work / "metrics.prom"),
+        PYTHONPATH=str(ROOT),
+    )
+    for kv in args.env:
+        key, _, value = kv.partition("=")
+        env[key] = value
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-m", "app.scripts.process_pdfs"], cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f"process_pdfs exited with {proc.returncode}")
+
+    reports = sorted(glob.glob(str(work / "reports" / "run-*.json")))
+    report = json.loads(Path(reports[-1]).read_text()) if reports else {}
+    documents = report.get("documents", {})
+    done = documents.get("saved", 0) + documents.get("parse_failed", 0)
+    return {
+        "label": args.label,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "params": {k: v for k, v in vars(args).items() if k not in ("compare", "out", "label")},
+        "elapsed_s": round(elapsed, 2),
+        "docs_per_s": round(done / elapsed, 2) if elapsed else 0.0,
+        # largest single process among process_pdfs and its workers (ru_maxrss is KB on Linux)
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "documents": documents,
+        "stages": {name: {k: s[k] for k in ("count", "mean", "p50", "p95")} for name, s in report.get("stages", {}).items()},
+        "llm": report.get("llm", {}),
+        "ocr_pages": report.get("ocr_pages", {}).get("sum"),
+        "stub": {"requests": cfg.requests, "errors": cfg.errors, "throttled": cfg.throttled},
+    }
+
+
+def compare(a_path: str, b_path: str):
+    a, b = (json.loads(Path(p).read_text()) for p in (a_path, b_path))
+
+    def row(name, x, y):
+        change = f"{(y - x) / x * 100:+7.1f}%" if x and y is not None else ""
+        print(f"{name:<28} {x!s:>10} {y!s:>10} {change}")
+
+    print(f"{'':<28} {a.get('commit') or 'a':>10} {b.get('commit') or 'b':>10}")
+    row("docs/s", a["docs_per_s"], b["docs_per_s"])
+    row("elapsed s", a["elapsed_s"], b["elapsed_s"])
+    row("peak RSS MB", a["peak_rss_mb"], b["peak_rss_mb"])
+    for stage in sorted(set(a["stages"]) | set(b["stages"])):
+        for q in ("p50", "p95"):
+            row(f"{stage} {q} s", a["stages"].get(stage, {}).get(q), b["stages"].get(stage, {}).get(q))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=100)
+    ap.add_argument("--image-fraction", type=float, default=0.1, help="share of image-only (scanned) PDFs")
+    ap.add_argument("--pages", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--latency", type=float, default=0.5, help="stub LLM latency per request, seconds")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub requests failing with 500")
+    ap.add_argument("--rpm-limit", type=int, default=0)
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra settings for the run, e.g. --env LLM_BATCH_SIZE=8")
+    ap.add_argument("--label", default="")
+    ap.add_argument("--out", help=f"result file (default: {RESULTS_DIR.relative_to(ROOT)}/<time>-<commit>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("A", "B"), help="compare two result files and exit")
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = run(args)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{result['commit'] or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"{result['docs_per_s']} docs/s, {result['elapsed_s']}s, peak RSS {result['peak_rss_mb']} MB, "
+          f"documents {result['documents']}, stub {result['stub']}")
+    for name, s in result["stages"].items():
+        print(f"  {name:<12} n={s['count']:<6} p50={s['p50']}s p95={s['p95']}s")
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_prompt_compression.py
+"""
+Prompt compression on a fixture set: estimated tokens per document before
+and after, max_tokens, and a check that extraction is unchanged.
+
+    python benchmarks/bench_prompt_compression.py --docs 500 --pages 3
+    python benchmarks/bench_prompt_compression.py --docs 20 --llm     # also compare real LLM extractions
+    python benchmarks/bench_prompt_compression.py --docs 100 --llm --stub
+
+Fixtures are synthetic payslips, half plain and half with the noise of a
+multi-page PDF (letterhead and footer on every page, layout spacing, table
+rules, annexures). Every document is checked twice: each ground-truth value
+must still appear in the compressed text, and the stub server's extractor
+must read the right values from it (on the raw noisy text it often can't:
+its patterns expect single spaces). With --llm both versions are sent to the
+configured model (OPENAI_API_KEY / OPENAI_BASE_URL, cache off; --stub starts
+the local stub server instead) and every field read from the raw text must
+come back the same from the compressed one. Exits non-zero on any mismatch.
+"""
+import argparse
+import os
+import statistics
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_openai_server import fake_extract, serve_in_thread
+from synthetic import noisy_payslip_text, payslip_fields, payslip_text
+
+FIELDS = ("employee_name", "employee_code", "pan", "month", "pay_date", "gross_salary", "basic", "hra",
+          "special_allowance", "tds", "pf_employee", "net_pay")
+
+
+def _expected_strings(f: dict):
+    """Ground-truth values as they are written in the payslip text."""
+    yield f["employee_name"]
+    yield f["employee_code"]
+    yield f["pan"]
+    yield f["month_label"]
+    yield f"{f['pay_date'][8:10]}/{f['pay_date'][5:7]}/{f['pay_date'][:4]}"
+    for name in ("basic", "hra", "special_allowance", "gross_salary", "pf_employee", "tds", "net_pay"):
+        yield f"{f[name]:,.2f}"
+
+
+def _stub_truth(f: dict) -> dict:
+    """What fake_extract should return for a payslip."""
+    return {"employee_name": f["employee_name"], "employee_code": f["employee_code"], "pan": f["pan"],
+            "gross_salary": f"{f['gross_salary']:,.2f}", "tds": f"{f['tds']:,.2f}",
+            "net_pay": f"{f['net_pay']:,.2f}", "components": {}}
+
+
+def _same(a, b) -> bool:
+    from app.services.normalize import parse_amount
+    if a == b:
+        return True
+    x, y = parse_amount(a), parse_amount(b)
+    return x is not None and x == y
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=500)
+    ap.add_argument("--pages", type=int, default=3, help="pages of the noisy fixtures")
+    ap.add_argument("--llm", action="store_true", help="also compare extractions by the configured model")
+    ap.add_argument("--stub", action="store_true", help="with --llm, answer from the local stub server")
+    args = ap.parse_args()
+
+    server = None
+    if args.llm and args.stub:
+        server = serve_in_thread(latency=0.0)
+        os.environ["OPENAI_BASE_URL"] = "http://%s:%d/v1" % server.server_address
+
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    from app.config import settings
+    from app.extractors.llm_dispatcher import estimate_tokens
+    from app.extractors.prompt_compressor import compress, output_tokens
+
+    fixtures = [
+        (payslip_fields(i), payslip_text(i) if i % 2 else noisy_payslip_text(i, pages=args.pages))
+        for i in range(args.docs)
+    ]
+    before, after, budgets, failures = [], [], [], []
+    stub_ok = {"raw": 0, "compressed": 0}
+    for i, (fields, text) in enumerate(fixtures):
+        compressed = compress(text)
+        before.append(estimate_tokens(text))
+        after.append(estimate_tokens(compressed))
+        budgets.append(output_tokens(compressed))
+        missing = [v for v in _expected_strings(fields) if v not in compressed]
+        if missing:
+            failures.append((i, f"values missing from compressed text: {missing}"))
+        truth = _stub_truth(fields)
+        stub_ok["raw"] += fake_extract(text) == truth
+        got = fake_extract(compressed)
+        if got != truth:
+            failures.append((i, f"stub extraction of compressed text: {got} != {truth}"))
+        else:
+            stub_ok["compressed"] += 1
+
+    print(f"documents:            {len(fixtures)}")
+    print(f"text tokens/doc:      {statistics.mean(before):8.1f} -> {statistics.mean(after):8.1f} "
+          f"({1 - sum(after) / sum(before):.0%} fewer)")
+    print(f"  p95:                {sorted(before)[int(len(before) * 0.95)]:8d} -> {sorted(after)[int(len(after) * 0.95)]:8d}")
+    print(f"max_tokens/doc:       {settings.LLM_MAX_OUTPUT_TOKENS:8d} -> {statistics.mean(budgets):8.1f}")
+    print(f"stub extraction correct: {stub_ok['raw']} raw, {stub_ok['compressed']} compressed")
+
+    if args.llm:
+        from app.extractors import llm_parser
+        gained = 0
+        for i, (_, text) in enumerate(fixtures):
+            settings.PROMPT_COMPRESSION = False
+            raw = llm_parser._parse_json_output(llm_parser._call_openai_chat(text))
+            settings.PROMPT_COMPRESSION = True
+            compressed = llm_parser.parse_with_llm(text, use_cache=False)
+            # a field only the compressed prompt yields is not a regression
+            diff = [f for f in FIELDS if raw.get(f) is not None and not _same(raw.get(f), compressed.get(f))]
+            gained += sum(1 for f in FIELDS if raw.get(f) is None and compressed.get(f) is not None)
+            if diff:
+                failures.append((i, f"LLM extraction differs in {diff}"))
+        print(f"LLM fields gained:    {gained}")
+        print(f"LLM usage:            {llm_parser.usage_stats()}")
+    if server is not None:
+        server.shutdown()
+
+    for i, reason in failures[:20]:
+        print(f"doc {i}: {reason}")
+    print("extraction unchanged" if not failures else f"{len(failures)} mismatch(es)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
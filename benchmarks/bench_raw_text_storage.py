@@ -0,0 +1,111 @@
+# benchmarks/bench_raw_text_storage.py
+"""
+Database size and payslips_raw lookup speed with the extracted text inline
+(the old layout) versus in compressed, deduplicated raw_text_blobs.
+
+    python benchmarks/bench_raw_text_storage.py --rows 20000 --pages 3 --dup 0.1
+
+Both layouts are built in temporary SQLite files. --pages repeats the
+payslip text to approximate multi-page OCR output; --dup is the fraction of
+files whose text duplicates an earlier one (re-uploads).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic import payslip_text
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--pages", type=int, default=3)
+    ap.add_argument("--dup", type=float, default=0.1)
+    ap.add_argument("--lookups", type=int, default=2000)
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp.name}/unused.db"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    from sqlalchemy import bindparam, create_engine, insert, select, text
+    from sqlalchemy.orm import Session, undefer
+    from app.db import Base
+    from app.models import PayslipRaw
+    from app.services.bulk_writer import BulkWriter, PayslipRow
+
+    rnd = random.Random(0)
+    texts = []
+    for i in range(args.rows):
+        if texts and rnd.random() < args.dup:
+            texts.append(rnd.choice(texts))
+        else:
+            texts.append("\n\n".join(payslip_text(i, seed=p) for p in range(args.pages)))
+    filenames = [f"bench_{i:07d}.pdf" for i in range(args.rows)]
+    probes = [rnd.choice(filenames) for _ in range(args.lookups)]
+    print(f"{args.rows} payslips, {sum(map(len, texts)) / args.rows / 1024:.1f} KiB text each, "
+          f"{len(set(texts))} distinct")
+
+    def build(name, write):
+        path = os.path.join(tmp.name, f"{name}.db")
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        start = time.perf_counter()
+        write(engine)
+        elapsed = time.perf_counter() - start
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+        return engine, os.path.getsize(path), elapsed
+
+    def inline(engine):
+        with engine.begin() as conn:
+            conn.execute(insert(PayslipRaw.__table__),
+                         [{"filename": f, "raw_text": t, "parsed": True} for f, t in zip(filenames, texts)])
+
+    def blobs(engine):
+        BulkWriter(batch_size=500, bind=engine).write([PayslipRow(f, t) for f, t in zip(filenames, texts)])
+
+    def timed(fn, repeat=3):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    for name, write, load_text in (("inline", inline, True), ("blobs", blobs, False)):
+        engine, size, write_s = build(name, write)
+
+        def scan():
+            # what the pipeline / dashboard read: metadata only
+            with engine.connect() as conn:
+                conn.execute(select(PayslipRaw.__table__)).all()
+
+        def orm_scan():
+            with Session(engine) as session:
+                q = session.query(PayslipRaw)
+                # the old mapping had no deferred column, so every row carried its text
+                q.options(undefer(PayslipRaw.raw_text)).all() if load_text else q.all()
+
+        def lookups():
+            with engine.connect() as conn:
+                stmt = select(PayslipRaw.__table__).where(PayslipRaw.filename == bindparam("f"))
+                for f in probes:
+                    conn.execute(stmt, {"f": f}).first()
+
+        print(f"{name:>7}: db {size / 2**20:7.1f} MiB  write {write_s:6.2f}s  "
+              f"scan {timed(scan) * 1000:7.1f} ms  orm scan {timed(orm_scan) * 1000:7.1f} ms  "
+              f"{args.lookups} lookups {timed(lookups) * 1000:7.1f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/stub_openai_server.py
+"""
+Minimal OpenAI-compatible chat completions server for benchmarks.
+
+Answers /v1/chat/completions with a deterministic extraction of the payslip
+text found in the prompt (single or "### Payslip <i>" batch prompts), after
+a configurable delay. With --rpm-limit it behaves like a rate-limited API:
+requests over the limit in a sliding 60s window get 429 with Retry-After.
+--error-rate makes that fraction of requests fail with a 500 (after the
+delay). Point the app at it with OPENAI_BASE_URL.
+
+    python benchmarks/stub_openai_server.py --port 8808 --latency 0.8 --rpm-limit 120 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_DOC = re.compile(r"```(.*?)```", re.S)
+_BATCH_DOC = re.compile(r"### Payslip (\d+)\s*```(.*?)```", re.S)
+_FIELDS = {
+    "employee_name": re.compile(r"Employee Name:\s*(.+?)\s+Employee Code"),
+    "employee_code": re.compile(r"Employee Code:\s*(\S+)"),
+    "pan": re.compile(r"PAN:\s*(\S+)"),
+    "gross_salary": re.compile(r"Gross Earnings\s+([\d,.]+)"),
+    "tds": re.compile(r"Income Tax\s+([\d,.]+)"),
+    "net_pay": re.compile(r"Net Pay:\s*(?:Rs\.)?\s*([\d,.]+)"),
+}
+
+
+def fake_extract(text: str) -> dict:
+    out = {}
+    for name, pattern in _FIELDS.items():
+        m = pattern.search(text)
+        out[name] = m.group(1) if m else None
+    out["components"] = {}
+    return out
+
+
+class StubConfig:
+    latency = 0.5            # seconds per request
+    latency_per_1k = 0.05    # extra seconds per 1k prompt tokens
+    requests = 0
+    rpm_limit = 0            # 0 = unlimited
+    throttled = 0
+    error_rate = 0.0         # fraction of requests answered with a 500
+    errors = 0
+
+
+class _Window:
+    """Timestamps of accepted requests in the last 60 seconds."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.times = deque()
+
+    def admit(self, limit: int):
+        """Returns None if the request is accepted, else seconds until a slot frees up."""
+        with self.lock:
+            now = time.monotonic()
+            while self.times and now - self.times[0] >= 60:
+                self.times.popleft()
+            if len(self.times) >= limit:
+                return 60 - (now - self.times[0])
+            self.times.append(now)
+            return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    config = StubConfig
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        prompt_tokens = len(prompt) // 4 + 1
+        self.config.requests += 1
+        if self.config.rpm_limit:
+            wait = self.config.window.admit(self.config.rpm_limit)
+            if wait is not None:
+                self.config.throttled += 1
+                self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                           {"Retry-After": "%.2f" % wait})
+                return
+        time.sleep(self.config.latency + self.config.latency_per_1k * prompt_tokens / 1000)
+        if self.config.error_rate and random.random() < self.config.error_rate:
+            self.config.errors += 1
+            self._send(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return
+
+        batch = _BATCH_DOC.findall(prompt)
+        if batch:
+            content = json.dumps([dict(fake_extract(t), index=int(i)) for i, t in batch])
+        else:
+            m = _DOC.search(prompt)
+            content = json.dumps(fake_extract(m.group(1) if m else prompt))
+        self._send(200, {
+            "id": f"chatcmpl-stub-{self.config.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4 + 1,
+                "total_tokens": prompt_tokens + len(content) // 4 + 1,
+            },
+        })
+
+
+def serve_in_thread(host: str = "127.0.0.1", port: int = 0, **config) -> ThreadingHTTPServer:
+    """Start the stub on a background thread; returns the server (see server.server_address)."""
+    cfg = type("Config", (StubConfig,), dict(config, window=_Window()))
+    server = ThreadingHTTPServer((host, port), type("StubHandler", (Handler,), {"config": cfg}))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8808)
+    ap.add_argument("--latency", type=float, default=StubConfig.latency)
+    ap.add_argument("--latency-per-1k", type=float, default=StubConfig.latency_per_1k)
+    ap.add_argument("--rpm-limit", type=int, default=0, help="429 above this many requests/minute")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 500")
+    args = ap.parse_args()
+    cfg = type("Config", (StubConfig,), {
+        "latency": args.latency, "latency_per_1k": args.latency_per_1k,
+        "rpm_limit": args.rpm_limit, "error_rate": args.error_rate, "window": _Window(),
+    })
+    server = ThreadingHTTPServer((args.host, args.port), type("StubHandler", (Handler,), {"config": cfg}))
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/synthetic.py
+"""Deterministic synthetic payslip text used by the benchmarks."""
+import random
+from pathlib import Path
+
+FIRST_NAMES = ["Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Meera", "Kabir", "Isha", "Arjun", "Diya"]
+LAST_NAMES = ["Sharma", "Iyer", "Reddy", "Nair", "Gupta", "Menon", "Patel", "Rao", "Das", "Khan"]
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+
+FOOTER = (
+    "This is a computer generated payslip and does not require a signature.\n"
+    "Please contact payroll@example.com for any discrepancies within 7 days."
+)
+
+
+def payslip_fields(i: int, seed: int = 0) -> dict:
+    rng = random.Random(seed * 1_000_003 + i)
+    basic = rng.randrange(20_000, 150_000, 500)
+    hra = round(basic * 0.4, 2)
+    special = rng.randrange(5_000, 40_000, 250)
+    gross = basic + hra + special
+    pf = round(basic * 0.12, 2)
+    tds = round(gross * rng.choice([0.0, 0.05, 0.1, 0.2]), 2)
+    month_idx = i % 12
+    year = 2020 + (i // 12) % 5
+    return {
+        "employee_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "employee_code": f"EMP{i:06d}",
+        "pan": "ABCDE%04dF" % (i % 10_000),
+        "pay_date": f"{year}-{month_idx + 1:02d}-28",
+        "month": f"{year}-{month_idx + 1:02d}",
+        "month_label": f"{MONTHS[month_idx]} {year}",
+        "gross_salary": gross,
+        "basic": basic,
+        "hra": hra,
+        "special_allowance": special,
+        "tds": tds,
+        "pf_employee": pf,
+        "pf_employer": pf,
+        "net_pay": round(gross - pf - tds - 200, 2),
+        "components": {"Professional Tax": 200.0},
+    }
+
+
+def payslip_text(i: int, seed: int = 0) -> str:
+    f = payslip_fields(i, seed)
+    return (
+        "EXAMPLE PAYROLL SERVICES PVT. LTD\n"
+        f"Payslip for the month of {f['month_label']}\n"
+        f"Employee Name: {f['employee_name']} Employee Code: {f['employee_code']}\n"
+        f"PAN: {f['pan']}\n"
+        f"Pay Date: {f['pay_date'][8:10]}/{f['pay_date'][5:7]}/{f['pay_date'][:4]}\n"
+        "Earnings Amount Deductions Amount\n"
+        f"Basic {f['basic']:,.2f}\n"
+        f"HRA {f['hra']:,.2f}\n"
+        f"Special Allowance {f['special_allowance']:,.2f}\n"
+        f"Gross Earnings {f['gross_salary']:,.2f}\n"
+        f"Provident Fund {f['pf_employee']:,.2f}\n"
+        f"Income Tax {f['tds']:,.2f}\n"
+        "Professional Tax 200.00\n"
+        f"Net Pay: Rs. {f['net_pay']:,.2f}\n\n"
+        f"{FOOTER}\n"
+    )
+
+
+def noisy_payslip_text(i: int, seed: int = 0, pages: int = 3) -> str:
+    """
+    payslip_text as a multi-page PDF often extracts: the letterhead and a page
+    footer on every page, table layout spacing and rules, and annexure pages.
+    """
+    rng = random.Random(seed * 7_919 + i)
+    header = (
+        "EXAMPLE PAYROLL SERVICES PVT. LTD\n"
+        "Regd. Office: 4th Floor, Tower B, Example Tech Park, Bengaluru 560103\n"
+        "CIN: U74999KA2015PTC080000    www.example.com\n"
+        "STRICTLY PRIVATE AND CONFIDENTIAL\n"
+    )
+    body = payslip_text(i, seed).replace(" Employee Code:", "        Employee Code:")
+    body = "\n".join(
+        (line.replace(" ", "   ", 1) if line[:1].isalpha() and line[-1:].isdigit() else line)
+        + ("\n" + "-" * 72 if line.startswith(("Earnings", "Net Pay")) else "")
+        for line in body.splitlines()
+    )
+    annex = (
+        "Annexure: leave balance, reimbursements and tax declarations.\n"
+        "Leave is credited on the first working day of each quarter.\n"
+        "Declarations not supported by proofs are disregarded for the tax computation.\n"
+        "|      |      |      |\n"
+    )
+    out = []
+    for n in range(1, pages + 1):
+        content = body if n == 1 else annex * rng.randint(3, 8)
+        out.append(f"{header}{content}\nPage {n} of {pages}\n")
+    return "\n\n".join(out)
+
+
+def write_payslip_pdf(path, i: int, seed: int = 0, pages: int = 1, image_only: bool = False, dpi: int = 100):
+    """
+    Write a synthetic payslip PDF. The first page holds the payslip; extra
+    pages are annexes. With image_only the pages are rasterized and embedded
+    as images, like a scanned document with no text layer.
+    """
+    import pymupdf
+
+    text = payslip_text(i, seed)
+    annex = "Annexure: leave balance, reimbursements and tax declarations.\n" * 12
+    doc = pymupdf.open()
+    for n in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(pymupdf.Rect(50, 50, 560, 800), text if n == 0 else annex, fontsize=10)
+    if image_only:
+        scanned = pymupdf.open()
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+            out = scanned.new_page(width=page.rect.width, height=page.rect.height)
+            out.insert_image(out.rect, pixmap=pix)
+        doc.close()
+        doc = scanned
+    doc.save(str(path), deflate=True)
+    doc.close()
+
+
+def write_corpus(directory, n: int, image_fraction: float = 0.0, pages: int = 1, seed: int = 0, dpi: int = 100):
+    """
+    Write n payslip PDFs to `directory`; a deterministic `image_fraction` of
+    them are image-only scans. Returns the paths.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rnd = random.Random(seed)
+    paths = []
+    for i in range(n):
+        image_only = rnd.random() < image_fraction
+        path = directory / f"payslip_{i:06d}{'_scan' if image_only else ''}.pdf"
+        write_payslip_pdf(path, i, seed=seed, pages=pages, image_only=image_only, dpi=dpi)
+        paths.append(path)
+    return paths
@@ -0,0 +1,144 @@
+"""baseline tables, and payslip_components backfilled from payslip_records.components_json
+
+This is the root revision. Databases created by init_db() before migrations
+existed already have payslips_raw and payslip_records (and may have an empty
+payslip_components), so every table is only created when missing and the
+backfill skips records that have components. On an empty database the
+baseline tables are created as they were before any later revision.
+
+The backfill is frozen here (table definitions and parsing rules as of this
+revision) so later changes to the application code don't change what this
+migration does.
+
+Revision ID: 0001_payslip_components
+Revises:
+Create Date: 2026-10-17
+"""
+import json
+import math
+import re
+from decimal import Decimal, InvalidOperation
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_payslip_components"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+CHUNK = 1000
+
+records = sa.table(
+    "payslip_records",
+    sa.column("id", sa.Integer), sa.column("components_json", sa.Text),
+)
+components = sa.table(
+    "payslip_components",
+    sa.column("id", sa.Integer), sa.column("record_id", sa.Integer),
+    sa.column("name", sa.String), sa.column("amount", sa.Numeric),
+)
+
+_SPACES = re.compile(r"\s+")
+_AMOUNT_NOISE = re.compile(r"₹|rs\.?|inr|/-|[,\s]", re.IGNORECASE)
+_AMOUNT = re.compile(r"^(?P<open>\()?(?P<sign>[+-])?(?P<digits>\d+(?:\.\d*)?|\.\d+)(?P<close>\))?(?P<trail>-)?$")
+
+
+def _name(name) -> str:
+    words = _SPACES.sub(" ", str(name)).strip(" :-.").split(" ")
+    return " ".join(w if w.isupper() else w.capitalize() for w in words if w)[:100]
+
+
+def _amount(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else Decimal(str(value))
+    m = _AMOUNT.match(_AMOUNT_NOISE.sub("", str(value)))
+    if m is None or bool(m.group("open")) != bool(m.group("close")):
+        return None
+    negative = bool(m.group("open")) or m.group("sign") == "-" or bool(m.group("trail"))
+    try:
+        return Decimal(("-" if negative else "") + m.group("digits"))
+    except InvalidOperation:
+        return None
+
+
+def _component_rows(record_id, raw):
+    try:
+        raw = json.loads(raw)
+    except ValueError:
+        return []
+    amounts = {}
+    if isinstance(raw, dict):
+        for name, value in raw.items():
+            amount, key = _amount(value), _name(name)
+            if amount is not None and key:
+                amounts[key] = amounts.get(key, Decimal(0)) + amount
+    return [{"record_id": record_id, "name": k, "amount": v} for k, v in amounts.items()]
+
+
+def _create_baseline(inspector):
+    if not inspector.has_table("payslips_raw"):
+        op.create_table(
+            "payslips_raw",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("filename", sa.String(255), nullable=False, unique=True),
+            sa.Column("upload_date", sa.DateTime(), nullable=True),
+            sa.Column("raw_text", sa.Text(), nullable=True),
+            sa.Column("parsed", sa.Boolean(), nullable=True),
+            sa.Column("parse_errors", sa.Text(), nullable=True),
+        )
+    if not inspector.has_table("payslip_records"):
+        op.create_table(
+            "payslip_records",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("payslip_raw_id", sa.Integer(), sa.ForeignKey("payslips_raw.id"), nullable=True),
+            sa.Column("employee_name", sa.String(200), nullable=True),
+            sa.Column("employee_code", sa.String(100), nullable=True),
+            sa.Column("pan", sa.String(20), nullable=True),
+            sa.Column("month", sa.String(50), nullable=True),
+            sa.Column("pay_date", sa.String(50), nullable=True),
+            *(sa.Column(name, sa.Numeric(12, 2), nullable=True) for name in (
+                "gross_salary", "basic", "hra", "special_allowance",
+                "tds", "pf_employee", "pf_employer", "net_pay",
+            )),
+            sa.Column("components_json", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    _create_baseline(inspector)
+    if not inspector.has_table("payslip_components"):
+        op.create_table(
+            "payslip_components",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("record_id", sa.Integer(),
+                      sa.ForeignKey("payslip_records.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("amount", sa.Numeric(12, 2), nullable=False),
+        )
+        op.create_index("ix_payslip_components_record_id", "payslip_components", ["record_id"])
+        op.create_index("ix_payslip_components_name_record", "payslip_components", ["name", "record_id"])
+
+    # Records that have components_json but no component rows yet
+    has_rows = sa.select(components.c.id).where(components.c.record_id == records.c.id).exists()
+    pending = bind.execute(
+        sa.select(records.c.id, records.c.components_json)
+        .where(records.c.components_json.isnot(None), ~has_rows)
+    ).all()
+    for i in range(0, len(pending), CHUNK):
+        rows = [r for record_id, raw in pending[i:i + CHUNK] for r in _component_rows(record_id, raw)]
+        if rows:
+            bind.execute(sa.insert(components), rows)
+
+
+def downgrade():
+    # The baseline tables stay: they predate migrations and hold the data
+    op.drop_index("ix_payslip_components_name_record", table_name="payslip_components")
+    op.drop_index("ix_payslip_components_record_id", table_name="payslip_components")
+    op.drop_table("payslip_components")
@@ -0,0 +1,147 @@
+"""typed pay_month / paid_on columns and indexes on payslip_records
+
+Adds Date columns parsed from the free-form month / pay_date strings, indexes
+on pay_month, (employee_code, pay_month), payslip_raw_id and pan, and
+backfills the dates of existing rows. The date parsing rules are frozen
+here as they were in app/services/normalize.py at this revision; each
+distinct string is parsed once (date columns repeat a few values).
+
+Revision ID: 0002_record_dates_and_indexes
+Revises: 0001_payslip_components
+Create Date: 2026-10-17
+"""
+import re
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_record_dates_and_indexes"
+down_revision = "0001_payslip_components"
+branch_labels = None
+depends_on = None
+
+CHUNK = 10000
+
+INDEXES = {
+    "ix_payslip_records_pay_month": ["pay_month"],
+    "ix_payslip_records_employee_month": ["employee_code", "pay_month"],
+    "ix_payslip_records_payslip_raw_id": ["payslip_raw_id"],
+    "ix_payslip_records_pan": ["pan"],
+}
+
+_MONTH_NAMES = ("january", "february", "march", "april", "may", "june", "july", "august",
+                "september", "october", "november", "december")
+_MONTHS = {**{n: i for i, n in enumerate(_MONTH_NAMES, 1)}, **{n[:3]: i for i, n in enumerate(_MONTH_NAMES, 1)},
+           "sept": 9}
+
+_ORDINAL = r"(?:st|nd|rd|th)?"
+_YMD = re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:[t ]\d.*)?")
+_DMY = re.compile(r"(\d{1,2})[-/.](\d{1,2})[-/.](\d{4}|\d{2})")
+_D_MON_Y = re.compile(rf"(\d{{1,2}}){_ORDINAL}[ -]([a-z]+)\.?,?[ -](\d{{4}}|\d{{2}})")
+_MON_D_Y = re.compile(rf"([a-z]+)\.? (\d{{1,2}}){_ORDINAL},? (\d{{4}})")
+_YM = re.compile(r"(\d{4})[-/](\d{1,2})")
+_MON_Y = re.compile(r"([a-z]+)\.?[ ,'-]*(\d{4}|\d{2})")
+_M_Y = re.compile(r"(\d{1,2})[-/](\d{4})")
+
+
+def _date(y, m, d):
+    try:
+        year = int(y)
+        if len(y) == 2:
+            year += 2000 if year < 69 else 1900
+        return date(year, int(m), int(d))
+    except (TypeError, ValueError):
+        return None
+
+
+def _full_date(text):
+    m = _YMD.fullmatch(text)
+    if m:
+        return _date(m.group(1), m.group(2), m.group(3))
+    m = _DMY.fullmatch(text)
+    if m:
+        return _date(m.group(3), m.group(2), m.group(1))
+    m = _D_MON_Y.fullmatch(text)
+    if m:
+        return _date(m.group(3), _MONTHS.get(m.group(2)), m.group(1))
+    m = _MON_D_Y.fullmatch(text)
+    if m:
+        return _date(m.group(3), _MONTHS.get(m.group(1)), m.group(2))
+    return None
+
+
+def _paid_on(value):
+    return _full_date(" ".join(value.split()).lower()) if value else None
+
+
+def _month(value):
+    if not value:
+        return None
+    text = " ".join(value.split()).lower()
+    m = _YM.fullmatch(text)
+    if m:
+        return _date(m.group(1), m.group(2), 1)
+    m = _MON_Y.fullmatch(text)
+    if m:
+        return _date(m.group(2), _MONTHS.get(m.group(1)), 1)
+    m = _M_Y.fullmatch(text)
+    if m:
+        return _date(m.group(2), m.group(1), 1)
+    full = _full_date(text)
+    return full.replace(day=1) if full else None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {c["name"] for c in inspector.get_columns("payslip_records")}
+    with op.batch_alter_table("payslip_records") as batch:
+        if "pay_month" not in columns:
+            batch.add_column(sa.Column("pay_month", sa.Date(), nullable=True))
+        if "paid_on" not in columns:
+            batch.add_column(sa.Column("paid_on", sa.Date(), nullable=True))
+    existing = {ix["name"] for ix in inspector.get_indexes("payslip_records")}
+    for name, cols in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, "payslip_records", cols)
+
+    records = sa.table(
+        "payslip_records",
+        sa.column("id", sa.Integer), sa.column("month", sa.String), sa.column("pay_date", sa.String),
+        sa.column("pay_month", sa.Date), sa.column("paid_on", sa.Date),
+    )
+    rows = bind.execute(
+        sa.select(records.c.id, records.c.month, records.c.pay_date)
+        .where(records.c.pay_month.is_(None))
+        .where(sa.or_(records.c.month.isnot(None), records.c.pay_date.isnot(None)))
+    ).all()
+    stmt = (
+        sa.update(records).where(records.c.id == sa.bindparam("b_id"))
+        .values(pay_month=sa.bindparam("b_pay_month"), paid_on=sa.bindparam("b_paid_on"))
+    )
+    paid_cache, month_cache = {}, {}
+    for i in range(0, len(rows), CHUNK):
+        params = []
+        for record_id, month, pay_date in rows[i:i + CHUNK]:
+            if pay_date not in paid_cache:
+                paid_cache[pay_date] = _paid_on(pay_date)
+            paid = paid_cache[pay_date]
+            if paid is not None:
+                first = paid.replace(day=1)
+            else:
+                if month not in month_cache:
+                    month_cache[month] = _month(month)
+                first = month_cache[month]
+            if first is not None:
+                params.append({"b_id": record_id, "b_pay_month": first, "b_paid_on": paid})
+        if params:
+            bind.execute(stmt, params)
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name="payslip_records")
+    with op.batch_alter_table("payslip_records") as batch:
+        batch.drop_column("paid_on")
+        batch.drop_column("pay_month")
@@ -0,0 +1,118 @@
+"""move payslips_raw.raw_text into compressed, deduplicated raw_text_blobs
+
+Hashing and compression are frozen here as in app/services/raw_text.py at
+this revision (sha256 of the UTF-8 text; zstd when the zstandard package is
+installed, otherwise zlib, with the codec stored per blob).
+
+Revision ID: 0003_raw_text_blobs
+Revises: 0002_record_dates_and_indexes
+Create Date: 2026-10-17
+"""
+import hashlib
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+revision = "0003_raw_text_blobs"
+down_revision = "0002_record_dates_and_indexes"
+branch_labels = None
+depends_on = None
+
+CHUNK = 500
+
+blobs = sa.table(
+    "raw_text_blobs",
+    sa.column("hash", sa.String), sa.column("codec", sa.String),
+    sa.column("size", sa.Integer), sa.column("data", sa.LargeBinary),
+)
+raws = sa.table(
+    "payslips_raw",
+    sa.column("id", sa.Integer), sa.column("raw_text", sa.Text), sa.column("text_hash", sa.String),
+)
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress(text):
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=9).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def decompress(codec, data):
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise RuntimeError(f"Cannot decompress raw text stored with codec {codec!r}")
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("raw_text_blobs"):
+        op.create_table(
+            "raw_text_blobs",
+            sa.Column("hash", sa.String(64), primary_key=True),
+            sa.Column("codec", sa.String(8), nullable=False),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("data", sa.LargeBinary(), nullable=False),
+        )
+    if "text_hash" not in {c["name"] for c in inspector.get_columns("payslips_raw")}:
+        with op.batch_alter_table("payslips_raw") as batch:
+            batch.add_column(sa.Column("text_hash", sa.String(64), nullable=True))
+            batch.create_index("ix_payslips_raw_text_hash", ["text_hash"])
+            batch.create_foreign_key("fk_payslips_raw_text_hash", "raw_text_blobs", ["text_hash"], ["hash"])
+
+    # Move the text over in chunks of CHUNK rows to bound memory; it all runs in the migration's transaction
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(raws.c.id, raws.c.raw_text)
+            .where(raws.c.id > last_id, raws.c.raw_text.isnot(None), raws.c.text_hash.is_(None))
+            .order_by(raws.c.id).limit(CHUNK)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        by_hash = {text_hash(t): t for _, t in rows}
+        known = set(bind.execute(sa.select(blobs.c.hash).where(blobs.c.hash.in_(list(by_hash)))).scalars())
+        new = []
+        for h, t in by_hash.items():
+            if h not in known:
+                codec, data = compress(t)
+                new.append({"hash": h, "codec": codec, "size": len(t), "data": data})
+        if new:
+            bind.execute(sa.insert(blobs), new)
+        bind.execute(
+            sa.update(raws).where(raws.c.id == sa.bindparam("b_id"))
+            .values(text_hash=sa.bindparam("b_hash"), raw_text=None),
+            [{"b_id": raw_id, "b_hash": text_hash(t)} for raw_id, t in rows],
+        )
+
+
+def downgrade():
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(raws.c.id, blobs.c.codec, blobs.c.data)
+        .select_from(raws.join(blobs, blobs.c.hash == raws.c.text_hash))
+    ).all()
+    for i in range(0, len(rows), CHUNK):
+        bind.execute(
+            sa.update(raws).where(raws.c.id == sa.bindparam("b_id")).values(raw_text=sa.bindparam("b_text")),
+            [{"b_id": raw_id, "b_text": decompress(codec, data)} for raw_id, codec, data in rows[i:i + CHUNK]],
+        )
+    with op.batch_alter_table("payslips_raw") as batch:
+        batch.drop_constraint("fk_payslips_raw_text_hash", type_="foreignkey")
+        batch.drop_index("ix_payslips_raw_text_hash")
+        batch.drop_column("text_hash")
+    op.drop_table("raw_text_blobs")
@@ -0,0 +1,39 @@
+"""ingest_manifest: (path, size, mtime, content hash) of every ingested PDF
+
+No backfill: files ingested before the manifest existed are matched by
+filename against payslips_raw (see app/services/manifest.py) and get their
+manifest row the next time they are seen.
+
+Revision ID: 0004_ingest_manifest
+Revises: 0003_raw_text_blobs
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_ingest_manifest"
+down_revision = "0003_raw_text_blobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("ingest_manifest"):
+        return
+    op.create_table(
+        "ingest_manifest",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("path", sa.String(512), nullable=False, unique=True),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("mtime_ns", sa.BigInteger(), nullable=False),
+        sa.Column("content_hash", sa.String(64), nullable=False),
+        sa.Column("payslip_raw_id", sa.Integer(), sa.ForeignKey("payslips_raw.id"), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_ingest_manifest_content_hash", "ingest_manifest", ["content_hash"])
+
+
+def downgrade():
+    op.drop_index("ix_ingest_manifest_content_hash", table_name="ingest_manifest")
+    op.drop_table("ingest_manifest")
@@ -0,0 +1,47 @@
+"""ingest_jobs: durable per-file ingestion state with leases
+
+Files left half-processed by an interrupted run (a payslips_raw row with
+parsed=False) need no backfill: the manifest still reports them as due, so
+the next run queues them like any other file.
+
+Revision ID: 0005_ingest_jobs
+Revises: 0004_ingest_manifest
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_ingest_jobs"
+down_revision = "0004_ingest_manifest"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("ingest_jobs"):
+        return
+    op.create_table(
+        "ingest_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("path", sa.String(512), nullable=False, unique=True),
+        sa.Column("state", sa.String(16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("lease_owner", sa.String(128), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("mtime_ns", sa.BigInteger(), nullable=False),
+        sa.Column("content_hash", sa.String(64), nullable=False),
+        sa.Column("manifest_id", sa.Integer(), sa.ForeignKey("ingest_manifest.id"), nullable=True),
+        sa.Column("text_hash", sa.String(64), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_ingest_jobs_state_lease", "ingest_jobs", ["state", "lease_expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_ingest_jobs_state_lease", table_name="ingest_jobs")
+    op.drop_table("ingest_jobs")
@@ -0,0 +1,118 @@
+"""monthly_summary: per employee / month totals, backfilled from payslip_records
+
+The backfill is frozen here as app.services.monthly_summary.rebuild() did it
+at this revision: records are summed by the database per (employee_code,
+pay_month) in integer paise, component totals come from payslip_components,
+and records without a pay_month (their month did not parse in 0002) are
+left out. An existing table (created by init_db()) is emptied and refilled.
+
+Revision ID: 0006_monthly_summary
+Revises: 0005_ingest_jobs
+Create Date: 2026-10-17
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_monthly_summary"
+down_revision = "0005_ingest_jobs"
+branch_labels = None
+depends_on = None
+
+CHUNK = 5000
+
+AMOUNTS = ("gross_salary", "net_pay", "tds", "pf_employee", "pf_employer")
+
+records = sa.table(
+    "payslip_records",
+    sa.column("id", sa.Integer), sa.column("employee_code", sa.String), sa.column("pay_month", sa.Date),
+    *(sa.column(a, sa.Numeric) for a in AMOUNTS),
+)
+components = sa.table(
+    "payslip_components",
+    sa.column("record_id", sa.Integer), sa.column("name", sa.String), sa.column("amount", sa.Numeric),
+)
+summary = sa.table(
+    "monthly_summary",
+    sa.column("employee_code", sa.String), sa.column("month", sa.String), sa.column("payslips", sa.Integer),
+    *(sa.column(a, sa.Numeric) for a in AMOUNTS + ("savings",)),
+    sa.column("savings_rate_sum", sa.Float), sa.column("savings_rate_n", sa.Integer),
+    sa.column("components_json", sa.Text), sa.column("updated_at", sa.DateTime),
+)
+
+
+def _paise(column):
+    return sa.func.sum(sa.func.round(sa.func.coalesce(column, 0) * 100))
+
+
+def _money(paise) -> Decimal:
+    return Decimal(int(round(float(paise or 0)))) / 100
+
+
+def backfill(bind):
+    employee = sa.func.coalesce(records.c.employee_code, "")
+    gross, net = sa.func.coalesce(records.c.gross_salary, 0), sa.func.coalesce(records.c.net_pay, 0)
+    totals = bind.execute(
+        sa.select(
+            employee, records.c.pay_month, sa.func.count(),
+            *[_paise(records.c[a]) for a in AMOUNTS],
+            sa.func.sum(sa.case((gross > 0, (gross - net) * 1.0 / gross), else_=0), type_=sa.Float),
+            sa.func.sum(sa.case((gross > 0, 1), else_=0)),
+        )
+        .where(records.c.pay_month.isnot(None))
+        .group_by(employee, records.c.pay_month)
+    ).all()
+
+    component_totals = {}
+    for employee_code, pay_month, name, paise in bind.execute(
+        sa.select(employee, records.c.pay_month, components.c.name, _paise(components.c.amount))
+        .select_from(components.join(records, records.c.id == components.c.record_id))
+        .where(records.c.pay_month.isnot(None))
+        .group_by(employee, records.c.pay_month, components.c.name)
+    ):
+        amount = _money(paise)
+        if amount:
+            component_totals.setdefault((employee_code, pay_month), {})[name] = float(amount)
+
+    now = datetime.utcnow()
+    rows = []
+    for employee_code, pay_month, payslips, *sums, rate_sum, rate_n in totals:
+        amounts = dict(zip(AMOUNTS, (_money(s) for s in sums)))
+        comps = component_totals.get((employee_code, pay_month), {})
+        rows.append(dict(
+            amounts, savings=amounts["gross_salary"] - amounts["net_pay"],
+            employee_code=employee_code, month=pay_month.strftime("%Y-%m"), payslips=payslips,
+            savings_rate_sum=float(rate_sum or 0), savings_rate_n=int(rate_n or 0),
+            components_json=json.dumps(dict(sorted(comps.items())), ensure_ascii=False), updated_at=now,
+        ))
+    bind.execute(sa.delete(summary))
+    for i in range(0, len(rows), CHUNK):
+        bind.execute(sa.insert(summary), rows[i:i + CHUNK])
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("monthly_summary"):
+        op.create_table(
+            "monthly_summary",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("employee_code", sa.String(100), nullable=False),
+            sa.Column("month", sa.String(7), nullable=False),
+            sa.Column("payslips", sa.Integer(), nullable=False),
+            *(sa.Column(a, sa.Numeric(14, 2), nullable=False) for a in AMOUNTS + ("savings",)),
+            sa.Column("savings_rate_sum", sa.Float(), nullable=False),
+            sa.Column("savings_rate_n", sa.Integer(), nullable=False),
+            sa.Column("components_json", sa.Text(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("employee_code", "month", name="uq_monthly_summary_employee_month"),
+        )
+        op.create_index("ix_monthly_summary_month", "monthly_summary", ["month"])
+    backfill(bind)
+
+
+def downgrade():
+    op.drop_index("ix_monthly_summary_month", table_name="monthly_summary")
+    op.drop_table("monthly_summary")
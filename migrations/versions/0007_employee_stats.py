@@ -0,0 +1,140 @@
+"""employee_stats: per-employee running statistics, backfilled from monthly_summary
+
+The backfill always runs (monthly_summary is filled by 0006) and is frozen
+here as app.services.employee_stats.recompute() did it at this revision:
+Welford statistics of monthly net pay, the totals of the latest months and
+the analytics of the latest month. The thresholds are read from the same
+ANALYTICS_* environment variables, with the same defaults, as app/config.py.
+
+Revision ID: 0007_employee_stats
+Revises: 0006_monthly_summary
+Create Date: 2026-10-17
+"""
+import json
+import math
+import os
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_employee_stats"
+down_revision = "0006_monthly_summary"
+branch_labels = None
+depends_on = None
+
+CHUNK = 5000
+
+WINDOW = max(13, int(os.getenv("ANALYTICS_WINDOW_MONTHS", 24)))
+MIN_MONTHS = int(os.getenv("ANALYTICS_MIN_MONTHS", 6))
+ANOMALY_Z = float(os.getenv("ANALYTICS_ANOMALY_Z", 3.0))
+TDS_RUN_RATE_MONTHS = int(os.getenv("ANALYTICS_TDS_RUN_RATE_MONTHS", 3))
+MIN_STD_FRACTION = 0.01
+
+summary = sa.table(
+    "monthly_summary",
+    sa.column("employee_code", sa.String), sa.column("month", sa.String),
+    sa.column("gross_salary", sa.Float), sa.column("net_pay", sa.Float), sa.column("tds", sa.Float),
+)
+stats = sa.table(
+    "employee_stats",
+    *(sa.column(c) for c in ("employee_code", "months", "net_pay_mean", "net_pay_m2", "recent_json", "last_month",
+                             "last_net_pay", "net_pay_z", "anomaly", "net_pay_yoy", "fiscal_year",
+                             "tds_fy_to_date", "tds_projected", "updated_at")),
+)
+
+
+def _shift(month, months):
+    y, m = divmod(int(month[:4]) * 12 + int(month[5:7]) - 1 + months, 12)
+    return f"{y:04d}-{m + 1:02d}"
+
+
+def _row(employee_code, history, now):
+    """employee_stats row of one employee from [(month, (gross, net, tds))] in month order."""
+    n, mean, m2 = 0, 0.0, 0.0
+    for _, (_, x, _) in history:
+        n += 1
+        d = x - mean
+        mean += d / n
+        m2 += d * (x - mean)
+    recent = dict(history[-WINDOW:])
+    last = max(recent)
+    net = recent[last][1]
+
+    # z-score of the latest month against the other months (leave-one-out)
+    z = None
+    if n - 1 >= max(2, MIN_MONTHS):
+        other_mean = (n * mean - net) / (n - 1)
+        other_m2 = max(0.0, m2 - (net - mean) * (net - other_mean))
+        std = max(math.sqrt(other_m2 / (n - 2)), abs(other_mean) * MIN_STD_FRACTION)
+        z = (net - other_mean) / std if std > 0 else None
+    year_ago = recent.get(_shift(last, -12))
+
+    start = int(last[:4]) - (int(last[5:7]) < 4)
+    fy_months = sorted(m for m in recent if f"{start:04d}-04" <= m <= last)
+    to_date = sum(recent[m][2] for m in fy_months)
+    rate_months = fy_months[-max(1, TDS_RUN_RATE_MONTHS):]
+    rate = sum(recent[m][2] for m in rate_months) / len(rate_months)
+    remaining = (start + 1) * 12 + 3 - (int(last[:4]) * 12 + int(last[5:7]))
+    return dict(
+        employee_code=employee_code, months=n, net_pay_mean=mean, net_pay_m2=m2,
+        recent_json=json.dumps({m: list(t) for m, t in sorted(recent.items())}),
+        last_month=last, last_net_pay=round(net, 2), net_pay_z=z, anomaly=z is not None and abs(z) > ANOMALY_Z,
+        net_pay_yoy=(net - year_ago[1]) / year_ago[1] if year_ago and year_ago[1] > 0 else None,
+        fiscal_year=f"{start}-{(start + 1) % 100:02d}", tds_fy_to_date=round(to_date, 2),
+        tds_projected=round(to_date + rate * remaining, 2), updated_at=now,
+    )
+
+
+def backfill(bind):
+    if not sa.inspect(bind).has_table("monthly_summary"):
+        raise RuntimeError("employee_stats is computed from monthly_summary, which does not exist; "
+                           "run the migrations in order (alembic upgrade head)")
+    c = summary.c
+    result = bind.execute(
+        sa.select(c.employee_code, c.month, c.gross_salary, c.net_pay, c.tds)
+        .where(c.employee_code != "").order_by(c.employee_code, c.month)
+    )
+    now = datetime.utcnow()
+    bind.execute(sa.delete(stats))
+    rows, code, history = [], None, []
+    for employee_code, month, gross, net, tds in result.all():
+        if employee_code != code:
+            if history:
+                rows.append(_row(code, history, now))
+            code, history = employee_code, []
+        history.append((month, (float(gross or 0), float(net or 0), float(tds or 0))))
+    if history:
+        rows.append(_row(code, history, now))
+    for i in range(0, len(rows), CHUNK):
+        bind.execute(sa.insert(stats), rows[i:i + CHUNK])
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("employee_stats"):
+        op.create_table(
+            "employee_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("employee_code", sa.String(100), nullable=False, unique=True),
+            sa.Column("months", sa.Integer(), nullable=False),
+            sa.Column("net_pay_mean", sa.Float(), nullable=False),
+            sa.Column("net_pay_m2", sa.Float(), nullable=False),
+            sa.Column("recent_json", sa.Text(), nullable=True),
+            sa.Column("last_month", sa.String(7), nullable=True),
+            sa.Column("last_net_pay", sa.Numeric(14, 2), nullable=True),
+            sa.Column("net_pay_z", sa.Float(), nullable=True),
+            sa.Column("anomaly", sa.Boolean(), nullable=False),
+            sa.Column("net_pay_yoy", sa.Float(), nullable=True),
+            sa.Column("fiscal_year", sa.String(7), nullable=True),
+            sa.Column("tds_fy_to_date", sa.Numeric(14, 2), nullable=True),
+            sa.Column("tds_projected", sa.Numeric(14, 2), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_employee_stats_anomaly", "employee_stats", ["anomaly", "last_month"])
+    backfill(bind)
+
+
+def downgrade():
+    op.drop_index("ix_employee_stats_anomaly", table_name="employee_stats")
+    op.drop_table("employee_stats")
@@ -0,0 +1,27 @@
+# tests/conftest.py
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# app.config reads the environment when it is first imported: point the app at
+# a scratch database and folders before any test module imports it
+_SCRATCH = Path(tempfile.mkdtemp(prefix="payslip_tests_"))
+os.environ["DATABASE_URL"] = f"sqlite:///{_SCRATCH / 'app.db'}"
+os.environ["PDF_FOLDER"] = str(_SCRATCH / "pdfs")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from app.db import Base  # noqa: E402
+import app.models  # noqa: E402,F401
+
+
+@pytest.fixture
+def bind(tmp_path):
+    """An engine on an empty SQLite database with every table created."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
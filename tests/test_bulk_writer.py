@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from sqlalchemy import text, update
+
+from app.services import job_queue
+from app.services.bulk_writer import BulkWriter, PayslipRow, record_values
+from app.services.manifest import NEW, FileState, ManifestEntry
+
+
+def state(bind):
+    with bind.connect() as conn:
+        return conn.execute(text(
+            "SELECT r.parsed, r.parse_errors, (SELECT count(*) FROM payslip_records),"
+            " (SELECT count(*) FROM payslip_components), (SELECT net_pay FROM monthly_summary),"
+            " (SELECT count(*) FROM raw_text_blobs) FROM payslips_raw r"
+        )).one()
+
+
+def record(net_pay):
+    return record_values({"employee_code": "E1", "month": "2024-03", "gross_salary": 50000, "net_pay": net_pay,
+                          "components": {"Basic": 30000}})
+
+
+def test_failed_reparse_keeps_the_old_records(bind):
+    writer = BulkWriter(bind=bind)
+    writer.write([PayslipRow("a.pdf", "v1", record(40000))])
+    assert tuple(state(bind)) == (True, None, 1, 1, 40000, 1)
+
+    (result,) = writer.write([PayslipRow("a.pdf", "v2", None, parse_errors="LLM failed", replace=True)])
+    assert result.error is None
+    # records, components and totals untouched; the unused new text is not kept
+    assert tuple(state(bind)) == (True, "LLM failed", 1, 1, 40000, 1)
+
+    writer.write([PayslipRow("a.pdf", "v3", record(41000), replace=True)])
+    assert tuple(state(bind)) == (True, None, 1, 1, 41000, 1)
+
+
+
+def through_the_queue(bind, writer, raw, **row):
+    """Write a row the way the pipeline does: claimed job, text kept with it, closed by the write."""
+    entry = ManifestEntry("a.pdf", 100, len(raw), f"hash-{raw}")
+    with bind.begin() as conn:
+        job_queue.enqueue(conn, [FileState(Path("a.pdf"), NEW, entry)])
+        conn.execute(update(job_queue.jobs).values(lease_expires_at=None))  # skip a retry delay
+    (job,) = job_queue.claim(bind)
+    job_queue.mark_parsing(bind, job.id, raw)
+    (result,) = writer.write([PayslipRow("a.pdf", raw, job_id=job.id, replace=True, **row)])
+    assert result.error is None
+
+
+def test_failed_reparse_through_the_job_queue_frees_its_text(bind):
+    writer = BulkWriter(bind=bind)
+    through_the_queue(bind, writer, "v1", record=record(40000))
+    assert tuple(state(bind)) == (True, None, 1, 1, 40000, 1)
+
+    through_the_queue(bind, writer, "v2", parse_errors="LLM failed")
+    assert tuple(state(bind)) == (True, "LLM failed", 1, 1, 40000, 1)
+
+    through_the_queue(bind, writer, "v3", record=record(41000))
+    assert tuple(state(bind)) == (True, None, 1, 1, 41000, 1)
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+from sqlalchemy import select
+
+from app.models import EmployeeStats
+from app.services import employee_stats
+from app.services.bulk_writer import BulkWriter, PayslipRow, record_values
+from app.services.employee_stats import _State
+
+COLUMNS = ("employee_code", "months", "net_pay_mean", "net_pay_m2", "recent_json", "last_month", "last_net_pay",
+           "net_pay_z", "anomaly", "net_pay_yoy", "fiscal_year", "tds_fy_to_date", "tds_projected")
+FLOATS = {"net_pay_mean", "net_pay_m2", "net_pay_z", "net_pay_yoy"}
+
+
+def snapshot(bind):
+    table = EmployeeStats.__table__
+    with bind.connect() as conn:
+        rows = conn.execute(select(*[table.c[c] for c in COLUMNS]).order_by(table.c.employee_code)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def assert_same_stats(incremental, rebuilt):
+    assert [r["employee_code"] for r in incremental] == [r["employee_code"] for r in rebuilt]
+    for a, b in zip(incremental, rebuilt):
+        for column in COLUMNS:
+            if column in FLOATS and a[column] is not None and b[column] is not None:
+                assert a[column] == pytest.approx(b[column], rel=1e-9, abs=1e-6), (a["employee_code"], column)
+            else:
+                assert a[column] == b[column], (a["employee_code"], column)
+
+
+def month(k: int) -> str:
+    y, m = divmod(2022 * 12 + k, 12)
+    return f"{y}-{m + 1:02d}"
+
+
+def payslip(rng: random.Random, employee: str, k: int) -> dict:
+    net = rng.randrange(30_000, 32_000) + (40_000 if rng.random() < 0.05 else 0)
+    return record_values({"employee_code": employee, "month": month(k), "gross_salary": net + 9000,
+                          "net_pay": net, "tds": rng.randrange(1000, 3000)})
+
+
+def test_incremental_updates_match_recompute(bind, monkeypatch):
+    # a small window so removals inside it have to refill it from older months
+    monkeypatch.setattr(employee_stats.settings, "ANALYTICS_WINDOW_MONTHS", 13)
+    monkeypatch.setattr(employee_stats.settings, "ANALYTICS_MIN_MONTHS", 3)
+    rng = random.Random(3)
+    writer = BulkWriter(batch_size=9, bind=bind)
+    files = {}
+    rows = []
+    for e in range(5):
+        for k in range(30):
+            name = f"E{e}-{k}.pdf"
+            files[name] = (f"E{e}", k)
+            rows.append(PayslipRow(name, name, payslip(rng, f"E{e}", k)))
+    rng.shuffle(rows)
+    writer.write(rows)
+
+    for _ in range(4):
+        # re-ingest: new amounts, payslips moved to another (often older) month, or dropped for good
+        rows = []
+        for name in rng.sample(sorted(files), 25):
+            employee, k = files[name]
+            if rng.random() < 0.3:
+                k = rng.randrange(0, 30)
+                files[name] = (employee, k)
+            if rng.random() < 0.1:
+                rows.append(PayslipRow(name, name + "x", record_values({"employee_code": None, "month": None}),
+                                       replace=True))
+            else:
+                rows.append(PayslipRow(name, f"{name}{rng.random()}", payslip(rng, employee, k), replace=True))
+        writer.write(rows)
+
+    incremental = snapshot(bind)
+    assert incremental and any(r["anomaly"] for r in incremental)
+    employee_stats.rebuild(bind)
+    assert_same_stats(incremental, snapshot(bind))
+
+
+def test_state_remove_undoes_add():
+    values = [31000.0, 30500.0, 45000.0, 29000.0, 30010.5]
+    state = _State()
+    for k, x in enumerate(values):
+        state.add(month(k), (x + 9000, x, 2000.0), window=24)
+    state.remove(month(2), (54000.0, 45000.0, 2000.0))
+
+    fresh = _State()
+    for k, x in enumerate(values):
+        if k != 2:
+            fresh.add(month(k), (x + 9000, x, 2000.0), window=24)
+    assert state.months == fresh.months == 4
+    assert state.mean == pytest.approx(fresh.mean)
+    assert state.m2 == pytest.approx(fresh.m2)
+    assert state.recent == fresh.recent
+
+
+def test_lookups(bind):
+    writer = BulkWriter(bind=bind)
+    rng = random.Random(1)
+    writer.write([PayslipRow(f"E1-{k}.pdf", str(k), payslip(rng, "E1", k)) for k in range(14)])
+    employee = employee_stats.get("E1", bind=bind)
+    assert employee["months"] == 14 and employee["last_month"] == month(13)
+    assert len(employee["history"]) == 14
+    assert employee["net_pay_yoy"] is not None
+    assert employee_stats.get("nobody", bind=bind) is None
+    assert employee_stats.overview(bind=bind)["employees"] == 1
+
+
+def test_overview_projects_tds_for_the_latest_fiscal_year_only(bind):
+    writer = BulkWriter(bind=bind)
+    rng = random.Random(2)
+    # E1 is paid up to 2023-06 (FY 2023-24); E2 left in 2023-02 (FY 2022-23)
+    writer.write([PayslipRow(f"E1-{k}.pdf", f"E1-{k}", payslip(rng, "E1", k)) for k in range(12, 18)]
+                 + [PayslipRow(f"E2-{k}.pdf", f"E2-{k}", payslip(rng, "E2", k)) for k in range(0, 14)])
+    e1, e2 = employee_stats.get("E1", bind=bind), employee_stats.get("E2", bind=bind)
+    assert (e1["fiscal_year"], e2["fiscal_year"]) == ("2023-24", "2022-23")
+    summary = employee_stats.overview(bind=bind)
+    assert summary["employees"] == 2 and summary["fiscal_year"] == "2023-24"
+    assert summary["tds_projected"] == pytest.approx(e1["tds_projected"])
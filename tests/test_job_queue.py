@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.models import IngestJob
+from app.services import job_queue, raw_text
+from app.services.manifest import NEW, FileState, ManifestEntry
+
+jobs = IngestJob.__table__
+
+
+def queue(bind, *paths):
+    states = [FileState(Path(p), NEW, ManifestEntry(p, 100, 1, f"hash-{p}")) for p in paths]
+    with bind.begin() as conn:
+        return job_queue.enqueue(conn, states)
+
+
+def job(bind, job_id):
+    with bind.connect() as conn:
+        return conn.execute(select(jobs).where(jobs.c.id == job_id)).one()
+
+
+def expire_leases(bind):
+    with bind.begin() as conn:
+        conn.execute(update(jobs).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+
+
+@pytest.fixture
+def other_worker(monkeypatch):
+    """Run the block as another process (a different lease owner)."""
+    def switch(name):
+        monkeypatch.setattr(job_queue, "owner", lambda: name)
+    return switch
+
+
+def test_claim_leases_each_job_once(bind):
+    assert queue(bind, "a.pdf", "b.pdf", "c.pdf") == 3
+    first = job_queue.claim(bind, limit=2)
+    assert [j.path.name for j in first] == ["a.pdf", "b.pdf"]
+    assert all(j.state == job_queue.EXTRACTING and j.attempts == 1 for j in first)
+    assert [j.path.name for j in job_queue.claim(bind, limit=5)] == ["c.pdf"]
+    assert job_queue.claim(bind) == []
+    # queueing the same files again leaves active jobs alone
+    assert queue(bind, "a.pdf") == 0
+
+
+def test_finish_marks_done_and_retries_failures(bind, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "JOB_MAX_ATTEMPTS", 2)
+    queue(bind, "a.pdf", "b.pdf")
+    a, b = job_queue.claim(bind)
+    with bind.begin() as conn:
+        job_queue.finish(conn, [(a.id, None), (b.id, "parse failed")])
+    assert job(bind, a.id).state == job_queue.DONE
+    retried = job(bind, b.id)
+    assert retried.state == job_queue.PENDING and retried.last_error == "parse failed"
+    # not claimed again before the retry delay
+    assert job_queue.claim(bind) == []
+
+    expire_leases(bind)
+    (b,) = job_queue.claim(bind)
+    assert b.attempts == 2
+    with bind.begin() as conn:
+        job_queue.finish(conn, [(b.id, "parse failed again")])
+    assert job(bind, b.id).state == job_queue.FAILED
+    expire_leases(bind)
+    assert job_queue.claim(bind) == []
+
+
+def test_expired_lease_is_reclaimed_and_the_old_owner_loses_it(bind, other_worker):
+    queue(bind, "a.pdf")
+    other_worker("host-1:1")
+    (first,) = job_queue.claim(bind)
+
+    other_worker("host-2:2")
+    assert job_queue.claim(bind) == []
+    expire_leases(bind)
+    (second,) = job_queue.claim(bind)
+    assert second.id == first.id and second.attempts == 2
+    assert job(bind, first.id).lease_owner == "host-2:2"
+
+    # the first worker's write is rolled back with its finish()
+    other_worker("host-1:1")
+    with pytest.raises(job_queue.LeaseLost):
+        with bind.begin() as conn:
+            conn.execute(update(jobs).where(jobs.c.id == first.id).values(last_error="written by host-1"))
+            job_queue.finish(conn, [(first.id, None)])
+    row = job(bind, first.id)
+    assert row.state == job_queue.EXTRACTING and row.last_error is None
+
+    other_worker("host-2:2")
+    with bind.begin() as conn:
+        job_queue.finish(conn, [(second.id, None)])
+    assert job(bind, first.id).state == job_queue.DONE
+
+
+def test_parsing_jobs_resume_with_their_text(bind):
+    queue(bind, "a.pdf")
+    (a,) = job_queue.claim(bind)
+    job_queue.mark_parsing(bind, a.id, "extracted text")
+    expire_leases(bind)
+    (again,) = job_queue.claim(bind)
+    assert again.state == job_queue.PARSING and again.text == "extracted text"
+
+
+def test_release_does_not_count_the_attempt(bind):
+    queue(bind, "a.pdf")
+    (a,) = job_queue.claim(bind)
+    job_queue.release(bind, [a.id])
+    (again,) = job_queue.claim(bind)
+    assert again.attempts == 1
+
+
+def blob_count(bind):
+    with bind.connect() as conn:
+        return conn.execute(select(func.count()).select_from(raw_text.blobs)).scalar()
+
+
+def test_closed_jobs_let_go_of_their_text(bind, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "JOB_MAX_ATTEMPTS", 5)
+    queue(bind, "a.pdf", "b.pdf")
+    a, b = job_queue.claim(bind)
+    job_queue.mark_parsing(bind, a.id, "text of a")
+    job_queue.mark_parsing(bind, b.id, "text of b")
+    assert blob_count(bind) == 2
+    with bind.begin() as conn:
+        job_queue.finish(conn, [(a.id, None), (b.id, "parse failed")])
+    assert job(bind, a.id).text_hash is None and job(bind, b.id).text_hash is None
+    assert blob_count(bind) == 0
+
+    expire_leases(bind)
+    (b,) = job_queue.claim(bind)
+    job_queue.mark_parsing(bind, b.id, "text of b")
+    job_queue.fail(bind, [(b.id, "worker crashed")])
+    assert blob_count(bind) == 0
+
+
+def test_restarting_a_job_prunes_its_old_text(bind):
+    queue(bind, "a.pdf")
+    (a,) = job_queue.claim(bind)
+    job_queue.mark_parsing(bind, a.id, "text of a")
+    # a job closed before texts were dropped on close
+    with bind.begin() as conn:
+        conn.execute(update(jobs).values(state=job_queue.DONE, lease_owner=None))
+    states = [FileState(Path("a.pdf"), NEW, ManifestEntry("a.pdf", 100, 2, "changed"))]
+    with bind.begin() as conn:
+        assert job_queue.enqueue(conn, states) == 1
+    assert job(bind, a.id).text_hash is None
+    assert blob_count(bind) == 0
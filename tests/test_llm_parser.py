@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from app import metrics
+from app.extractors import llm_parser
+from app.extractors.llm_cache import LLMCache
+
+TEXTS = [f"Employee Code E{i}\nNet Pay {30000 + i}" for i in range(3)]
+
+
+def observed(histogram, **labels):
+    state = histogram.values.get(histogram._key(labels))
+    return sum(state[0]) if state else 0
+
+
+@pytest.fixture(autouse=True)
+def batching_on(monkeypatch):
+    monkeypatch.setattr(llm_parser.settings, "LLM_BATCH_SIZE", 8)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "cache.db"), max_entries=100, max_age_days=0)
+    monkeypatch.setattr(llm_parser, "get_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def single_calls(monkeypatch):
+    calls = []
+
+    def chat(text, model=None, max_tokens=None):
+        calls.append(text)
+        return json.dumps({"employee_code": text.split()[2]})
+
+    monkeypatch.setattr(llm_parser, "_call_openai_chat", chat)
+    return calls
+
+
+def test_failed_batch_falls_back_once_per_document(cache, single_calls, monkeypatch):
+    def broken_batch(texts, model=None):
+        raise ValueError("not JSON")
+
+    monkeypatch.setattr(llm_parser, "_call_openai_batch", broken_batch)
+    retries = metrics.LLM_RETRIES.get(reason="batch")
+    raw, misses = observed(metrics.LLM_TEXT_TOKENS, stage="raw"), cache.misses
+
+    results = llm_parser.parse_batch_with_llm(TEXTS)
+
+    assert [r["employee_code"] for r in results] == ["E0", "E1", "E2"]
+    assert len(single_calls) == 3
+    assert metrics.LLM_RETRIES.get(reason="batch") - retries == 3
+    # each document is looked up and compressed once, not again by the fallback
+    assert cache.misses - misses == 3
+    assert observed(metrics.LLM_TEXT_TOKENS, stage="raw") - raw == 3
+
+    # the fallback results were cached
+    assert llm_parser.parse_batch_with_llm(TEXTS) == results
+    assert len(single_calls) == 3
+
+
+def test_missing_batch_elements_are_retried_alone(cache, single_calls, monkeypatch):
+    monkeypatch.setattr(llm_parser, "_call_openai_batch",
+                        lambda texts, model=None: json.dumps([{"index": 1, "employee_code": "E1"}]))
+    results = llm_parser.parse_batch_with_llm(TEXTS)
+    assert [r["employee_code"] for r in results] == ["E0", "E1", "E2"]
+    assert len(single_calls) == 2
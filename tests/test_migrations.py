@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from app.db import Base
+from app.services import employee_stats, monthly_summary
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# The schema init_db() created before the first migration
+baseline = sa.MetaData()
+sa.Table(
+    "payslips_raw", baseline,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("filename", sa.String(255), unique=True, nullable=False),
+    sa.Column("upload_date", sa.DateTime),
+    sa.Column("raw_text", sa.Text),
+    sa.Column("parsed", sa.Boolean),
+    sa.Column("parse_errors", sa.Text),
+)
+sa.Table(
+    "payslip_records", baseline,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("payslip_raw_id", sa.Integer, sa.ForeignKey("payslips_raw.id")),
+    sa.Column("employee_name", sa.String(200)),
+    sa.Column("employee_code", sa.String(100)),
+    sa.Column("pan", sa.String(20)),
+    sa.Column("month", sa.String(50)),
+    sa.Column("pay_date", sa.String(50)),
+    *(sa.Column(c, sa.Numeric(12, 2)) for c in ("gross_salary", "basic", "hra", "special_allowance",
+                                                 "tds", "pf_employee", "pf_employer", "net_pay")),
+    sa.Column("components_json", sa.Text),
+    sa.Column("created_at", sa.DateTime),
+    sa.Column("updated_at", sa.DateTime),
+)
+
+
+def alembic(url: str, *args):
+    env = dict(os.environ, DATABASE_URL=url)
+    proc = subprocess.run([sys.executable, "-m", "alembic", *args], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr[-3000:]
+
+
+def assert_schema_matches_models(engine):
+    inspector = sa.inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert inspector.has_table(table.name), table.name
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        assert {c.name for c in table.columns} <= columns, table.name
+        indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        assert {ix.name for ix in table.indexes} <= indexes, table.name
+
+
+def fill_baseline(engine):
+    raws, records = baseline.tables["payslips_raw"], baseline.tables["payslip_records"]
+    with engine.begin() as conn:
+        for i in range(1, 41):
+            conn.execute(sa.insert(raws).values(id=i, filename=f"f{i}.pdf", raw_text=f"text {i % 5}", parsed=True))
+            month = i % 14 + 1
+            conn.execute(sa.insert(records).values(
+                payslip_raw_id=i, employee_code=f"E{i % 3}",
+                month=f"2024-{month:02d}" if month <= 12 else "unknown",
+                pay_date=f"28/{month:02d}/2024" if i % 2 and month <= 12 else None,
+                gross_salary=50000 + i * 100, net_pay=42000 + i * 50, tds=2000, pf_employee=1800, pf_employer=1800,
+                components_json=json.dumps({"basic salary": f"₹ {30000 + i}", "HRA": 12000, "bad": "n/a"}),
+            ))
+
+
+def table_rows(engine, name, order):
+    with engine.connect() as conn:
+        return conn.execute(sa.text(f"SELECT * FROM {name} ORDER BY {order}")).all()
+
+
+def values(rows):
+    """Rows without their id and updated_at, which differ between two fills."""
+    return [tuple(row)[1:-1] for row in rows]
+
+
+def test_upgrade_head_on_baseline_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    engine = sa.create_engine(url)
+    baseline.create_all(engine)
+    fill_baseline(engine)
+
+    alembic(url, "upgrade", "head")
+    assert_schema_matches_models(engine)
+    with engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT count(*) FROM payslip_components")).scalar() == 80
+        assert conn.execute(sa.text("SELECT count(*) FROM payslip_records WHERE pay_month IS NULL")).scalar() == 5
+        assert conn.execute(sa.text("SELECT count(*) FROM payslips_raw WHERE raw_text IS NOT NULL")).scalar() == 0
+        assert conn.execute(sa.text("SELECT count(*) FROM raw_text_blobs")).scalar() == 5
+
+    # the backfills match what the application computes
+    summary = table_rows(engine, "monthly_summary", "employee_code, month")
+    stats = table_rows(engine, "employee_stats", "employee_code")
+    assert summary and stats
+    monthly_summary.rebuild(engine)
+    employee_stats.rebuild(engine)
+    assert values(table_rows(engine, "monthly_summary", "employee_code, month")) == values(summary)
+    assert values(table_rows(engine, "employee_stats", "employee_code")) == values(stats)
+
+    alembic(url, "downgrade", "base")
+    with engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT count(*) FROM payslips_raw WHERE raw_text IS NOT NULL")).scalar() == 40
+    alembic(url, "upgrade", "head")
+    assert_schema_matches_models(engine)
+    engine.dispose()
+
+
+def test_upgrade_head_on_empty_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'empty.db'}"
+    alembic(url, "upgrade", "head")
+    engine = sa.create_engine(url)
+    assert_schema_matches_models(engine)
+    engine.dispose()
+
+
+def test_upgrade_head_after_init_db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'init_db.db'}"
+    engine = sa.create_engine(url)
+    Base.metadata.create_all(engine)
+    alembic(url, "upgrade", "head")
+    assert_schema_matches_models(engine)
+    engine.dispose()
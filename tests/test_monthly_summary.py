@@ -0,0 +1,68 @@
+import random
+
+from sqlalchemy import select
+
+from app.models import MonthlySummary
+from app.services import monthly_summary
+from app.services.bulk_writer import BulkWriter, PayslipRow, record_values
+
+COLUMNS = ("employee_code", "month", "payslips", "gross_salary", "net_pay", "tds", "pf_employee", "pf_employer",
+           "savings", "savings_rate_sum", "savings_rate_n", "components_json")
+
+
+def payslip(rng: random.Random) -> dict:
+    gross = rng.choice([rng.randrange(20_000, 90_000) + rng.choice([0, 0.5, 0.25]), "₹ 45,000.50", None, 0])
+    return {
+        "employee_code": rng.choice(["E1", "E2", "E3", None]),
+        "month": rng.choice(["2024-01", "Feb 2024", "March 2024", "2023-12", "not a month", None]),
+        "pay_date": rng.choice([None, None, "28/02/2024", "2024-03-31", "garbage"]),
+        "gross_salary": gross,
+        "net_pay": rng.choice([rng.randrange(10_000, 60_000), "Rs. 30,000/-", None]),
+        "tds": rng.choice([None, 1500, "2,000.00"]),
+        "pf_employee": rng.choice([None, 1800.5]),
+        "pf_employer": 1800,
+        "components": rng.choice([{}, {"basic salary": "30,000", "HRA": 12000.25}, {"Bonus": "(500)", "bad": "n/a"}]),
+    }
+
+
+def snapshot(bind):
+    table = MonthlySummary.__table__
+    with bind.connect() as conn:
+        rows = conn.execute(select(*[table.c[c] for c in COLUMNS]).order_by(table.c.employee_code, table.c.month)).all()
+    return [tuple(round(v, 9) if isinstance(v, float) else v for v in row) for row in rows]
+
+
+def test_apply_matches_rebuild(bind):
+    rng = random.Random(7)
+    writer = BulkWriter(batch_size=7, bind=bind)
+    filenames = [f"slip{i}.pdf" for i in range(60)]
+    writer.write([PayslipRow(f, f"text {f}", record_values(payslip(rng))) for f in filenames])
+    for _ in range(3):
+        # re-ingest some files: most parse again (records replaced), some fail (records kept)
+        rows = []
+        for f in rng.sample(filenames, 20):
+            if rng.random() < 0.25:
+                rows.append(PayslipRow(f, f"text {f} {rng.random()}", None, parse_errors="failed", replace=True))
+            else:
+                rows.append(PayslipRow(f, f"text {f} {rng.random()}", record_values(payslip(rng)), replace=True))
+        writer.write(rows)
+
+    incremental = snapshot(bind)
+    assert incremental
+    monthly_summary.rebuild(bind)
+    assert snapshot(bind) == incremental
+
+
+def test_rows_are_removed_when_their_last_payslip_goes(bind):
+    writer = BulkWriter(bind=bind)
+    record = record_values({"employee_code": "E1", "month": "2024-01", "gross_salary": 100, "net_pay": 80})
+    writer.write([PayslipRow("a.pdf", "a", record)])
+    moved = record_values({"employee_code": "E1", "month": "2024-02", "gross_salary": 100, "net_pay": 80})
+    writer.write([PayslipRow("a.pdf", "a2", moved, replace=True)])
+    assert [(r[1], r[2]) for r in snapshot(bind)] == [("2024-02", 1)]
+
+
+def test_month_key():
+    assert monthly_summary.month_key("March 2024", None) == "2024-03"
+    assert monthly_summary.month_key("March 2024", "05/04/2024") == "2024-04"
+    assert monthly_summary.month_key("soon", None) is None
@@ -0,0 +1,90 @@
+import math
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from app.services import normalize
+
+AMOUNTS = [
+    "₹ 1,23,456.50", "Rs. 5,000/-", "Rs 5", "rs. 7", "INR 1200", "(2,500.00)", "-2500", "500-", "+3", ".5", "5.",
+    " 12 ", "12\t", "1 000", "1e5", "1E5", "inf", "-inf", "nan", "NaN", "0x10", "1_000", "(12", "", "abc", None,
+]
+DATES = [
+    "2024-03-31", "31/03/2024", "31-03-24", "31.03.2024", "31 Mar 2024", "31st March, 2024", "March 31, 2024",
+    "2024-03-31T10:00:00", "30/02/2024", "Mar 5th, 2024", "1-Sept-23", "  31   mar 2024 ", "garbage", "", None,
+]
+MONTHS = ["2024-03", "March 2024", "Mar'24", "Mar-24", "03/2024", "Sept 2023", "31/03/2024", "13/2024", "foo", "", None]
+
+
+def same(column_value, scalar_value) -> bool:
+    if scalar_value is None:
+        return column_value is None or pd.isna(column_value)
+    return column_value == scalar_value
+
+
+@pytest.mark.parametrize("value", AMOUNTS)
+def test_parse_amounts_matches_parse_amount(value):
+    (column,) = normalize.parse_amounts([value])
+    assert same(column, normalize.parse_amount(value))
+
+
+def test_parse_amounts_mixed_column():
+    values = [1, 2.5, Decimal("3.25"), 1e20, True, "1e5", "Rs. 5,000/-", "(12)", None]
+    assert [same(c, normalize.parse_amount(v)) for c, v in zip(normalize.parse_amounts(values), values)] == [True] * 9
+
+
+def test_parse_amounts_numeric_columns():
+    values = [1, 2.5, Decimal("3.25"), None, float("nan")]
+    assert normalize.parse_amounts(values).tolist()[:3] == [1.0, 2.5, 3.25]
+    assert normalize.parse_amounts(values).isna().tolist() == [False, False, False, True, True]
+    ints = pd.Series([1, 2], index=[10, 20])
+    assert normalize.parse_amounts(ints).index.tolist() == [10, 20]
+
+
+def test_scientific_notation_is_not_an_amount():
+    assert normalize.parse_amount("1e5") is None
+    assert normalize.parse_decimal("1e5") is None
+    assert math.isnan(normalize.parse_amounts(["1e5", "100000"])[0])
+
+
+def test_parse_decimal_is_exact():
+    assert normalize.parse_decimal("₹ 1,23,456.10") == Decimal("123456.10")
+    assert normalize.parse_decimal("(0.10)") == Decimal("-0.10")
+    assert normalize.parse_decimal(0.1) == Decimal("0.1")
+
+
+def as_date(value):
+    return None if pd.isna(value) else value.date()
+
+
+@pytest.mark.parametrize("value", DATES)
+def test_parse_dates_matches_parse_date(value):
+    (column,) = normalize.parse_dates([value])
+    assert as_date(column) == normalize.parse_date(value)
+
+
+@pytest.mark.parametrize("value", MONTHS + DATES)
+def test_parse_months_matches_parse_month(value):
+    (column,) = normalize.parse_months([value])
+    assert as_date(column) == normalize.parse_month(value)
+
+
+def test_pay_months_matches_pay_month():
+    pairs = [(m, d) for m in MONTHS for d in DATES]
+    column = normalize.pay_months([m for m, _ in pairs], [d for _, d in pairs])
+    assert [as_date(v) for v in column] == [normalize.pay_month(m, d) for m, d in pairs]
+
+
+def test_scalar_examples():
+    assert normalize.parse_date("31 Mar 2024") == date(2024, 3, 31)
+    assert normalize.parse_month("Mar'24") == date(2024, 3, 1)
+    assert normalize.pay_month("March 2024", "05/04/2024") == date(2024, 4, 1)
+    assert normalize.pay_month("March 2024", None) == date(2024, 3, 1)
+
+
+def test_month_labels():
+    labels = normalize.month_labels(normalize.parse_dates(["2024-03-05", None, "31 Dec 2023", "soon"]))
+    assert labels[[0, 2]].tolist() == ["2024-03", "2023-12"]
+    assert labels[[1, 3]].isna().all()
@@ -0,0 +1,64 @@
+import pytest
+
+from app.extractors import prompt_compressor
+from app.extractors.prompt_compressor import compress
+
+HEADER = "ACME PAYROLL SERVICES PVT LTD\nRegd. Office: Bengaluru\n"
+FOOTER = "Generated on 28/03/2024 for ACME"
+
+
+def body(n):
+    """A page body long enough for the page to have a header and footer."""
+    return "".join(f"Annexure clause {n}.{k}: terms of employment\n" for k in range(12))
+
+
+@pytest.fixture(autouse=True)
+def compression_on(monkeypatch):
+    monkeypatch.setattr(prompt_compressor.settings, "PROMPT_COMPRESSION", True)
+    monkeypatch.setattr(prompt_compressor.settings, "PROMPT_TRIM_MIN_TOKENS", 10_000)
+
+
+def test_repeated_salary_lines_are_kept():
+    text = ("Earnings Current Month\nBasic Salary 30,000.00\nProfessional Tax 200.00\n"
+            "Year to date\nBasic Salary 30,000.00\nProfessional Tax 200.00\nProfessional Tax 200.00\n")
+    out = compress(text)
+    assert out.count("Basic Salary 30,000.00") == 2
+    assert out.count("Professional Tax 200.00") == 3
+
+
+def test_running_header_and_footer_are_kept_once():
+    pages = [HEADER + body(n) + f"Net Pay {n},000.00\n" + FOOTER for n in (1, 2, 3)]
+    out = compress("\f".join(pages)).splitlines()
+    assert out.count("ACME PAYROLL SERVICES PVT LTD") == 1
+    assert out.count(FOOTER) == 1
+    assert [line for line in out if line.startswith("Net Pay")] == ["Net Pay 1,000.00", "Net Pay 2,000.00",
+                                                                     "Net Pay 3,000.00"]
+
+
+def test_page_number_lines_split_pages():
+    pages = [HEADER + body(n) + f"Net Pay {n},000.00\nPage {n} of 2" for n in (1, 2)]
+    out = compress("\n\n".join(pages)).splitlines()
+    assert out.count("ACME PAYROLL SERVICES PVT LTD") == 1
+    assert not any(line.startswith("Page") for line in out)
+
+
+def test_without_page_breaks_nothing_is_deduplicated():
+    out = compress(HEADER + "Net Pay 1,000.00\n" + HEADER).splitlines()
+    assert out.count("ACME PAYROLL SERVICES PVT LTD") == 2
+
+
+def test_salary_lines_repeated_on_short_pages_are_kept():
+    payslip = HEADER + "Employee Code E1\nBasic 30000\nHRA 12000\nNet Pay 40,000.00\n" + FOOTER
+    summary = HEADER + "Summary\nBasic 30000\nNet Pay 40,000.00\n" + FOOTER
+    out = compress(payslip + "\f" + summary).splitlines()
+    # too short to tell a running header from a repeated line: nothing is dropped
+    assert out.count("Basic 30000") == 2
+    assert out.count("Net Pay 40,000.00") == 2
+    assert out.count("ACME PAYROLL SERVICES PVT LTD") == 2
+
+    # on long pages the header goes, the salary lines near the edges at other offsets stay
+    payslip = HEADER + body(1) + "Employee Code E1\nBasic 30000\nHRA 12000\nNet Pay 40,000.00\n" + FOOTER
+    summary = HEADER + "Summary\nBasic 30000\nNet Pay 40,000.00\n" + body(2) + FOOTER
+    out = compress(payslip + "\f" + summary).splitlines()
+    assert out.count("ACME PAYROLL SERVICES PVT LTD") == 1
+    assert out.count("Basic 30000") == 2
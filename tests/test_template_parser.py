@@ -0,0 +1,67 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from app.extractors import template_parser
+from app.extractors.template_parser import TemplateEngine, load_templates
+from benchmarks.synthetic import payslip_fields, payslip_text
+
+EXAMPLE = Path(template_parser.__file__).parent / "templates" / "_example.json"
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """The shipped example template, activated by copying it without the underscore."""
+    assert load_templates(str(EXAMPLE.parent)) == []
+    shutil.copy(EXAMPLE, tmp_path / "example.json")
+    engine = TemplateEngine(load_templates(str(tmp_path)))
+    monkeypatch.setattr(template_parser, "_engine", engine)
+    monkeypatch.setattr(template_parser.settings, "TEMPLATES_ENABLED", True)
+    return engine
+
+
+def test_matching_payslip_is_extracted_completely(engine):
+    result = engine.extract(payslip_text(7))
+    expected = payslip_fields(7)
+    assert result.template == "example_payroll_v1" and result.complete
+    for name in template_parser.TEXT_FIELDS + template_parser.AMOUNT_FIELDS:
+        if name != "pf_employer":  # not printed on these payslips
+            assert result.data[name] == expected[name], name
+    assert result.data["pf_employer"] is None
+    assert result.data["components"] == {"Professional Tax": 200.0}
+
+
+def test_missing_required_field_is_partial(engine):
+    text = "\n".join(line for line in payslip_text(7).splitlines() if not line.startswith("Net Pay"))
+    result = engine.extract(text)
+    assert not result.complete and result.missing == ["net_pay"]
+    assert result.data["gross_salary"] == payslip_fields(7)["gross_salary"]
+
+
+def test_net_pay_above_gross_is_not_trusted(engine):
+    text = payslip_text(7).replace("Net Pay: Rs. ", "Net Pay: Rs. 9")
+    assert engine.extract(text).missing == ["gross_salary", "net_pay"]
+
+
+def test_other_layouts_do_not_match(engine):
+    assert engine.extract("ACME CORP\nSalary slip March 2024\nNet Pay 50,000.00") is None
+    stats = engine.stats()
+    assert stats["_unmatched"] == 1 and stats["example_payroll_v1"]["matched"] == 0
+
+
+def test_fast_path_only_asks_the_llm_for_what_is_missing(engine):
+    calls = []
+
+    def llm(text):
+        calls.append(text)
+        return {"net_pay": 1.0, "gross_salary": 2.0, "components": {"Bonus": 5.0}}
+
+    complete = template_parser.parse_with_fast_path(payslip_text(7), llm)
+    assert calls == [] and complete["net_pay"] == payslip_fields(7)["net_pay"]
+
+    text = "\n".join(line for line in payslip_text(7).splitlines() if not line.startswith("Net Pay"))
+    merged = template_parser.parse_with_fast_path(text, llm)
+    assert calls == [text]
+    assert merged["net_pay"] == 1.0 and merged["gross_salary"] == payslip_fields(7)["gross_salary"]
+    assert merged["components"] == {"Bonus": 5.0, "Professional Tax": 200.0}